@@ -25,6 +25,7 @@ File I/O utility routines: intended for processing FIS/data files.
 import glob
 import os
 import tempfile
+import threading
 
 import numpy as np
 
@@ -37,6 +38,7 @@ import ciao_contrib.cxcdm_wrapper as cw
 import ciao_contrib.logger_wrapper as lw
 import ciao_contrib.runtool as runtool
 
+import ciao_contrib._tools.metacache as metacache
 import ciao_contrib._tools.utils as utils
 
 from ciao_contrib.region.fov import FOVRegion, AxisRange
@@ -67,7 +69,9 @@ __all__ = (
     "fov_limits",
     "get_sky_range",
     "find_output_grid",
-    "get_tangent_point")
+    "find_matching_fov",
+    "get_tangent_point",
+    "get_sky_transform")
 
 lgr = lw.initialize_module_logger('_tools.fileio')
 v1 = lgr.verbose1
@@ -75,6 +79,12 @@ v2 = lgr.verbose2
 v3 = lgr.verbose3
 v4 = lgr.verbose4
 
+# Used to serialize access to the data model when the output grids are
+# calculated in parallel (the CIAO tools are run in separate processes
+# so do not need this).
+#
+_dm_lock = threading.RLock()
+
 
 def get_infile_type(infile):
     """Returns 'Table' or 'Image' depending on what Crates thinks
@@ -254,6 +264,10 @@ def get_keys_from_file(fname):
     __SHAPE keyword.
     """
 
+    return metacache.cached("keys", fname, _get_keys_from_file)
+
+
+def _get_keys_from_file(fname):
     (bname, bi) = cw.get_block_info_from_file(fname)
     return _get_key_values(bi)
 
@@ -273,6 +287,10 @@ def get_keys_cols_from_file(fname):
     - amongst others - column name, type, and size.
     """
 
+    return metacache.cached("keys_cols", fname, _get_keys_cols_from_file)
+
+
+def _get_keys_cols_from_file(fname):
     (bname, bi) = cw.get_block_info_from_file(fname)
     keys = _get_key_values(bi)
 
@@ -353,6 +371,10 @@ def get_aimpoint(infile):
     starts with GTI.
     """
 
+    return metacache.cached("aimpoint", infile, _get_aimpoint)
+
+
+def _get_aimpoint(infile):
     v3("Looking for aimpoint CCD in {}".format(infile))
     try:
         ds = cxcdm.dmDatasetOpen(infile)
@@ -401,6 +423,11 @@ def get_column_unique(infile, colname):
     If the file is empty the routine returns None.
     """
 
+    return metacache.cached(f"unique:{colname}", infile,
+                            lambda fname: _get_column_unique(fname, colname))
+
+
+def _get_column_unique(infile, colname):
     cr = pycrates.read_file("{}[cols {}]".format(infile, colname))
     try:
         if cr.get_nrows() == 0:
@@ -564,7 +591,8 @@ def get_sky_range(infile, fov_file, binsize):
 
 def find_output_grid(evtfile, asolfile, maskfile,
                      binval, chips,
-                     tmpdir="/tmp"):
+                     tmpdir="/tmp",
+                     fovfile=None):
     """Given the events file, aspect solution(s), and mask file,
     return the AxisRange objects for each axis which cover the data.
 
@@ -585,11 +613,21 @@ def find_output_grid(evtfile, asolfile, maskfile,
         ASPSOL (pre DS 10.8.3)  - use method=minmax
         ASPSOLOBI               - use method=convexhull
 
+    If fovfile is not None then it is used as the FOV file, rather
+    than running skyfov (so asolfile and maskfile are not used).
+
+    The CIAO tools are run with their own parameter files (using the
+    submit method), so this routine can be called from multiple
+    threads.
+
     If possible, use find_output_grid2 instead (which just wraps
     up this routine in a bit-more logic).
     """
 
     v3("Calculating sky grid of {}".format(evtfile))
+    if fovfile is not None:
+        v3("Using existing FOV file {}".format(fovfile))
+        return _find_sky_range(evtfile, fovfile, binval, chips, asolfile)
 
     # In CIAO 4.6 there is a problem with the data model in the case where
     # a filter has been applied to the event file and there are multiple
@@ -627,7 +665,7 @@ def find_output_grid(evtfile, asolfile, maskfile,
         #
         dmcopy = runtool.make_tool('dmcopy')
         dmcopy.punlearn()
-        dmcopy(evtfile, evtcopy.name, clobber=True)
+        dmcopy.submit(evtfile, evtcopy.name, clobber=True).result()
         gtifilter = "[@{}]".format(evtcopy.name)
 
     # What SKYFOV method to use?
@@ -644,7 +682,9 @@ def find_output_grid(evtfile, asolfile, maskfile,
         finally:
             cxcdm.dmBlockClose(bl)
 
-    contents = set([get_content(f) for f in asolfile])
+    with _dm_lock:
+        contents = set([get_content(f) for f in asolfile])
+
     if len(contents) != 1:
         emsg = "Multiple types of aspect solution found: " + \
                "{}\n{}".format(", ".join(contents),
@@ -668,19 +708,15 @@ def find_output_grid(evtfile, asolfile, maskfile,
     fov = tempfile.NamedTemporaryFile(dir=tmpdir, suffix=".fov")
     try:
         skyfov.punlearn()
-        skyfov(infile=evtfile,
-               outfile=fov.name,
-               aspect=fasol,
-               mskfile=maskfile,
-               kernel="FITS",
-               method=method,
-               clobber=True)
-
-        cstr = ",".join([str(c) for c in chips])
-        fov_chip_filter = "[ccd_id={0}]".format(cstr)
-        (xval, yval) = get_sky_range(evtfile,
-                                     fov.name + fov_chip_filter,
-                                     binval)
+        skyfov.submit(infile=evtfile,
+                      outfile=fov.name,
+                      aspect=fasol,
+                      mskfile=maskfile,
+                      kernel="FITS",
+                      method=method,
+                      clobber=True).result()
+
+        return _find_sky_range(evtfile, fov.name, binval, chips, asolfile)
 
     finally:
         # I have seen a case where skyfov failed, but the error it would have
@@ -694,14 +730,137 @@ def find_output_grid(evtfile, asolfile, maskfile,
         except OSError:
             pass
 
+
+def _find_sky_range(evtfile, fovfile, binval, chips, asolfile):
+    """Return the sky range of the events covered by the given chips
+    of the FOV file.
+    """
+
+    cstr = ",".join([str(c) for c in chips])
+    fov_chip_filter = "[ccd_id={0}]".format(cstr)
+    with _dm_lock:
+        (xval, yval) = get_sky_range(evtfile,
+                                     fovfile + fov_chip_filter,
+                                     binval)
+
     if xval is None or yval is None:
         raise ValueError("There is no spatial overlap between data ({}) and aspect solution ({}).".format(evtfile, asolfile))
 
     return (xval, yval)
 
 
+def _same_transform(tr1, tr2):
+    """Are the two transforms (from get_sky_transform) the same?"""
+
+    if len(tr1) != len(tr2):
+        return False
+
+    try:
+        return all(np.allclose(np.asarray(a, dtype=float),
+                               np.asarray(b, dtype=float))
+                   for (a, b) in zip(tr1, tr2))
+    except (TypeError, ValueError):
+        return False
+
+
+def _base_filename(fname):
+    """Remove the path, any DM filter, and a .gz suffix."""
+
+    out = os.path.basename(get_file(fname.strip()))
+    if out.endswith('.gz'):
+        out = out[:-3]
+
+    return out
+
+
+def _fov_matches(fovfile, obsinfo, asolnames, masknames, transform):
+    """Can fovfile be used as the FOV for the observation?"""
+
+    try:
+        (keys, cols) = get_keys_cols_from_file(fovfile)
+    except (IOError, OSError, ValueError, IndexError):
+        return False
+
+    if cols is None:
+        return False
+
+    colnames = set([col.name.upper() for col in cols])
+    if 'SHAPE' not in colnames or 'CCD_ID' not in colnames:
+        return False
+
+    for key in ['OBS_ID', 'OBI_NUM', 'CYCLE']:
+        if key in keys and \
+           str(keys[key]) != str(obsinfo.get_header().get(key, keys[key])):
+            return False
+
+    # The FOV must have been created with the same aspect solution(s)
+    # and - if recorded - mask file.
+    #
+    def get_names(key):
+        return set([_base_filename(n) for n in str(keys[key]).split(',')])
+
+    if 'ASOLFILE' not in keys or get_names('ASOLFILE') != asolnames:
+        return False
+
+    if masknames is not None and 'MASKFILE' in keys and \
+       get_names('MASKFILE') != masknames:
+        return False
+
+    try:
+        return _same_transform(get_sky_transform(fovfile), transform)
+    except (IOError, OSError, RuntimeError):
+        return False
+
+
+def find_matching_fov(obsinfo, maskfile=None):
+    """Return the name of a FOV file in the same directory as the event
+    file of the observation which can be used instead of running
+    skyfov, or None.
+
+    A FOV file is only used if the event file has no DM filter, it
+    has the same OBS_ID, OBI_NUM, and CYCLE values, it was created
+    with the same aspect solution files - using the ASOLFILE and, if
+    set, MASKFILE keywords - and its sky coordinate system matches the
+    event file (so FOV files for the un-reprojected data are not used
+    with reprojected event files).
+    """
+
+    evtfile = obsinfo.get_evtfile()
+    if get_filter(evtfile) != "":
+        return None
+
+    dirname = os.path.dirname(obsinfo.get_evtfile_no_dmfilter())
+    fovfiles = set()
+    for pat in ["*fov*.fits", "*fov*.fits.gz", "*.fov"]:
+        fovfiles.update(glob.glob(os.path.join(dirname, pat)))
+
+    if len(fovfiles) == 0:
+        return None
+
+    asolnames = set([_base_filename(f) for f in obsinfo.get_asol()])
+    if maskfile is None:
+        masknames = None
+    else:
+        masknames = set([_base_filename(maskfile)])
+
+    with _dm_lock:
+        try:
+            transform = get_sky_transform(evtfile)
+        except (IOError, OSError, RuntimeError):
+            return None
+
+        for fovfile in sorted(fovfiles):
+            if _fov_matches(fovfile, obsinfo, asolnames, masknames,
+                            transform):
+                v2("Using FOV file {} for {}".format(fovfile, evtfile))
+                return fovfile
+
+    return None
+
+
 def find_output_grid2(obsinfo, binval, chips,
-                      tmpdir="/tmp"):
+                      tmpdir="/tmp",
+                      reuse_fov=True):
     """Given the observation info,
     return the AxisRange objects for each axis which cover the data.
 
@@ -717,6 +876,10 @@ def find_output_grid2(obsinfo, binval, chips,
     but it is not considered an error (this is a change in CIAO 4.7;
     in previous releases the code would exit with an error if no
     MASKFILE could be found).
+
+    If reuse_fov is set then find_matching_fov is used to look for
+    an existing FOV file for the observation, rather than running
+    skyfov.
     """
 
     # With the way that obsinfo code works, it is a bit awkward to find
@@ -740,11 +903,17 @@ def find_output_grid2(obsinfo, binval, chips,
     if maskfile is None:
         v1("WARNING: no mask file found for {}, region may be too large".format(obsinfo.get_evtfile()))
 
+    if reuse_fov:
+        fovfile = find_matching_fov(obsinfo, maskfile=maskfile)
+    else:
+        fovfile = None
+
     # Note that get_asol returns a time-ordered list of file names
     return find_output_grid(obsinfo.get_evtfile(),
                             obsinfo.get_asol(),
                             maskfile,
-                            binval, chips, tmpdir=tmpdir)
+                            binval, chips, tmpdir=tmpdir,
+                            fovfile=fovfile)
 
 
 def get_file_from_header(dirname, hdr, keyword, label, warnlabel=None):
@@ -873,8 +1042,8 @@ def _get_tangent_point_image(fname, bl):
     return _get_aimpoint_from_transform2d(transform)
 
 
-def _get_tangent_point_table(fname, bl):
-    """Return (ra,dec) in decimal degrees."""
+def _get_wcs_table(fname, bl):
+    """Return the tangent-plane transform for the table."""
 
     cols = cxcdm.dmTableOpenColumnList(bl)
     wcscols = []
@@ -898,7 +1067,13 @@ def _get_tangent_point_table(fname, bl):
     elif nwcs > 1:
         raise IOError("Multiple ({}) WCS transforms found in {}".format(nwcs, fname))
 
-    return _get_aimpoint_from_transform2d(wcscols[0])
+    return wcscols[0]
+
+
+def _get_tangent_point_table(fname, bl):
+    """Return (ra,dec) in decimal degrees."""
+
+    return _get_aimpoint_from_transform2d(_get_wcs_table(fname, bl))
 
 
 def get_tangent_point(filename):
@@ -911,6 +1086,10 @@ def get_tangent_point(filename):
     a number of assumptions.
     """
 
+    return metacache.cached("tangent", filename, _get_tangent_point)
+
+
+def _get_tangent_point(filename):
     bl = cxcdm.dmBlockOpen(filename)
     try:
         btype = cxcdm.dmBlockGetType(bl)
@@ -930,6 +1109,27 @@ def get_tangent_point(filename):
     return (ra0, dec0)
 
 
+def get_sky_transform(filename):
+    """Return the parameters of the tangent-plane transform for a
+    table - as returned by cxcdm.dmCoordGetTransform - or raises an
+    IOError.
+    """
+
+    return metacache.cached("transform", filename, _get_sky_transform)
+
+
+def _get_sky_transform(filename):
+    bl = cxcdm.dmBlockOpen(filename)
+    try:
+        if cxcdm.dmBlockGetType(bl) != cxcdm.dmTABLE:
+            raise IOError("Expected a table for {}".format(filename))
+
+        return cxcdm.dmCoordGetTransform(_get_wcs_table(filename, bl))
+
+    finally:
+        cxcdm.dmBlockClose(bl)
+
+
 def expand_evtfiles_stack(instack, pattern="*evt*"):
     """Expand the instack input into an array of event files.
     For each element in the stack check if it is a file or directory,
@@ -1063,3 +1263,4 @@ def sort_mjd(filenames):
     return [v[1] for v in vals]
 
 # End
+
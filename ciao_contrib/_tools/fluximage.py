@@ -63,7 +63,7 @@ import pycrates as pcr
 import ciao_contrib.logger_wrapper as lw
 
 from ciao_contrib.runtool import new_pfiles_environment
-from ciao_contrib.runtool import add_tool_history
+from ciao_contrib.runtool import add_tool_history, update_header_keys
 
 from ciao_contrib._tools import fileio
 from ciao_contrib._tools.obsinfo import ObsInfo
@@ -1805,19 +1805,16 @@ def combine_emaps(infiles, match, outfile, lookup_table, detnam,
                       verbose=verbose,
                       tmpdir=tmpdir)
 
-        # We could use dmhedit's filelist argument to just call the
-        # tool once, with both DETNAM and BUNIT edits, but it is
-        # not a huge time sink and this way we get a cleaner
-        # history record.
-
         # restore the original DETNAM keyword
-        dmhedit_key(outfile, 'DETNAM', detnam, verbose=verbose)
+        keys = {'DETNAM': detnam}
 
         # add the lost expmap BUNIT lost during dmimgcalc
         bunit = fileio.get_image_units(infiles[0])
         tunit = fileio.get_image_units(outfile)
         if bunit != tunit:
-            dmhedit_key(outfile, 'BUNIT', bunit, verbose=verbose)
+            keys['BUNIT'] = bunit
+
+        update_header_keys(outfile, keys)
 
 
 def single_expmap_chips(taskrunner, labelconv, preconditions,
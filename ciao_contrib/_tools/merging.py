@@ -22,10 +22,15 @@
 Routines used when merging and combining data.
 """
 
+import gzip
 import os
+import multiprocessing
+import shutil
 import tempfile
 import resource
 
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
 
 import cxcdm
@@ -2184,12 +2189,21 @@ def setup_obsid_dtf(obsinfos, dtffiles):
 
 
 def get_observation_xygrids(obsinfos, binval,
-                            tmpdir="/tmp/"):
+                            tmpdir="/tmp/",
+                            nproc=1):
     """Return an array of AxisGrid objects for the x and y axes representing
     each observation in infiles/hdrs/asolfiles/maskfiles.
+
+    The grids are calculated in parallel, using up to nproc
+    observations at a time (None means use all the processors).
+    The CIAO tools are run with their own PFILES directory, so
+    the runs do not interfere with each other.
     """
 
-    grids = []
+    # The chips are found first since the values are cached, and so
+    # can be re-used by later stages, and it is quick.
+    #
+    chipslist = []
     for obs in obsinfos:
         infile = obs.get_evtfile()
         v3(f"get_observation_xygrids: infile={infile}")
@@ -2207,13 +2221,27 @@ def get_observation_xygrids(obsinfos, binval,
             raise IOError(f"No {lbl} found in {infile}!")
 
         v3(f"get_observation_xygrids: instrument={obs.instrument} chips={chips}")
+        chipslist.append(chips)
+
+    def get_grid(obs, chips):
         (xg, yg) = fileio.find_output_grid2(obs, binval, chips,
                                             tmpdir=tmpdir)
-        v3(f"get_observation_xygrids: xg={xg} yg={yg}")
+        v3(f"get_observation_xygrids: {obs.obsid} xg={xg} yg={yg}")
+        return (xg, yg)
 
-        grids.append((xg, yg))
+    if nproc is None:
+        nproc = multiprocessing.cpu_count()
 
-    return grids
+    nproc = min(nproc, len(obsinfos))
+    if nproc <= 1:
+        return [get_grid(obs, chips)
+                for (obs, chips) in zip(obsinfos, chipslist)]
+
+    v3(f"get_observation_xygrids: using {nproc} threads")
+    with ThreadPoolExecutor(max_workers=nproc) as executor:
+        futures = [executor.submit(get_grid, obs, chips)
+                   for (obs, chips) in zip(obsinfos, chipslist)]
+        return [fut.result() for fut in futures]
 
 
 def calculate_output_grid(obs_xygrids,
@@ -2329,14 +2357,17 @@ def calculate_output_grid(obs_xygrids,
 
 
 def matchup_xygrids_auto(obsinfos, bin, maxsize,
-                         tmpdir="/tmp/"):
+                         tmpdir="/tmp/",
+                         nproc=1):
     """Return an array of xygrid values for the processing.
 
+    The nproc argument is passed to get_observation_xygrids.
     """
 
     v1("Calculating the output grid")
     instrume = obsinfos[0].instrument
-    obs_xygrids = get_observation_xygrids(obsinfos, bin, tmpdir=tmpdir)
+    obs_xygrids = get_observation_xygrids(obsinfos, bin, tmpdir=tmpdir,
+                                          nproc=nproc)
     xygrids = calculate_output_grid(obs_xygrids,
                                     bin,
                                     maxsize,
@@ -2567,11 +2598,285 @@ def adjust_headers(rules, cr, keys, headers):
             pycrates.set_key(cr, key, newval)
 
 
+# The number of pixels in a tile used by exposure_weight and
+# expmap_weight.
+#
+TILE_PIXELS = 4 * 1024 * 1024
+
+_FITS_BLOCK = 2880
+
+_FITS_DTYPES = {8: '>u1', 16: '>i2', 32: '>i4', 64: '>i8',
+                -32: '>f4', -64: '>f8'}
+
+
+def _read_fits_header(fh):
+    """Read the FITS header at the current position of fh, returning
+    a dictionary of the keyword values (only simple values are
+    converted) or None if this is not a FITS header.
+    """
+
+    keys = {}
+    while True:
+        block = fh.read(_FITS_BLOCK)
+        if len(block) != _FITS_BLOCK:
+            return None
+
+        for i in range(0, _FITS_BLOCK, 80):
+            card = block[i:i + 80].decode('ascii', errors='replace')
+            name = card[:8].strip()
+            if name == 'END':
+                return keys
+
+            if card[8:10] != '= ':
+                continue
+
+            val = card[10:].strip()
+            if val.startswith("'"):
+                keys[name] = val[1:].split("'")[0].strip()
+                continue
+
+            val = val.split('/')[0].strip()
+
+            for conv in [int, float]:
+                try:
+                    keys[name] = conv(val)
+                    break
+                except ValueError:
+                    pass
+            else:
+                keys[name] = val
+
+
+def _find_fits_image(fh):
+    """Return the location of the 2D image in the first HDU of the
+    file with data, or None if it can not be memory mapped.
+
+    The argument is a file opened in binary mode. The return value
+    is (offset, dtype, shape, bscale, bzero).
+    """
+
+    fh.seek(0)
+    if fh.read(9) != b'SIMPLE  =':
+        return None
+
+    fh.seek(0)
+    while True:
+        hdr = _read_fits_header(fh)
+        if hdr is None:
+            return None
+
+        try:
+            bitpix = hdr['BITPIX']
+            naxis = hdr['NAXIS']
+            dims = [hdr[f'NAXIS{n}'] for n in range(1, naxis + 1)]
+        except KeyError:
+            return None
+
+        npix = int(np.prod(dims)) if naxis > 0 else 0
+        if npix == 0 and 'XTENSION' not in hdr:
+            # an empty primary block; move on to the next block
+            continue
+
+        if hdr.get('XTENSION', 'IMAGE') != 'IMAGE' or naxis != 2 or \
+           bitpix not in _FITS_DTYPES:
+            return None
+
+        # Leave the conversion of BLANK values to the data model.
+        if bitpix > 0 and 'BLANK' in hdr:
+            return None
+
+        return (fh.tell(), np.dtype(_FITS_DTYPES[bitpix]),
+                (dims[1], dims[0]),
+                hdr.get('BSCALE', 1.0), hdr.get('BZERO', 0.0))
+
+
+def _read_image_header(filename):
+    """Read in the header of the image.
+
+    Only the first pixel is read in. Since the image section starts
+    at the first pixel the WCS is unchanged, so the crate can be used
+    as the template for the output image.
+    """
+
+    cr = pycrates.read_file(f"{filename}[#1=1:1,#2=1:1]")
+    if not isinstance(cr, pycrates.IMAGECrate):
+        raise ValueError(f"Not an image: {filename}")
+
+    return cr
+
+
+def _read_image(filename):
+    """Read in the 2D image values."""
+
+    cr = pycrates.read_file(filename)
+    if not isinstance(cr, pycrates.IMAGECrate):
+        raise ValueError(f"Not an image: {filename}")
+
+    vals = cr.get_image().values
+    if vals.ndim != 2:
+        raise ValueError(f"Not an image: {filename}")
+
+    return vals
+
+
+class _ImageRows:
+    """Read a set of rows from an image.
+
+    Uncompressed FITS images are memory mapped. Gzip-compressed FITS
+    images are decompressed once, to a temporary file, which is then
+    memory mapped. For other files - such as those with a DM filter -
+    the image is only read in when the object is created to find its
+    size, and then an image section is read in for each set of rows,
+    so only the rows being processed are held in memory.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._location = None
+        self._source = None
+
+        if '[' not in filename:
+            self._open(filename)
+
+        if self._location is None:
+            v3(f"Finding the size of {filename}")
+            self.shape = _read_image(filename).shape
+
+        else:
+            v3(f"Memory mapping {filename}")
+            self.shape = self._location[2]
+
+    def _open(self, filename):
+        """Set up the memory mapping, if possible."""
+
+        try:
+            fh = open(filename, 'rb')
+        except OSError:
+            return
+
+        with fh:
+            if fh.read(2) != b'\x1f\x8b':
+                self._location = _find_fits_image(fh)
+                self._source = filename
+                return
+
+            fh.seek(0)
+            tmp = tempfile.TemporaryFile()
+            try:
+                with gzip.GzipFile(fileobj=fh) as gz:
+                    shutil.copyfileobj(gz, tmp)
+
+            except (OSError, EOFError):
+                tmp.close()
+                return
+
+        self._location = _find_fits_image(tmp)
+        if self._location is None:
+            tmp.close()
+        else:
+            v3(f"Decompressed {filename} to a temporary file")
+            self._source = tmp
+
+    def rows(self, lo, hi):
+        """Return rows lo to hi - 1 (0-based) as a float64 array."""
+
+        if self._location is None:
+            nx = self.shape[1]
+            section = f"{self.filename}[#1=1:{nx},#2={lo + 1}:{hi}]"
+            vals = _read_image(section)
+            if vals.shape != (hi - lo, nx):
+                raise ValueError(f"Expected shape {(hi - lo, nx)} but found {vals.shape} for {section}")
+
+            return vals.astype(np.float64)
+
+        (offset, dtype, shape, bscale, bzero) = self._location
+        vals = np.memmap(self._source, mode='r', dtype=dtype,
+                         offset=offset, shape=shape)
+        try:
+            out = vals[lo:hi].astype(np.float64)
+        finally:
+            del vals
+
+        if bscale != 1.0:
+            out *= bscale
+        if bzero != 0.0:
+            out += bzero
+
+        return out
+
+
+def _weighted_mean_tiles(shape, terms, tilerows=None):
+    """Calculate sum_i pix_i / sum_i wgt_i a tile at a time.
+
+    Each element of terms is a function which, given (lo, hi),
+    returns the (pix, wgt) values for these rows. The return value
+    is a float32 image.
+    """
+
+    (ny, nx) = shape
+    if tilerows is None:
+        tilerows = max(1, TILE_PIXELS // max(nx, 1))
+
+    out = np.empty(shape, dtype=np.float32)
+    for lo in range(0, ny, tilerows):
+        hi = min(lo + tilerows, ny)
+        v4(f"Processing rows {lo + 1} to {hi} of {ny}")
+        numerator = np.zeros((hi - lo, nx))
+        denominator = np.zeros((hi - lo, nx))
+        for term in terms:
+            (pixvals, wgtvals) = term(lo, hi)
+            numerator += pixvals
+            denominator += wgtvals
+
+        # Pixels with no exposure have a value of 0 so will end up
+        # as NaN in the output.
+        #
+        with np.errstate(invalid='ignore', divide='ignore'):
+            out[lo:hi] = numerator / denominator
+
+    return out
+
+
+def _check_shape(expected, reader, infile):
+    """Ensure the image has the expected shape."""
+
+    if reader.shape != expected:
+        shape = shape_to_string(expected)
+        got = shape_to_string(reader.shape)
+        raise ValueError(f"Expected {shape} but found {got} in {infile}")
+
+
+def _get_header(cr):
+    """Return the keyword values of the crate."""
+
+    return {k: cr.get_key_value(k) for k in cr.get_keynames()}
+
+
+def _write_weighted(basecr, outfile, headers, newvals, lookupTable,
+                    clobber):
+    """Write out the combined image, using basecr - the header of the
+    first file, from _read_image_header - as a template.
+    """
+
+    basecr.get_image().values = newvals
+
+    # Adjust the header for each key we have seen.
+    #
+    keys = set()
+    for hdr in headers:
+        keys.update(hdr.keys())
+
+    adjust_headers(HeaderMerge(lookupTable), basecr, keys, headers)
+
+    basecr.write(outfile, clobber=clobber)
+
+
 # NOTE: exposure_weight and expmap_weight have very-similar structure,
-#       so there is currently a lot of repeated code.
+#       so the common code is in the _ImageRows class and the
+#       _weighted_mean_tiles and _write_weighted routines.
 #
 def exposure_weight(infiles, outfile, lookupTable,
-                    clobber=True):
+                    clobber=True, tilerows=None):
     """Exposure weight the inputs to create an output file.
 
     Parameters
@@ -2588,14 +2893,20 @@ def exposure_weight(infiles, outfile, lookupTable,
         The name of the lookup table used to merge headers.
     clobber : bool, optional
         Is the output file over-written if it already exists?
+    tilerows : int or None, optional
+        The number of image rows to process at a time. The default
+        is to use tiles with about TILE_PIXELS pixels.
 
     Notes
     -----
-    This is performed using Crates - so all the data is read in
-    at once rather than done on a pixel-by-pixel basis. This means
-    that it is not ideal for "large" files.
-
-    The reason for using Crates over dmimgcalc is the easier
+    The images are processed a set of rows at a time, so that only
+    the output image and a tile from each input file are held in
+    memory. FITS images are memory mapped - after decompressing to a
+    temporary file if they are gzip compressed - otherwise the input
+    is read in once. Only the header of the first input is read in to
+    use as the template for the output.
+
+    The reason for using Python over dmimgcalc is the easier
     handling of NaN values.
 
     The output header is close to what the DataModel merging rules would
@@ -2623,8 +2934,6 @@ def exposure_weight(infiles, outfile, lookupTable,
     if len(infiles) == 0:
         raise ValueError("Input files is empty")
 
-    mergerules = HeaderMerge(lookupTable)
-
     # Calculate
     #     numerator   = sum_i exp_i * pix_i
     #     denominator = sum_i exp_i * mask_i
@@ -2635,83 +2944,59 @@ def exposure_weight(infiles, outfile, lookupTable,
     # For now I am not specifying a behavior for pixels set to
     # +infinity / -infinty.
     #
-    basecr = None
-    numerator = None
-    denominator = None
+    # NOTE: using NaN as an indicator that the pixel is outside the
+    #       filtered data; really should also check the subspace
+    #       but this is currently a requirement on the input (that
+    #       the subspace and NaN pixels match).
+    #
+    def make_term(reader, exp):
+        def term(lo, hi):
+            ivals = reader.rows(lo, hi)
+            return (exp * np.nan_to_num(ivals),
+                    exp * np.isfinite(ivals))
+
+        return term
 
-    # Store a dictionary of the header keyword values from each file,
-    # and a set of all known keys.
+    # Check the files, and store a dictionary of the header keyword
+    # values from each file, before processing the pixel values.
     #
+    basecr = None
+    shape = None
+    terms = []
     headers = []
-    keys = set()
-
     for infile in infiles:
-        cr = pycrates.read_file(infile)
-        if not isinstance(cr, pycrates.IMAGECrate):
-            raise ValueError(f"Not an image: {infile}")
+        hdrcr = _read_image_header(infile)
+        keys = _get_header(hdrcr)
+        if basecr is None:
+            basecr = hdrcr
 
-        exp = cr.get_key_value('EXPOSURE')
+        exp = keys.get('EXPOSURE')
         if exp is None:
             raise ValueError(f"No EXPOSURE keyword in {infile}")
 
         if exp <= 0.0:
             raise ValueError(f"EXPOSURE keyword = {exp} in {infile}")
 
-        # NOTE: using NaN as an indicator that the pixel is outside the
-        #       filtered data; really should also check the subspace
-        #       but this is currently a requirement on the input (that
-        #       the subspace and NaN pixels match).
-        #
-        ivals = cr.get_image().values
-        pixvals = exp * np.nan_to_num(ivals)
-        expvals = exp * np.isfinite(ivals)
-
-        if numerator is None:
-            numerator = pixvals
-            denominator = expvals
+        reader = _ImageRows(infile)
+        if shape is None:
+            shape = reader.shape
         else:
-            if numerator.shape != pixvals.shape:
-                shape = shape_to_string(numerator.shape)
-                got = shape_to_string(pixvals.shape)
-                raise ValueError(f"Expected {shape} but found {got} in {infile}")
-
-            numerator += pixvals
-            denominator += expvals
+            _check_shape(shape, reader, infile)
 
-        # store the header names and values
-        #
-        names = cr.get_keynames()
-        headers.append({k: cr.get_key_value(k) for k in names})
-        keys.update(set(names))
-
-        if basecr is None:
-            basecr = cr
+        terms.append(make_term(reader, exp))
+        headers.append(keys)
 
-    # Pixels with no exposure have a value of 0 so will end up as NaN
-    # in the output.
-    #
     # Note that we force the output to 32 bit rather than 64 bit as
     # there is no need for the extra precision (and mkspfmap creates
     # Real4 images so no point in going more accurate than that).
     #
-    res = np.seterr(invalid='ignore')
-    try:
-        newvals = numerator / denominator
-        newvals = newvals.astype(np.float32)
-    finally:
-        np.seterr(**res)
-
-    basecr.get_image().values = newvals
-
-    # Adjust the header for each key we have seen.
-    #
-    adjust_headers(mergerules, basecr, keys, headers)
-
-    basecr.write(outfile, clobber=clobber)
+    newvals = _weighted_mean_tiles(shape, terms, tilerows=tilerows)
+    _write_weighted(basecr, outfile, headers, newvals, lookupTable,
+                    clobber)
 
 
 def expmap_weight(infiles, expmaps, outfile, lookupTable,
-                  clobber=True):
+                  clobber=True, tilerows=None):
     """Weight the inputs by the exposure maps to create an output file.
 
     Parameters
@@ -2729,14 +3014,20 @@ def expmap_weight(infiles, expmaps, outfile, lookupTable,
         The name of the lookup table used to merge headers.
     clobber : bool, optional
         Is the output file over-written if it already exists?
+    tilerows : int or None, optional
+        The number of image rows to process at a time. The default
+        is to use tiles with about TILE_PIXELS pixels.
 
     Notes
     -----
-    This is performed using Crates - so all the data is read in
-    at once rather than done on a pixel-by-pixel basis. This means
-    that it is not ideal for "large" files.
-
-    The reason for using Crates over dmimgcalc is the easier
+    The images are processed a set of rows at a time, so that only
+    the output image and a tile from each input file are held in
+    memory. FITS images are memory mapped - after decompressing to a
+    temporary file if they are gzip compressed - otherwise the input
+    is read in once. Only the header of the first input is read in to
+    use as the template for the output.
+
+    The reason for using Python over dmimgcalc is the easier
     handling of NaN values.
 
     The output header is close to what the DataModel merging rules would
@@ -2760,8 +3051,6 @@ def expmap_weight(infiles, expmaps, outfile, lookupTable,
     if len(infiles) != len(expmaps):
         raise ValueError("Input and exposure map lengths do not agree")
 
-    mergerules = HeaderMerge(lookupTable)
-
     # Calculate
     #     numerator   = sum_i expmap_i * pix_i
     #     denominator = sum_i expmap_i
@@ -2771,84 +3060,55 @@ def expmap_weight(infiles, expmaps, outfile, lookupTable,
     # For now I am not specifying a behavior for pixels set to
     # +infinity / -infinty.
     #
-    basecr = None
-    numerator = None
-    denominator = None
+    # NOTE: using NaN as an indicator that the pixel is outside the
+    #       filtered data; really should also check the subspace
+    #       but this is currently a requirement on the input (that
+    #       the subspace and NaN pixels match).
+    #
+    def make_term(reader, ereader):
+        def term(lo, hi):
+            expvals = np.nan_to_num(ereader.rows(lo, hi))
+            pixvals = expvals * np.nan_to_num(reader.rows(lo, hi))
+            return (pixvals, expvals)
+
+        return term
 
-    # Store a dictionary of the header keyword values from each file,
-    # and a set of all known keys. This only uses the infiles, and
-    # ignores expfiles.
+    # Check the files, and store a dictionary of the header keyword
+    # values from each file, before processing the pixel values.
+    # This only uses the infiles, and ignores expfiles.
     #
+    shape = None
+    terms = []
     headers = []
-    keys = set()
-
+    basecr = None
     for infile, expmap in zip(infiles, expmaps):
-        cr = pycrates.read_file(infile)
-        if not isinstance(cr, pycrates.IMAGECrate):
-            raise ValueError(f"Not an image: {infile}")
-
-        ecr = pycrates.read_file(expmap)
-        if not isinstance(cr, pycrates.IMAGECrate):
-            raise ValueError(f"Not an image: {expmap}")
-
-        # NOTE: using NaN as an indicator that the pixel is outside the
-        #       filtered data; really should also check the subspace
-        #       but this is currently a requirement on the input (that
-        #       the subspace and NaN pixels match).
-        #
-        evals = ecr.get_image().values
-        ivals = cr.get_image().values
+        hdrcr = _read_image_header(infile)
+        if basecr is None:
+            basecr = hdrcr
 
-        if ivals.shape != evals.shape:
-            raise ValueError(f"Shapes do not match: {infile} and {expmap}")
+        reader = _ImageRows(infile)
+        ereader = _ImageRows(expmap)
 
-        expvals = np.nan_to_num(evals)
-        pixvals = expvals * np.nan_to_num(ivals)
+        if reader.shape != ereader.shape:
+            raise ValueError(f"Shapes do not match: {infile} and {expmap}")
 
-        if numerator is None:
-            numerator = pixvals
-            denominator = expvals
+        if shape is None:
+            shape = reader.shape
         else:
-            if numerator.shape != pixvals.shape:
-                shape = shape_to_string(numerator.shape)
-                got = shape_to_string(pixvals.shape)
-                raise ValueError(f"Expected {shape} but found {got} in {infile}")
+            _check_shape(shape, reader, infile)
 
-            numerator += pixvals
-            denominator += expvals
-
-        # store the header names and values
-        #
-        names = cr.get_keynames()
-        headers.append({k: cr.get_key_value(k) for k in names})
-        keys.update(set(names))
-
-        if basecr is None:
-            basecr = cr
+        terms.append(make_term(reader, ereader))
+        headers.append(_get_header(hdrcr))
 
-    # Pixels with no exposure have a value of 0 so will end up as NaN
-    # in the output.
-    #
     # Note that we force the output to 32 bit rather than 64 bit as
     # there is no need for the extra precision (and mkspfmap creates
     # Real4 images so no point in going more accurate than that).
     # It should not be needed here (only in the exptime weight) but
     # left in just to make sure.
     #
-    res = np.seterr(invalid='ignore', divide='ignore')
-    try:
-        newvals = numerator / denominator
-        newvals = newvals.astype(np.float32)
-    finally:
-        np.seterr(**res)
-
-    basecr.get_image().values = newvals
-
-    # Adjust the header for each key we have seen.
-    #
-    adjust_headers(mergerules, basecr, keys, headers)
-
-    basecr.write(outfile, clobber=clobber)
+    newvals = _weighted_mean_tiles(shape, terms, tilerows=tilerows)
+    _write_weighted(basecr, outfile, headers, newvals, lookupTable,
+                    clobber)
 
 
 def merge_psfmaps(mergetype, psfmap, psfmap_files, expmap_files,
@@ -0,0 +1,291 @@
+#
+#  Copyright (C) 2026
+#            Smithsonian Astrophysical Observatory
+#
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License along
+#  with this program; if not, write to the Free Software Foundation, Inc.,
+#  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+"""
+Cache metadata - such as the header keywords, column information, or
+the chips in an event file - read from files by fluximage/merge_obs/...
+
+Values are stored for each (file name, DM filter) pair and are only
+re-used if the size and modification time of the file have not
+changed. The cache is held in memory and, if a cache directory has
+been set - with set_cache_dir or the CIAO_CONTRIB_METADATA_CACHE
+environment variable - it is also written to disk so that it can be
+used by later runs.
+"""
+
+import copy
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+import numpy as np
+
+import ciao_contrib.logger_wrapper as lw
+from ciao_contrib.cxcdm_wrapper import Column
+
+__all__ = (
+    "cached",
+    "clear",
+    "get_cache_dir",
+    "set_cache_dir"
+    )
+
+lgr = lw.initialize_module_logger('_tools.metacache')
+v3 = lgr.verbose3
+v4 = lgr.verbose4
+
+ENV_CACHE_DIR = "CIAO_CONTRIB_METADATA_CACHE"
+
+_memory = {}
+_lock = threading.Lock()
+_cache_dir = os.environ.get(ENV_CACHE_DIR) or None
+
+
+def _to_json(val):
+    "Convert NumPy values for the JSON encoder."
+
+    if isinstance(val, np.generic):
+        return val.item()
+
+    if isinstance(val, np.ndarray):
+        return val.tolist()
+
+    if isinstance(val, type) and issubclass(val, np.generic):
+        return np.dtype(val).str
+
+    raise TypeError(f"Unable to convert {type(val)} to JSON")
+
+
+def _encode_cols(cols):
+    if cols is None:
+        return None
+
+    return [[c.name, c.pos, np.dtype(c.type).str, c.dims, c.unit,
+             c.comment, c.range] for c in cols]
+
+
+def _decode_cols(cols):
+    if cols is None:
+        return None
+
+    out = []
+    for (name, pos, dtype, dims, unit, comment, crange) in cols:
+        if crange is not None:
+            crange = tuple(crange)
+
+        out.append(Column(name, pos, np.dtype(dtype).type, dims, unit,
+                          comment, crange))
+
+    return out
+
+
+def _encode_unique(vals):
+    if vals is None:
+        return None
+
+    return {"dtype": vals.dtype.str, "values": vals.tolist()}
+
+
+def _decode_unique(vals):
+    if vals is None:
+        return None
+
+    return np.asarray(vals["values"], dtype=vals["dtype"])
+
+
+def _decode_keys(keys):
+    shape = keys.get("__SHAPE")
+    if shape is not None:
+        keys["__SHAPE"] = np.asarray(shape)
+
+    return keys
+
+
+def _identity(val):
+    return val
+
+
+# The (encode, decode) functions for the values that can be written
+# to disk; other kinds are only cached in memory.
+#
+_CODECS = {
+    "keys": (_identity, _decode_keys),
+    "keys_cols": (lambda v: [v[0], _encode_cols(v[1])],
+                  lambda v: (_decode_keys(v[0]), _decode_cols(v[1]))),
+    "unique": (_encode_unique, _decode_unique),
+    "aimpoint": (_identity, _identity),
+    "tangent": (list, tuple)
+}
+
+
+def get_cache_dir():
+    """Return the directory used to store the cache on disk, or None."""
+    return _cache_dir
+
+
+def set_cache_dir(dirname):
+    """Set the directory used to store the cache on disk. It is
+    created if it does not exist. Use None to only use the in-memory
+    cache.
+    """
+
+    global _cache_dir
+    if dirname is not None:
+        os.makedirs(dirname, exist_ok=True)
+
+    _cache_dir = dirname
+
+
+def clear():
+    """Clear the in-memory cache (any on-disk cache is not changed)."""
+    with _lock:
+        _memory.clear()
+
+
+def _split_filename(fname):
+    """Return the absolute path of the file and any DM filter."""
+
+    base = fname.split("[")[0]
+    return (os.path.abspath(base), fname[len(base):])
+
+
+def _get_stamp(path):
+    """Return the values used to check whether the file has changed,
+    or None if it is not a regular file."""
+
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+
+    if not os.path.isfile(path):
+        return None
+
+    return [st.st_ino, st.st_size, st.st_mtime_ns, st.st_ctime_ns]
+
+
+def _disk_name(path):
+    hname = hashlib.sha1(path.encode("utf-8")).hexdigest()
+    return os.path.join(_cache_dir, f"{hname}.json")
+
+
+def _read_disk(path, stamp):
+    """Return the on-disk entries for the file, or {} if there are
+    none or they are out of date."""
+
+    if _cache_dir is None:
+        return {}
+
+    try:
+        with open(_disk_name(path), "r", encoding="utf-8") as fh:
+            data = json.load(fh)
+    except (OSError, ValueError):
+        return {}
+
+    if data.get("path") != path or data.get("stamp") != stamp:
+        return {}
+
+    return data.get("entries", {})
+
+
+def _write_disk(path, stamp, name, value):
+    """Add the value to the on-disk entries for the file. Errors are
+    ignored since the cache is not essential."""
+
+    if _cache_dir is None:
+        return
+
+    entries = _read_disk(path, stamp)
+    entries[name] = value
+    data = {"path": path, "stamp": stamp, "entries": entries}
+
+    try:
+        fd, tmpname = tempfile.mkstemp(dir=_cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as fh:
+                json.dump(data, fh, default=_to_json)
+
+            os.replace(tmpname, _disk_name(path))
+
+        except Exception:
+            os.unlink(tmpname)
+            raise
+
+    except (OSError, TypeError, ValueError) as exc:
+        v3(f"Unable to write metadata cache for {path}: {exc}")
+
+
+def cached(kind, fname, func):
+    """Return func(fname), using the cached value if the file has
+    not changed since the value was calculated.
+
+    The kind argument labels the value (e.g. "keys" or
+    "unique:ccd_id") and is used,
+    along with the file name (including any DM filter), to identify
+    the value. A copy of the cached value is returned, so it can be
+    changed by the caller. Errors are not cached.
+    """
+
+    (path, dmfilter) = _split_filename(fname)
+    stamp = _get_stamp(path)
+    if stamp is None:
+        return func(fname)
+
+    key = (kind, path, dmfilter)
+    with _lock:
+        hit = _memory.get(key)
+
+    if hit is not None and hit[0] == stamp:
+        v4(f"Using cached {kind} for {fname}")
+        return copy.deepcopy(hit[1])
+
+    # Filters which refer to other files - such as region files or
+    # stacks - are not stored on disk since those files are not checked.
+    #
+    if "(" in dmfilter or "@" in dmfilter:
+        codec = None
+    else:
+        codec = _CODECS.get(kind.split(":")[0])
+    name = f"{kind}|{dmfilter}"
+    found = False
+    if codec is not None:
+        entries = _read_disk(path, stamp)
+        if name in entries:
+            try:
+                value = codec[1](entries[name])
+                found = True
+                v4(f"Using on-disk cached {kind} for {fname}")
+            except (TypeError, ValueError, KeyError):
+                pass
+
+    if not found:
+        value = func(fname)
+        if codec is not None:
+            try:
+                _write_disk(path, stamp, name, codec[0](value))
+            except (TypeError, ValueError) as exc:
+                v3(f"Unable to cache {kind} for {fname}: {exc}")
+
+    with _lock:
+        _memory[key] = (stamp, value)
+
+    return copy.deepcopy(value)
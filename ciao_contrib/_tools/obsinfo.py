@@ -115,10 +115,8 @@ class ObsInfo:
 
         self._obsid = utils.make_obsid_from_headers(keys, infile=infile)
 
-        # Note this re-opens the file, so is wasteful but we assume that since
-        # the file has just been opened it is in some cache so access time
-        # should not be too bad
-        # (and the routine is not optimised for speed anyway).
+        # These values are cached (see ciao_contrib._tools.metacache),
+        # so the file is only re-opened the first time it is seen.
         #
         if self._instrument == 'ACIS':
             self._aimpoint = fileio.get_aimpoint(infile)
@@ -0,0 +1,211 @@
+"""Check when ciao_contrib._tools.fileio re-uses an existing FOV file"""
+
+from types import SimpleNamespace
+
+import pytest
+
+from ciao_contrib._tools import fileio
+
+
+HEADER = {"OBS_ID": 1843, "OBI_NUM": 0, "CYCLE": "P"}
+ASOL = ["/data/1843/primary/pcadf01843_000N001_asol1.fits"]
+MASK = "/data/1843/secondary/acisf01843_000N004_msk1.fits"
+
+# The crpix, crval, and cdelt values from dmCoordGetTransform
+TRANSFORM = ([4096.5, 4096.5], [246.9, -24.6], [-1.366e-4, 1.366e-4])
+
+COLUMNS = [SimpleNamespace(name=name)
+           for name in ["SHAPE", "COMPONENT", "POS", "CCD_ID"]]
+
+
+class FakeObsInfo:
+    """Provide the parts of ObsInfo that are used."""
+
+    def __init__(self, evtfile, header=None, asol=None):
+        self.evtfile = evtfile
+        self.header = dict(HEADER) if header is None else header
+        self.asol = ASOL if asol is None else asol
+
+    def get_evtfile(self):
+        return self.evtfile
+
+    def get_evtfile_no_dmfilter(self):
+        return fileio.get_file(self.evtfile)
+
+    def get_header(self):
+        return self.header
+
+    def get_asol(self):
+        return self.asol
+
+
+def fov_keys(**kwargs):
+    """The FOV header, based on the observation."""
+
+    keys = dict(HEADER)
+    keys["ASOLFILE"] = "pcadf01843_000N001_asol1.fits"
+    keys["MASKFILE"] = "acisf01843_000N004_msk1.fits.gz"
+    for key, val in kwargs.items():
+        if val is None:
+            del keys[key]
+        else:
+            keys[key] = val
+
+    return keys
+
+
+@pytest.fixture
+def fovdir(tmp_path, monkeypatch):
+    """Set up the header and transform values for the files.
+
+    The files dictionary maps from the file name to a (keys, cols,
+    transform) tuple.
+    """
+
+    files = {}
+
+    def get_keys_cols(fname):
+        try:
+            return files[fname][:2]
+        except KeyError:
+            raise IOError(f"Unable to open {fname}") from None
+
+    def get_transform(fname):
+        try:
+            return files[fileio.get_file(fname)][2]
+        except KeyError:
+            raise IOError(f"Unable to open {fname}") from None
+
+    monkeypatch.setattr(fileio, "get_keys_cols_from_file", get_keys_cols)
+    monkeypatch.setattr(fileio, "get_sky_transform", get_transform)
+
+    evtfile = str(tmp_path / "acisf01843_repro_evt2.fits")
+    files[evtfile] = (dict(HEADER), COLUMNS, TRANSFORM)
+
+    def add(name, keys=None, cols=COLUMNS, transform=TRANSFORM):
+        fname = tmp_path / name
+        fname.write_bytes(b"")
+        files[str(fname)] = (fov_keys() if keys is None else keys,
+                             cols, transform)
+        return str(fname)
+
+    return SimpleNamespace(evtfile=evtfile, add=add, files=files)
+
+
+def test_no_fov_files(fovdir):
+    obs = FakeObsInfo(fovdir.evtfile)
+    assert fileio.find_matching_fov(obs) is None
+
+
+@pytest.mark.parametrize("name", ["acisf01843_repro_fov1.fits",
+                                  "acisf01843_repro_fov1.fits.gz",
+                                  "acisf01843.fov"])
+@pytest.mark.parametrize("maskfile", [None, MASK])
+def test_matching_fov(name, maskfile, fovdir):
+
+    fovfile = fovdir.add(name)
+    obs = FakeObsInfo(fovdir.evtfile)
+    assert fileio.find_matching_fov(obs, maskfile=maskfile) == fovfile
+
+
+def test_ignores_other_files(fovdir):
+
+    fovdir.add("acisf01843_repro_bpix1.fits")
+    obs = FakeObsInfo(fovdir.evtfile)
+    assert fileio.find_matching_fov(obs) is None
+
+
+def test_dm_filter(fovdir):
+    """An event file with a DM filter does not re-use a FOV file"""
+
+    fovdir.add("acisf01843_repro_fov1.fits")
+    obs = FakeObsInfo(fovdir.evtfile + "[ccd_id=7]")
+    assert fileio.find_matching_fov(obs) is None
+
+
+@pytest.mark.parametrize("key,value",
+                         [("OBS_ID", 1844), ("OBI_NUM", 1), ("CYCLE", "S"),
+                          ("ASOLFILE", "pcadf01843_000N002_asol1.fits"),
+                          ("ASOLFILE", None),
+                          ("MASKFILE", "acisf01843_000N005_msk1.fits")])
+def test_keyword_mismatch(key, value, fovdir):
+
+    fovdir.add("acisf01843_repro_fov1.fits", keys=fov_keys(**{key: value}))
+    obs = FakeObsInfo(fovdir.evtfile)
+    assert fileio.find_matching_fov(obs, maskfile=MASK) is None
+
+
+@pytest.mark.parametrize("key", ["OBS_ID", "OBI_NUM", "CYCLE", "MASKFILE"])
+def test_missing_keyword_is_ignored(key, fovdir):
+
+    fovfile = fovdir.add("acisf01843_repro_fov1.fits",
+                         keys=fov_keys(**{key: None}))
+    obs = FakeObsInfo(fovdir.evtfile)
+    assert fileio.find_matching_fov(obs, maskfile=MASK) == fovfile
+
+
+def test_mask_mismatch_ignored_without_maskfile(fovdir):
+
+    fovfile = fovdir.add("acisf01843_repro_fov1.fits",
+                         keys=fov_keys(MASKFILE="other_msk1.fits"))
+    obs = FakeObsInfo(fovdir.evtfile)
+    assert fileio.find_matching_fov(obs) == fovfile
+
+
+def test_multiple_asol_files(fovdir):
+
+    asol = ["/data/a/pcadf1_asol1.fits", "/data/b/pcadf2_asol1.fits.gz"]
+    fovfile = fovdir.add("acisf01843_repro_fov1.fits",
+                         keys=fov_keys(ASOLFILE="pcadf2_asol1.fits.gz,pcadf1_asol1.fits"))
+    obs = FakeObsInfo(fovdir.evtfile, asol=asol)
+    assert fileio.find_matching_fov(obs) == fovfile
+
+    obs = FakeObsInfo(fovdir.evtfile, asol=asol[:1])
+    assert fileio.find_matching_fov(obs) is None
+
+
+@pytest.mark.parametrize("transform",
+                         [([4096.5, 4096.5], [246.91, -24.6],
+                           [-1.366e-4, 1.366e-4]),
+                          ([4096.5, 4096.5], [246.9, -24.6]),
+                          ([4096.5, 4096.5], [246.9, -24.6],
+                           [-1.366e-4, 1.366e-4, 0.0])])
+def test_transform_mismatch(transform, fovdir):
+    """A FOV file for the un-reprojected data is not used"""
+
+    fovdir.add("acisf01843_repro_fov1.fits", transform=transform)
+    obs = FakeObsInfo(fovdir.evtfile)
+    assert fileio.find_matching_fov(obs) is None
+
+
+def test_unreadable_transform(fovdir, monkeypatch):
+
+    fovfile = fovdir.add("acisf01843_repro_fov1.fits")
+
+    def fail(fname):
+        raise IOError(f"no transform for {fname}")
+
+    obs = FakeObsInfo(fovdir.evtfile)
+    monkeypatch.setattr(fileio, "get_sky_transform", fail)
+    assert fileio.find_matching_fov(obs) is None
+    assert not fileio._fov_matches(fovfile, obs,
+                                   {"pcadf01843_000N001_asol1.fits"},
+                                   None, TRANSFORM)
+
+
+@pytest.mark.parametrize("cols", [None, COLUMNS[:3], COLUMNS[1:]])
+def test_not_a_fov(cols, fovdir):
+
+    fovdir.add("acisf01843_repro_fov1.fits", cols=cols)
+    obs = FakeObsInfo(fovdir.evtfile)
+    assert fileio.find_matching_fov(obs) is None
+
+
+def test_picks_the_matching_file(fovdir):
+
+    fovdir.add("a_fov1.fits", keys=fov_keys(OBI_NUM=1))
+    fovfile = fovdir.add("b_fov1.fits")
+    fovdir.add("c_fov1.fits", transform=TRANSFORM[:2])
+
+    obs = FakeObsInfo(fovdir.evtfile)
+    assert fileio.find_matching_fov(obs) == fovfile
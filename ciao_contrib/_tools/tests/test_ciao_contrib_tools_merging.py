@@ -0,0 +1,215 @@
+"""Check the tile-based image code in ciao_contrib._tools.merging"""
+
+import gzip
+
+import numpy as np
+
+import pytest
+
+from ciao_contrib._tools import merging
+
+
+def card(name, value):
+    """Create a FITS header card."""
+
+    if isinstance(value, str):
+        value = f"'{value:8s}'"
+    elif isinstance(value, bool):
+        value = "T" if value else "F"
+
+    return f"{name:8s}= {value:>20}".ljust(80)
+
+
+def header(cards):
+    """Create a FITS header, padded to a multiple of 2880 bytes."""
+
+    hdr = "".join(cards) + "END".ljust(80)
+    nblocks = (len(hdr) + 2879) // 2880
+    return hdr.ljust(nblocks * 2880).encode("ascii")
+
+
+def image_hdu(vals, extension=False, bscale=None, bzero=None):
+    """Create an image HDU for the 2D array."""
+
+    code = vals.dtype.str[1:]
+    bitpix = {"i2": 16, "f4": -32, "f8": -64}[code]
+    vals = vals.astype(f">{code}")
+
+    if extension:
+        cards = [card("XTENSION", "IMAGE")]
+    else:
+        cards = [card("SIMPLE", True)]
+
+    cards.extend([card("BITPIX", bitpix),
+                  card("NAXIS", 2),
+                  card("NAXIS1", vals.shape[1]),
+                  card("NAXIS2", vals.shape[0])])
+    if bscale is not None:
+        cards.append(card("BSCALE", bscale))
+    if bzero is not None:
+        cards.append(card("BZERO", bzero))
+
+    data = vals.tobytes()
+    npad = -len(data) % 2880
+    return header(cards) + data + b"\0" * npad
+
+
+def write_image(path, vals, **kwargs):
+    path.write_bytes(image_hdu(vals, **kwargs))
+    return str(path)
+
+
+def make_image(ny=7, nx=5, dtype=">f4"):
+    vals = np.arange(ny * nx).reshape(ny, nx).astype(dtype)
+    if vals.dtype.kind == "f":
+        vals[2, 3] = np.nan
+
+    return vals
+
+
+def test_find_fits_image_primary(tmp_path):
+    vals = make_image()
+    infile = write_image(tmp_path / "img.fits", vals)
+    with open(infile, "rb") as fh:
+        loc = merging._find_fits_image(fh)
+
+    assert loc == (2880, np.dtype(">f4"), (7, 5), 1.0, 0.0)
+
+
+def test_find_fits_image_extension(tmp_path):
+    vals = make_image(dtype=">i2")
+    primary = header([card("SIMPLE", True), card("BITPIX", 8),
+                      card("NAXIS", 0)])
+    infile = tmp_path / "img.fits"
+    infile.write_bytes(primary + image_hdu(vals, extension=True,
+                                           bscale=2.0, bzero=10.0))
+    with open(infile, "rb") as fh:
+        loc = merging._find_fits_image(fh)
+
+    assert loc == (2 * 2880, np.dtype(">i2"), (7, 5), 2.0, 10.0)
+
+
+def test_find_fits_image_not_fits(tmp_path):
+    infile = tmp_path / "img.txt"
+    infile.write_text("1 2 3\n")
+    with open(infile, "rb") as fh:
+        assert merging._find_fits_image(fh) is None
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_image_rows(compress, tmp_path):
+    vals = make_image(dtype=">i2")
+    hdu = image_hdu(vals, bscale=2.0, bzero=10.0)
+    if compress:
+        infile = tmp_path / "img.fits.gz"
+        infile.write_bytes(gzip.compress(hdu))
+    else:
+        infile = tmp_path / "img.fits"
+        infile.write_bytes(hdu)
+
+    reader = merging._ImageRows(str(infile))
+    assert reader.shape == (7, 5)
+
+    expected = 2.0 * vals + 10.0
+    assert reader.rows(0, 7) == pytest.approx(expected)
+    assert reader.rows(2, 4) == pytest.approx(expected[2:4])
+
+    # The rows can be read more than once
+    assert reader.rows(2, 4) == pytest.approx(expected[2:4])
+
+
+@pytest.mark.parametrize("tilerows", [None, 1, 2, 3, 7, 10])
+def test_weighted_mean_tiles(tilerows, tmp_path):
+
+    infiles = [write_image(tmp_path / f"img{i}.fits", make_image() + i)
+               for i in range(3)]
+    readers = [merging._ImageRows(infile) for infile in infiles]
+    exps = [1.0, 2.0, 4.0]
+
+    def make_term(reader, exp):
+        def term(lo, hi):
+            ivals = reader.rows(lo, hi)
+            return (exp * np.nan_to_num(ivals),
+                    exp * np.isfinite(ivals))
+
+        return term
+
+    terms = [make_term(r, e) for r, e in zip(readers, exps)]
+    got = merging._weighted_mean_tiles((7, 5), terms, tilerows=tilerows)
+    assert got.dtype == np.float32
+
+    expected = sum(e * (make_image() + i) for i, e in enumerate(exps)) / sum(exps)
+    assert np.isnan(got[2, 3])
+    good = np.isfinite(expected)
+    assert got[good] == pytest.approx(expected[good])
+
+
+class FakeImageCrate:
+    """Provide the parts of pycrates.IMAGECrate that are used."""
+
+    def __init__(self, vals):
+        self._vals = vals
+
+    def get_image(self):
+        return self
+
+    @property
+    def values(self):
+        return self._vals
+
+
+def test_image_rows_filtered(monkeypatch):
+    """Files with a DM filter are read a section at a time"""
+
+    vals = make_image(ny=9, nx=4)
+    infile = "img.fits[sky=region(src.reg)]"
+    names = []
+
+    def read_file(filename):
+        names.append(filename)
+        if filename == infile:
+            return FakeImageCrate(vals)
+
+        section = filename[len(infile):]
+        assert section.startswith("[#1=1:4,#2=")
+        (lo, hi) = [int(v) for v in section[11:-1].split(":")]
+        return FakeImageCrate(vals[lo - 1:hi])
+
+    monkeypatch.setattr(merging.pycrates, "IMAGECrate", FakeImageCrate,
+                        raising=False)
+    monkeypatch.setattr(merging.pycrates, "read_file", read_file,
+                        raising=False)
+
+    reader = merging._ImageRows(infile)
+    assert reader.shape == (9, 4)
+    assert names == [infile]
+
+    # The image values are not kept.
+    assert not any(isinstance(v, np.ndarray) for v in vars(reader).values())
+
+    got = reader.rows(2, 5)
+    assert got.dtype == np.float64
+    assert got == pytest.approx(vals[2:5], nan_ok=True)
+    assert names[1:] == [infile + "[#1=1:4,#2=3:5]"]
+
+    terms = [lambda lo, hi: (np.nan_to_num(reader.rows(lo, hi)),
+                             np.isfinite(reader.rows(lo, hi)))]
+    got = merging._weighted_mean_tiles((9, 4), terms, tilerows=2)
+    good = np.isfinite(vals)
+    assert got[good] == pytest.approx(vals[good])
+    assert np.isnan(got[~good]).all()
+
+    # Each tile reads only its rows
+    sections = names[2:]
+    assert sections[:2] == [infile + "[#1=1:4,#2=1:2]"] * 2
+    assert sections[-1] == infile + "[#1=1:4,#2=9:9]"
+
+
+def test_image_rows_not_an_image(monkeypatch):
+
+    monkeypatch.setattr(merging.pycrates, "IMAGECrate", FakeImageCrate,
+                        raising=False)
+    monkeypatch.setattr(merging.pycrates, "read_file",
+                        lambda filename: object(), raising=False)
+    with pytest.raises(ValueError):
+        merging._ImageRows("evt.fits[events]")
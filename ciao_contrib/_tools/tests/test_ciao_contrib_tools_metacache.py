@@ -0,0 +1,106 @@
+"""Check ciao_contrib._tools.metacache"""
+
+import os
+
+import numpy as np
+
+import pytest
+
+from ciao_contrib._tools import metacache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    """Use an empty cache, with no on-disk store."""
+    orig = metacache.get_cache_dir()
+    metacache.set_cache_dir(None)
+    metacache.clear()
+    yield
+    metacache.clear()
+    metacache.set_cache_dir(orig)
+
+
+class Counter:
+    """Count the number of times the function is called."""
+
+    def __init__(self, value):
+        self.value = value
+        self.ncalls = 0
+
+    def __call__(self, fname):
+        self.ncalls += 1
+        return self.value
+
+
+def test_cached_value_is_reused(cache, tmp_path):
+    infile = tmp_path / "evt.fits"
+    infile.write_text("dummy")
+
+    func = Counter({"OBS_ID": 1843})
+    assert metacache.cached("keys", str(infile), func) == {"OBS_ID": 1843}
+    assert metacache.cached("keys", str(infile), func) == {"OBS_ID": 1843}
+    assert func.ncalls == 1
+
+
+def test_cached_value_is_a_copy(cache, tmp_path):
+    infile = tmp_path / "evt.fits"
+    infile.write_text("dummy")
+
+    func = Counter({"OBS_ID": 1843})
+    x = metacache.cached("keys", str(infile), func)
+    x["OBS_ID"] = 2
+    y = metacache.cached("keys", str(infile), func)
+    assert y == {"OBS_ID": 1843}
+
+
+def test_cached_filter_is_used_in_key(cache, tmp_path):
+    infile = tmp_path / "evt.fits"
+    infile.write_text("dummy")
+
+    func = Counter(23)
+    metacache.cached("keys", str(infile), func)
+    metacache.cached("keys", f"{infile}[ccd_id=7]", func)
+    metacache.cached("keys", f"{infile}[ccd_id=7]", func)
+    assert func.ncalls == 2
+
+
+def test_cached_file_change(cache, tmp_path):
+    infile = tmp_path / "evt.fits"
+    infile.write_text("dummy")
+
+    func = Counter(23)
+    metacache.cached("aimpoint", str(infile), func)
+    infile.write_text("a different file")
+    metacache.cached("aimpoint", str(infile), func)
+    assert func.ncalls == 2
+
+
+def test_cached_missing_file_is_not_cached(cache, tmp_path):
+    infile = tmp_path / "evt.fits"
+
+    func = Counter(23)
+    metacache.cached("aimpoint", str(infile), func)
+    metacache.cached("aimpoint", str(infile), func)
+    assert func.ncalls == 2
+
+
+def test_cached_on_disk(cache, tmp_path):
+    infile = tmp_path / "evt.fits"
+    infile.write_text("dummy")
+
+    cachedir = tmp_path / "cache"
+    metacache.set_cache_dir(str(cachedir))
+    assert os.path.isdir(cachedir)
+
+    func = Counter(np.asarray([0, 1, 2, 3, 6, 7], dtype=np.int16))
+    metacache.cached("unique:ccd_id", str(infile), func)
+    metacache.cached("tangent", str(infile), Counter((1.5, -2.5)))
+
+    # The values should now be read from disk
+    metacache.clear()
+    x = metacache.cached("unique:ccd_id", str(infile), func)
+    y = metacache.cached("tangent", str(infile), Counter(None))
+    assert func.ncalls == 1
+    assert x.dtype == np.int16
+    assert x == pytest.approx([0, 1, 2, 3, 6, 7])
+    assert y == (1.5, -2.5)
@@ -26,6 +26,7 @@ retrieve interface.
 """
 
 import os
+import gzip
 
 import ciao_contrib.logger_wrapper as lw
 
@@ -1099,7 +1100,7 @@ def discover_filenames_per_type( mysrc, myfile, mybands, catalog ):
     return filenames
 
 
-def check_existing( ff, off ):
+def check_existing( ff, off, decompress=False ):
     """
     Check if a file exists or has already been downloaded
     """
@@ -1116,18 +1117,23 @@ def check_existing( ff, off ):
     if ff in __all_retieved_files__:
         verb2("File {0} already retrieved, will make a copy".format(ff))
         import shutil as shutil
-        shutil.copyfile( __all_retieved_files__[ff]+"/{0}.gz".format(ff) , off+".gz")
+        suffix = "" if decompress else ".gz"
+        shutil.copyfile( __all_retieved_files__[ff]+"/{0}{1}".format(ff, suffix) , off+suffix)
         return True
 
     return False
 
 
-def retrieve_files_per_type( filenames, filetype, root, catalog ):
+def retrieve_files_per_type( filenames, filetype, root, catalog, decompress=False ):
     """
     Retrieve the files using the retrieveFile interface.
 
     This requires the file name and the file type.
 
+    If decompress is set then the files are decompressed in memory
+    before being written out, so the compressed version is never
+    written to disk.
+
     Added extra logic to skip if the file already exists on
     disk. Also if already retrieve, then skip.  File may
     already have been retrieved if the source is an
@@ -1141,7 +1147,7 @@ def retrieve_files_per_type( filenames, filetype, root, catalog ):
 
         off = root + os.sep + ff # path + filename
 
-        if check_existing( ff, off ):
+        if check_existing( ff, off, decompress ):
             continue
 
         resource = "https://cda.cfa.harvard.edu/csccli/retrieveFile"
@@ -1159,8 +1165,12 @@ def retrieve_files_per_type( filenames, filetype, root, catalog ):
             verb0("Problem retrieveing file {0}".format(ff))
             raise
 
-        # Possible RFE would be to unzip in memory ala chandra_repro
-        with open( off+".gz", 'wb' ) as fp:
+        if decompress:
+            page = gzip.decompress(page)
+        else:
+            off = off+".gz"
+
+        with open( off, 'wb' ) as fp:
             fp.write(page)
 
         verb1("Retrieved file {}".format(off))
@@ -1239,7 +1249,7 @@ def process_ask( ask, pp ):
             verb0("Unrecognized option '{}'".format( resp ))
 
 
-def retrieve_files( mysrcs, root, myfiles, mybands, ask, catalog, byObi=False ):
+def retrieve_files( mysrcs, root, myfiles, mybands, ask, catalog, byObi=False, decompress=False ):
     """
     Loop over sources and retrieve files
     """
@@ -1259,13 +1269,13 @@ def retrieve_files( mysrcs, root, myfiles, mybands, ask, catalog, byObi=False ):
             raise NotImplementedError("Internal Error: invalid ask value")
 
         try:
-            retrieve_files_per_src( mysrc, root, myfiles, mybands, catalog, byObi )
+            retrieve_files_per_src( mysrc, root, myfiles, mybands, catalog, byObi, decompress )
         except ValueError as e:
             verb0( str(e) )
             verb0("  Continuing")
 
 
-def retrieve_files_per_src( mysrc, inroot, myfiles, mybands, catalog, byObi=False ):
+def retrieve_files_per_src( mysrc, inroot, myfiles, mybands, catalog, byObi=False, decompress=False ):
     """
     For a single source, loop over file types and retrieve each
     """
@@ -1281,7 +1291,7 @@ def retrieve_files_per_src( mysrc, inroot, myfiles, mybands, catalog, byObi=Fals
         root = create_output_dir( inroot, mysrc, ft, byObi, catalog )
         fnames = discover_filenames_per_type( mysrc, ft, mybands, catalog )
         if fnames:
-            retrieve_files_per_type( fnames, ft, root, catalog )
+            retrieve_files_per_type( fnames, ft, root, catalog, decompress )
 
 
 def check_filetypes( alist, catalog ):
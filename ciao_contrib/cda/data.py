@@ -281,7 +281,7 @@ class ObsIdFile:
 
         return f"  {ftype:8s} {self.fileformat:6s} {slabel:>9s}  "
 
-    def download(self, headers):
+    def download(self, headers, decompress=False):
         """Download the file.
 
         The file is written to the location obsid/filename and screen
@@ -293,6 +293,10 @@ class ObsIdFile:
         resume the download. If the size is larger then we skip, but
         with a warning message.
 
+        If decompress is set then gzip-compressed files are
+        decompressed as they are downloaded, and the compressed
+        version is not written to disk.
+
         The return value is a tuple of number of bytes and download
         time in seconds (if nothing is downloaded then the values are
         set to 0).
@@ -318,7 +322,8 @@ class ObsIdFile:
                                                size,
                                                outfile,
                                                headers=headers,
-                                               verbose=verbose)
+                                               verbose=verbose,
+                                               decompress=decompress)
 
 
 class ObsId:
@@ -409,7 +414,7 @@ class ObsId:
 
         return sum([f.get_filesize(self.header) for f in self.files])
 
-    def download(self):
+    def download(self, decompress=False):
         """Download the files for the ObsId to the current
         working directory.
 
@@ -420,6 +425,9 @@ class ObsId:
         Files we can not download (e.g. doesn't exist or some other
         reason) are skipped. This is to support possible future
         changes in the HTML response from the archive.
+
+        If decompress is set then gzip-compressed files are
+        decompressed as they are downloaded.
         """
 
         V3(f"Downloading {len(self.files)} files")
@@ -447,7 +455,8 @@ class ObsId:
             fileobj = itemgetter(1)(oelem)
 
             try:
-                (a, b) = fileobj.download(self.header)
+                (a, b) = fileobj.download(self.header,
+                                          decompress=decompress)
             except urllib.error.URLError as uerr:
                 V1(f"SKIPPING {fileobj.filename} as {uerr}")
                 continue
@@ -472,7 +481,8 @@ def get_http_header():
 
 def download_chandra_obsids(obsids,
                             filetypes=None, excludes=None,
-                            mirror=None
+                            mirror=None,
+                            decompress=False
                             ):
     """Download the obsids from the Chandra Data Archive -
     https://cxc.harvard.edu/cda/ - or a mirror site.
@@ -502,6 +512,11 @@ def download_chandra_obsids(obsids,
         value is equivalent to setting mirror to
         https://cxc.cfa.harvard.edu/cdaftp/. Note that this is not
         tested.
+    decompress : bool, optional
+        If set then gzip-compressed files are decompressed as they
+        are downloaded, so the compressed version is never written
+        to disk. Partially-downloaded files can not be resumed when
+        this is set.
 
     Returns
     -------
@@ -544,6 +559,8 @@ def download_chandra_obsids(obsids,
 
     >>> download_chandra_obsid([1843, 1557], filetypes=['evt2', 'asol'])
 
+    >>> download_chandra_obsid([1843], decompress=True)
+
     """
 
     if filetypes is not None and excludes is not None:
@@ -583,7 +600,7 @@ def download_chandra_obsids(obsids,
             continue
 
         oid.filter_files(types=filetypes, excludes=excludes, formats=None)
-        oid.download()
+        oid.download(decompress=decompress)
         out.append(True)
 
     return out
@@ -42,6 +42,7 @@ from ciao_contrib.psf_contrib import PSF
 from .widthofexclusion import counts_circle_band, pnt_src_masking_region
 from .constants import X_R, Period, mm_per_pix, arcsec_per_pix, hc, Alpha
 import ciao_contrib.logger_wrapper as lw
+from coords.utils import SkyIndex
 
 TOOLNAME = 'crisscross'
 __revision__  = '28 May 2026'
@@ -416,37 +417,38 @@ def match_subset_to_main(RA_main, DEC_main, RA_sub, DEC_sub, match_offset=0.5):
 
     Notes
     -----
-    This implementation simply calculates all pairwise distances. A KD-Tree or
-    similar structure would be more efficient, but we expect that this will
-    be used for no more than a few thousand sources and thus the brute-force
-    approach is sufficient.
+    The candidate matches are found with `coords.utils.SkyIndex`, so the run time
+    and memory use do not grow as the product of the list sizes.
+
+    The distance compared to match_offset has always been calculated as the haversine
+    formula with an extra factor of 1/2, i.e. 2 arcsin(sin(theta / 2) / sqrt(2)) for
+    a separation theta, and this is retained so that match_offset keeps its meaning.
 
     References
     ----------
     [1] https://en.wikipedia.org/wiki/Haversine_formula
     """
-    dlon = RA_main[None, :] - RA_sub[:, None]
-    dlat = DEC_main[None, :] - DEC_sub[:, None]
-    hav_theta = (1 / 2) * (
-        np.sin(np.deg2rad(dlat) / 2) ** 2
-        + np.cos(np.deg2rad(DEC_sub[:, None]))
-        * np.cos(np.deg2rad(DEC_main[None, :]))
-        * np.sin(np.deg2rad(dlon) / 2) ** 2
-    )
-    theta = 2 * np.arcsin(np.sqrt(hav_theta))
-    min_theta = np.min(theta, axis=1)
-    if np.any(min_theta > np.deg2rad(match_offset / 3600)):
-        ind = min_theta > np.deg2rad(match_offset / 3600)
+    def to_offset(sep):
+        return 2 * np.arcsin(np.sin(np.deg2rad(sep) / 2) / np.sqrt(2))
+
+    max_sep = 2 * np.arcsin(min(1, np.sqrt(2) * np.sin(np.deg2rad(match_offset / 3600) / 2)))
+
+    index = SkyIndex(RA_main, DEC_main)
+    qidx, idx, _ = index.query_radius(RA_sub, DEC_sub, np.rad2deg(max_sep))
+    nmatch = np.bincount(qidx, minlength=len(RA_sub))
+    if np.any(nmatch == 0):
+        ind = nmatch == 0
+        _, min_sep = index.query_nearest(RA_sub[ind], DEC_sub[ind])
+        min_theta = to_offset(min_sep[:, 0])
         raise ValueError(
-            f"No match in main list found for the sources with RA={RA_sub[ind]} and DEC={DEC_sub[ind]} with min distance {min_theta[ind]} arcsec. Please make sure RA and DEC value of source to clean matches a source in main_list."
+            f"No match in main list found for the sources with RA={RA_sub[ind]} and DEC={DEC_sub[ind]} with min distance {min_theta} arcsec. Please make sure RA and DEC value of source to clean matches a source in main_list."
         )
-    ind = theta < np.deg2rad(match_offset / 3600)
-    if np.any(ind.sum(axis=1) > 1):
-        ind_multi = ind.sum(axis=1) > 1
+    if np.any(nmatch > 1):
+        ind_multi = nmatch > 1
         raise ValueError(
             f"Multiple matches in main list found for the sources with RA={RA_sub[ind_multi]} and DEC={DEC_sub[ind_multi]}. Please make sure there are no duplicate entries in main list or subset_list."
         )
-    return np.argmin(theta, axis=1)
+    return idx
 
 
 def calc_physical_coords(fits_par, RA, DEC):
@@ -465,9 +467,6 @@ def calc_physical_coords(fits_par, RA, DEC):
     """
     cel_convert = Cel2Chandra(fits_par)
     src = cel_convert(RA, DEC)
-    for key, value in src.items():
-        if isinstance(value, list):
-            src[key] = np.array(value)
     src["RA"] = RA
     src["DEC"] = DEC
     src["pos"] = np.stack([src["x"], src["y"]], axis=-1)
@@ -475,15 +474,12 @@ def calc_physical_coords(fits_par, RA, DEC):
     src["ID"] = np.arange(0, src["n"])
 
     psf = PSF()
-    psf_size = np.zeros(src["n"])
-    for i in range(0,src["n"]):
-        psf_size[i] = psf.psfSize(
-            energy_keV=2.0,
-            theta_arcmin=src["theta"][i],
-            phi_deg=src["phi"][i],
-            ecf=0.9,
-        )
-    src["psf_size"] = psf_size
+    src["psf_size"] = psf.psfSize(
+        energy_keV=2.0,
+        theta_arcmin=src["theta"],
+        phi_deg=src["phi"],
+        ecf=0.9,
+    )
 
     return src
 
@@ -493,7 +489,7 @@ def find_closest_source(src, wave_file, max_offset=3.0):
     Matches sources from the main_list to the wavdetect source table with the goal of removing erroneous
     disperssed-grating-line sources. Wavdetect is not meant to be run on HETG observations and thus will include many
     'false' detections from the dispersed spectra. This identifies the closest matching source in a group to a single
-    source based on Chandra SKY physical coordinates only. If multiple matches are found for a single source within
+    source based on the celestial coordinates of the sources only. If multiple matches are found for a single source within
     max_offset, only the closest of the matches is assigned to the source. This avoids 'double counting'. This returns
     the number of NET_COUNTS associated with 0th order (non-dispersed) detections. NET_COUNTS are used throughout
     CrissCross to determine the severity of confusion.
@@ -501,7 +497,7 @@ def find_closest_source(src, wave_file, max_offset=3.0):
     Parameters
     ----------
     src : dict
-        Dictionary with source properties including positions in Chandra physical units.
+        Dictionary with source properties, including the RA, DEC, and psf_size (in arcsec) values.
     wave_file : str
         path to wavdetect output source fits table.
     max_offset : float
@@ -512,74 +508,32 @@ def find_closest_source(src, wave_file, max_offset=3.0):
     # read in and assign relevant wavdetect columns
     wave_data = read_file(wave_file)
 
-    src_wave_x_arr = wave_data.POS.X.values
-    src_wave_y_arr = wave_data.POS.Y.values
     counts_wave = wave_data.NET_COUNTS.values
 
-    closest_dist_arr = np.empty(
-        src["n"], dtype="float"
-    )  # holds the distance in arcsec to the closest matching source from the wavedetect table
-    closest_match_arr = np.empty(
-        src["n"], dtype="int"
-    )  # holds the index value from the wavedetect table that is the closest match to a source in the source list.
-
-    # these will hold the values above for the matched source AFTER you remove double matches and sources > max_offset.
-    final_match_arr = np.empty(src["n"], dtype=object)
-    final_dist_arr = np.empty(src["n"], dtype=object)
-
-    matched_0th_counts_arr = np.empty(
-        src["n"], dtype="float"
-    )  # the final 0th_order counts array (NET_COUNTS) from the wavedetect table MATCHED to the user-provided source list.
-
-    # this loop determines the distance from the user-provided source to ALL the sources in the wavedetect table and
-    # only saves a non-bogus value if there is a source with separation < max_offset.
-    for i in range(0, src["n"]):
-        dist_arr = []
-        dist_arr = np.sqrt(
-            (src["x"][i] - src_wave_x_arr) ** 2 + (src["y"][i] - src_wave_y_arr) ** 2
-        )  # This calculates the physical distance from source [i] in the user-provided table to ALL sources in the
-        # wavedetect table. This is just the hypotenuse in the xy plane. Note, calculating the ENTIRE array here for
-        #  each [i] source and NOT each [i] and each [j] individually.
-
-        closest_dist = []
-        closest_dist = (
-            np.min(dist_arr) * arcsec_per_pix
-        )  # converted from sky coords to arsec
-
-        # if distance is > max offset then assign values of 99999 (bogus) and filter out in next loop. Otherwise,
-        # assign matched values.
-        if closest_dist <= src['psf_size'][i]:
-            closest_dist_arr[i] = closest_dist
-            closest_match_arr[i] = np.where(dist_arr == np.min(dist_arr))[0][0]  #
-        else:
-            closest_dist_arr[i] = 99999
-            closest_match_arr[i] = 99999
-
-    # this loop will remove 'double counting' where a single user-provided source might match to multiple wavedetect
-    #  sources. This will only match to the closest one and remove that from the pool of potential matches for other sources.
-    for i in range(0, src["n"]):
-        common_matches = np.where(
-            closest_match_arr == closest_match_arr[i]
-        )[
-            0
-        ]  # this will give an array of index values which all have the same closest matched source.
-        common_matches_dist = closest_dist_arr[
-            common_matches
-        ]  # this will provide an array of all of the distances for the closest matched sources. The idea is that
-        # only the closest distance can be assigned to a single source (no double counting).
-
-        if (
-            (closest_dist_arr[i] <= src['psf_size'][i])
-            and (closest_dist_arr[i] == np.min(common_matches_dist))
-        ):  # if the current source's closest distance is the closest of all the common matches then it is 'correct'
-            # and assigned the wavedetect number of counts. Otherwise, counts are set to 0 (not detected)
-            final_match_arr[i] = closest_match_arr[i]
-            final_dist_arr[i] = closest_dist_arr[i]
-            matched_0th_counts_arr[i] = counts_wave[closest_match_arr[i]]
-        else:
-            final_match_arr[i] = "no match"
-            final_dist_arr[i] = "no match"
-            matched_0th_counts_arr[i] = 0
+    # Find the closest wavdetect source to each user-provided source, as long as it is within the PSF size of the
+    # source. Unmatched sources have an index of -1.
+    index = SkyIndex(wave_data.RA.values, wave_data.DEC.values)
+    idx, sep = index.query_nearest(src["RA"], src["DEC"], radius=np.asarray(src["psf_size"]) / 3600)
+    closest_match_arr = idx[:, 0]
+    closest_dist_arr = sep[:, 0] * 3600  # converted from degrees to arcsec
+    matched = closest_match_arr >= 0
+
+    # Remove 'double counting' where several user-provided sources have the same closest wavdetect source. Only the
+    # closest of these sources is matched; the counts of the others are set to 0 (not detected).
+    best_dist = np.full(len(counts_wave), np.inf)
+    np.minimum.at(best_dist, closest_match_arr[matched], closest_dist_arr[matched])
+    keep = matched.copy()
+    keep[matched] = closest_dist_arr[matched] == best_dist[closest_match_arr[matched]]
+
+    # these hold the values for the matched source AFTER removing double matches and sources > psf_size.
+    final_match_arr = np.full(src["n"], "no match", dtype=object)
+    final_dist_arr = np.full(src["n"], "no match", dtype=object)
+    final_match_arr[keep] = closest_match_arr[keep]
+    final_dist_arr[keep] = closest_dist_arr[keep]
+
+    # the final 0th_order counts array (NET_COUNTS) from the wavedetect table MATCHED to the user-provided source list.
+    matched_0th_counts_arr = np.zeros(src["n"])
+    matched_0th_counts_arr[keep] = counts_wave[closest_match_arr[keep]]
 
     return (final_match_arr, final_dist_arr, matched_0th_counts_arr)
 
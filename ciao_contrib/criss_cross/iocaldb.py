@@ -19,8 +19,8 @@ import numpy as np
 
 import caldb4
 from pycrates import read_file
-from coords.chandra import sky_to_chandra
-from coords.chandra import cel_to_chandra
+from coords.chandra import sky_to_chandra_array
+from coords.chandra import cel_to_chandra_array
 
 
 __all__ = ['Sky2Chandra',
@@ -32,7 +32,7 @@ __all__ = ['Sky2Chandra',
 class Sky2Chandra:
     '''Convert Chandra physical coordinates to other coordinate systems.
 
-    This class is a simple wrapper around the function `sky_to_chandra` from
+    This class is a simple wrapper around the function `sky_to_chandra_array` from
     the `coords.chandra` package. When an object of this class is created,
     it reads the header of a fits file to get the WCS information and saves
     that. The object can then be called to perform coordinate transformations
@@ -52,15 +52,15 @@ class Sky2Chandra:
         '''
         Parameters
         ----------
-        x, y : float
+        x, y : float or array
             X, Y position in physical pixels
         '''
-        return sky_to_chandra(self.keywords, x, y)
+        return sky_to_chandra_array(self.keywords, x, y)
 
 class Cel2Chandra:
     '''Convert Celestial coordinates to other coordinate systems.
 
-    This class is a simple wrapper around the function `cel_to_chandra` from
+    This class is a simple wrapper around the function `cel_to_chandra_array` from
     the `coords.chandra` package. When an object of this class is created,
     it reads the header of a fits file to get the WCS information and saves
     that. The object can then be called to perform coordinate transformations
@@ -80,10 +80,10 @@ class Cel2Chandra:
         '''
         Parameters
         ----------
-        x, y : float
-            X, Y position in physical pixels
+        x, y : float or array
+            RA, Dec position in degrees
         '''
-        return cel_to_chandra(self.keywords, x, y)
+        return cel_to_chandra_array(self.keywords, x, y)
 
 class CALDBException(Exception):
     pass
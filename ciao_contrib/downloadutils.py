@@ -56,6 +56,25 @@ Download a URL to a file, supporting
 
   - continuation of a previous partial download
   - a rudimentary progress bar to display progress
+  - decompression of gzip-encoded files as they are downloaded,
+    so that the data is only written to disk once
+
+gunzip_file
+-----------
+
+Decompress a gzip file to disk, streaming the data so that the
+whole file does not need to be read into memory.
+
+gunzip_files
+------------
+
+Decompress a set of gzip files, using multiple threads.
+
+gunzip_tree
+-----------
+
+Decompress all the gzip files found in a directory tree, using
+multiple threads.
 
 Stability
 ---------
@@ -70,7 +89,11 @@ import os
 import sys
 import ssl
 import time
+import zlib
+import gzip
+import shutil
 
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
 from subprocess import check_output
 
@@ -95,7 +118,10 @@ __all__ = ('retrieve_url',
            'find_downloadable_files',
            'find_all_downloadable_files',
            'ProgressBar',
-           'download_progress')
+           'download_progress',
+           'gunzip_file',
+           'gunzip_files',
+           'gunzip_tree')
 
 
 def manual_download(url):
@@ -651,7 +677,8 @@ def download_progress(url, size, outfile,
                       headers=None,
                       progress=None,
                       chunksize=8192,
-                      verbose=True):
+                      verbose=True,
+                      decompress=False):
     """Download url and store in outfile, reporting progress.
 
     The download will use chunks, logging the output to the
@@ -682,12 +709,35 @@ def download_progress(url, size, outfile,
     verbose : bool, optional
         Should progress information on the download be written to
         stdout?
+    decompress : bool, optional
+        If set, and outfile ends in '.gz', then the data is
+        decompressed as it is downloaded and written to outfile
+        without the '.gz' suffix, so the compressed version is never
+        written to disk.
+
+    Returns
+    -------
+    nbytes, dtime : int, float
+        The number of bytes downloaded (this is the compressed size
+        when decompress is set) and the time taken, in seconds.
+
+    See Also
+    --------
+    gunzip_file, gunzip_tree
 
     Notes
     -----
     This routine assumes that the HTTP server supports ranged
     requests [1]_, and ignores SSL validation of the request.
 
+    When decompress is set a partial download can not be continued,
+    as the decompressed size is not known, so the data is written to
+    a temporary file which is only renamed once the download has
+    completed. A decompressed file is therefore assumed to be
+    complete, and is not downloaded again. If the compressed file
+    is already on disk, and has the expected size, then it is
+    decompressed rather than downloaded.
+
     The assumption is that the resource is static (i.e. it hasn't
     been updated since content was downloaded). This means that it
     is possible the output will be invalid, for instance if it
@@ -719,6 +769,13 @@ def download_progress(url, size, outfile,
     else:
         raise ValueError("Unsupported URL scheme: {}".format(url))
 
+    if decompress and outfile.endswith('.gz'):
+        return _download_decompress(conn, purl, size, outfile,
+                                    headers=headers,
+                                    progress=progress,
+                                    chunksize=chunksize,
+                                    verbose=verbose)
+
     startfrom = 0
     try:
         fsize = os.path.getsize(outfile)
@@ -819,3 +876,282 @@ def download_progress(url, size, outfile,
         v0("WARNING file sizes do not match: expected {} but downloaded {}".format(size, nbytes))
 
     return (nbytes, dtime)
+
+
+class _GzipStream:
+    """Decompress a gzip stream a chunk at a time.
+
+    As with the gzip module, the stream can contain multiple members,
+    which are concatenated, and zero padding after a member is
+    ignored.
+    """
+
+    def __init__(self):
+        self._decomp = self._new()
+
+    @staticmethod
+    def _new():
+        # The 16 + MAX_WBITS setting handles the gzip header and
+        # trailer.
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+    @property
+    def eof(self):
+        """Has the end of a member been reached?"""
+        return self._decomp.eof
+
+    def decompress(self, chunk):
+        """Return the decompressed data for the chunk."""
+
+        out = []
+        while chunk:
+            if self._decomp.eof:
+                chunk = chunk.lstrip(b"\0")
+                if not chunk:
+                    break
+
+                self._decomp = self._new()
+
+            out.append(self._decomp.decompress(chunk))
+            chunk = self._decomp.unused_data
+
+        return b"".join(out)
+
+    def flush(self):
+        """Return any remaining decompressed data."""
+        return self._decomp.flush()
+
+
+def _download_decompress(conn, purl, size, outfile,
+                         headers=None,
+                         progress=None,
+                         chunksize=8192,
+                         verbose=True):
+    """Download and decompress a gzip file.
+
+    See download_progress for the parameters; outfile is the name
+    of the compressed file, which ends in '.gz'.
+    """
+
+    dest = outfile[:-3]
+    if os.path.exists(dest):
+        v3(f"Decompressed file {dest} exists")
+        if verbose:
+            sys.stdout.write("{:>20s}\n".format("already downloaded"))
+            sys.stdout.flush()
+
+        return (0, 0)
+
+    # Support the case where the compressed file has been downloaded
+    # but not decompressed.
+    #
+    try:
+        fsize = os.path.getsize(outfile)
+    except OSError:
+        fsize = None
+
+    if fsize == size:
+        v3(f"Compressed file {outfile} exists - decompressing it")
+        gunzip_file(outfile, chunksize=chunksize)
+        if verbose:
+            sys.stdout.write("{:>20s}\n".format("already downloaded"))
+            sys.stdout.flush()
+
+        return (0, 0)
+
+    tmpfile = dest + '.part'
+    try:
+        outfp = open(tmpfile, 'wb')
+    except IOError:
+        raise IOError("Unable to create '{}'".format(tmpfile))
+
+    if progress is None:
+        progress = ProgressBar(size)
+
+    if headers is None:
+        headers = {'User-Agent':
+                   'ciao_contrib.downloadutils.download_progress'}
+
+    decomp = _GzipStream()
+
+    nbytes = 0
+    time0 = time.time()
+    conn.request('GET', purl.path, headers=headers)
+    try:
+        with conn.getresponse() as rsp:
+
+            if verbose:
+                progress.start(0)
+
+            while True:
+                chunk = rsp.read(chunksize)
+                if not chunk:
+                    break
+
+                nbytes += len(chunk)
+                outfp.write(decomp.decompress(chunk))
+                if verbose:
+                    progress.add(len(chunk))
+
+            outfp.write(decomp.flush())
+            if verbose:
+                progress.end()
+
+    except BaseException:
+        outfp.close()
+        os.remove(tmpfile)
+        raise
+
+    time1 = time.time()
+    outfp.close()
+
+    if not decomp.eof:
+        # Leave the partial file so the user can see what happened,
+        # but do not treat it as a valid download.
+        v0(f"WARNING the download of {outfile} is incomplete; see {tmpfile}")
+    else:
+        os.replace(tmpfile, dest)
+
+    dtime = time1 - time0
+    if verbose:
+        rate = nbytes / (1024 * dtime)
+        tlabel = stringify_dt(dtime)
+        sys.stdout.write("  {:>13s}  {:.1f} kb/s\n".format(tlabel, rate))
+
+    if size != nbytes:
+        v0("WARNING file sizes do not match: expected {} but downloaded {}".format(size, nbytes))
+
+    return (nbytes, dtime)
+
+
+def gunzip_file(infile, outfile=None, keep=False, chunksize=1024 * 1024):
+    """Decompress a gzip file.
+
+    The data is streamed, so the whole file is never read into
+    memory, and is written to a temporary file which is renamed
+    once decompression has completed.
+
+    Parameters
+    ----------
+    infile : str
+        The name of the gzip file.
+    outfile : str or None, optional
+        The output name. If None then infile with the '.gz' suffix
+        removed is used (it is an error if infile does not end
+        in '.gz').
+    keep : bool, optional
+        Should infile be kept? The default is to delete it once it
+        has been decompressed.
+    chunksize : int, optional
+        The size of each read, in bytes.
+
+    Returns
+    -------
+    outfile : str
+        The name of the decompressed file.
+
+    """
+
+    if outfile is None:
+        if not infile.endswith('.gz'):
+            raise ValueError(f"Expected {infile} to end in .gz")
+
+        outfile = infile[:-3]
+
+    tmpfile = outfile + '.part'
+    try:
+        with gzip.open(infile, 'rb') as ifh:
+            with open(tmpfile, 'wb') as ofh:
+                shutil.copyfileobj(ifh, ofh, chunksize)
+
+    except BaseException:
+        if os.path.exists(tmpfile):
+            os.remove(tmpfile)
+        raise
+
+    os.replace(tmpfile, outfile)
+    if not keep:
+        os.remove(infile)
+
+    v3(f"{outfile} gunzipped.")
+    return outfile
+
+
+def gunzip_files(infiles, nproc=None, keep=False):
+    """Decompress multiple gzip files in parallel.
+
+    Threads are used, rather than processes, since the decompression
+    and file I/O release the Python GIL.
+
+    Parameters
+    ----------
+    infiles : sequence of str
+        The files to decompress; each must end in '.gz'.
+    nproc : int or None, optional
+        The number of threads to use. If None then the number of
+        processors is used.
+    keep : bool, optional
+        Should the compressed files be kept?
+
+    Returns
+    -------
+    outfiles : list of str
+        The decompressed file names, in the same order as infiles.
+
+    """
+
+    infiles = list(infiles)
+    if len(infiles) == 0:
+        return []
+
+    if nproc is None:
+        nproc = os.cpu_count() or 1
+
+    nproc = max(1, min(nproc, len(infiles)))
+    v3(f"Decompressing {len(infiles)} files with {nproc} threads")
+
+    if nproc == 1:
+        return [gunzip_file(infile, keep=keep) for infile in infiles]
+
+    with ThreadPoolExecutor(max_workers=nproc) as executor:
+        out = executor.map(lambda f: gunzip_file(f, keep=keep), infiles)
+        return list(out)
+
+
+def gunzip_tree(dirname, nproc=None, keep=False):
+    """Decompress all gzip files in a directory tree.
+
+    Any file ending in '.gz' which does not have a decompressed
+    version is decompressed.
+
+    Parameters
+    ----------
+    dirname : str
+        The directory to search.
+    nproc : int or None, optional
+        The number of threads to use. If None then the number of
+        processors is used.
+    keep : bool, optional
+        Should the compressed files be kept?
+
+    Returns
+    -------
+    outfiles : list of str
+        The decompressed file names.
+
+    """
+
+    infiles = []
+    for dpath, _, fnames in os.walk(dirname):
+        for fname in sorted(fnames):
+            if not fname.endswith('.gz'):
+                continue
+
+            infile = os.path.join(dpath, fname)
+            if os.path.exists(infile[:-3]):
+                v3(f"Skipping {infile} as it has already been decompressed")
+                continue
+
+            infiles.append(infile)
+
+    return gunzip_files(infiles, nproc=nproc, keep=keep)
@@ -88,6 +88,8 @@ Converting position '23.2  -0.012'
 """
 
 import subprocess as sbp
+from collections import OrderedDict
+
 import numpy as np
 
 import datetime
@@ -191,11 +193,108 @@ def _colden(ra, dec, dataset):
     return out
 
 
-# Note that this is inefficient when sent in multiple values, since the
-# tool is run once per coordinate, rather than taking advantage of the
-# 'batch' mode of colden.
+def _parse_colden_values(sout):
+    """Return the column densities from the colden output, in the
+    order they are reported. Lines that can not be converted are
+    returned as None.
+    """
+
+    out = []
+    for oline in sout.splitlines():
+        toks = oline.split()
+        if len(toks) < 2 or toks[0] != 'Hydrogen' or toks[1] != 'density':
+            continue
+
+        try:
+            out.append(float(toks[4]))
+        except IndexError:
+            v2("Unexpected colden output: unable to parse '{}'".format(oline))
+            out.append(None)
+        except ValueError:
+            v2("Unexpected colden output: unable to convert '{}' to a number".format(toks[4]))
+            out.append(None)
+
+    return out
+
+
+def _colden_batch(positions, dataset):
+    """Returns the column densities, in units of 10^20 cm^-2, for
+    the list of (ra, dec) positions and dataset, using a single
+    call to colden (with one eval command per position).
+
+    If the output can not be matched up to the positions - e.g.
+    because colden did not report a value for one of them - then
+    colden is run separately for each position.
+    """
+
+    v2("Running colden in batch mode for {} positions for dataset {}".format(len(positions), dataset))
+    args = ["prop_colden", "f", "j/deg", "data", dataset]
+    for (ra, dec) in positions:
+        args.extend(["eval", str(ra), str(dec)])
+
+    rval, sout = _run_proc('colden', args)
+    if rval == 0:
+        out = _parse_colden_values(sout)
+        if len(out) == len(positions):
+            return out
+
+        v2("Colden returned {} values for {} positions; evaluating each position separately".format(len(out), len(positions)))
+
+    else:
+        v2("Colden failed to run successfully in batch mode; evaluating each position separately")
+
+    return [_colden(ra, dec, dataset) for (ra, dec) in positions]
+
+
+# Cache of the colden results, indexed by (dataset, ra, dec), where the
+# position is rounded to _COLDEN_CACHE_DECIMALS decimal places (a
+# precision of ~0.04 arcseconds, much smaller than the resolution of
+# the colden data sets). The least-recently used values are removed
+# once there are more than _COLDEN_CACHE_SIZE entries.
 #
-def colden(ra, dec, dataset='NRAO'):
+_colden_cache = OrderedDict()
+_COLDEN_CACHE_DECIMALS = 5
+_COLDEN_CACHE_SIZE = 100000
+
+# The maximum number of positions sent to a single colden call.
+_COLDEN_CHUNKSIZE = 500
+
+
+def _colden_key(ra, dec, dataset):
+    return (dataset.upper(),
+            round(float(ra), _COLDEN_CACHE_DECIMALS),
+            round(float(dec), _COLDEN_CACHE_DECIMALS))
+
+
+def _colden_cache_get(keys):
+    """Return the cached values for the keys, as a dictionary,
+    marking them as recently used."""
+
+    out = {}
+    for key in keys:
+        try:
+            out[key] = _colden_cache[key]
+        except KeyError:
+            continue
+
+        _colden_cache.move_to_end(key)
+
+    return out
+
+
+def _colden_cache_add(keys, vals):
+    """Add the values to the cache, removing the least-recently
+    used values if necessary."""
+
+    for key, val in zip(keys, vals):
+        _colden_cache[key] = val
+        _colden_cache.move_to_end(key)
+
+    while len(_colden_cache) > _COLDEN_CACHE_SIZE:
+        _colden_cache.popitem(last=False)
+
+
+def colden(ra, dec, dataset='NRAO', cache=True):
     """Return the column density, in units of 10^20 cm^2,
     for the given location(s).
 
@@ -211,6 +310,12 @@ def colden(ra, dec, dataset='NRAO'):
     A value of None is returned for any position for which a value can
     not be computed.
 
+    Multiple positions are sent to colden together, in chunks of
+    up to 500 positions, rather than running colden for each position.
+    When cache is True the results are stored - using the position
+    rounded to 5 decimal places - and re-used by later calls; only
+    the 100000 most-recently used positions are kept.
+
     There is no support for changing the velocity limits for the
     Stark et al data (dataset='Bell') or for indicating whether
     the result is interpolated or not.
@@ -253,9 +358,34 @@ def colden(ra, dec, dataset='NRAO'):
     else:
         v2("Running colden for {} positions (using {} data set)".format(nargs, dataset))
 
-    out = []
-    for (a, b) in args:
-        out.append(_colden(a, b, dataset))
+    keys = [_colden_key(a, b, dataset) for (a, b) in args]
+    results = {}
+    if cache:
+        results.update(_colden_cache_get(keys))
+
+    # Evaluate each new position once, even if repeated.
+    todo = {}
+    for key, pos in zip(keys, args):
+        if key not in results:
+            todo.setdefault(key, pos)
+
+    if len(results) > 0:
+        v3("Using {} cached colden values".format(len(set(keys)) - len(todo)))
+
+    tkeys = list(todo.keys())
+    for start in range(0, len(tkeys), _COLDEN_CHUNKSIZE):
+        ckeys = tkeys[start:start + _COLDEN_CHUNKSIZE]
+        cpos = [todo[key] for key in ckeys]
+        if len(cpos) == 1:
+            cvals = [_colden(cpos[0][0], cpos[0][1], dataset)]
+        else:
+            cvals = _colden_batch(cpos, dataset)
+
+        results.update(zip(ckeys, cvals))
+        if cache:
+            _colden_cache_add(ckeys, cvals)
+
+    out = [results[key] for key in keys]
 
     if multi:
         if isinstance(ra, np.ndarray) or isinstance(dec, np.ndarray):
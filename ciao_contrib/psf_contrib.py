@@ -29,79 +29,277 @@ For this module, the size of the PSF refers to the radius of a circular region
 that encloses a given fraction of the counts from a point source. The values
 are calculated by interpolating the values from the REEF file found in the
 CALDB. It is therefore an approximation to the true PSF.
+
+The energy, off-axis angle, azimuth, and size or fraction arguments
+can be arrays, which are broadcast against each other. The REEF file
+is only read once per session, however many PSF objects are created
+or times the module-level routines are called.
+
+For large numbers of look ups, the PSFGrid class evaluates the PSF
+size on a grid of energy, theta, phi, and enclosed fraction values,
+which can be saved to disk, and then interpolates this grid:
+
+>>> import numpy as np
+>>> grid = PSFGrid.create(energy=[1, 2, 4, 8], theta=np.arange(0, 21),
+...                       phi=[0, 90, 180, 270, 360],
+...                       ecf=[0.5, 0.8, 0.9, 0.95])
+>>> grid.save("psfgrid.npz")
+>>> grid = PSFGrid.load("psfgrid.npz")
+>>> sizes = grid.psfSize(2.0, thetas, phis, 0.9)
 """
+import atexit
 import contextlib
+import itertools
+import threading
+
+import numpy as np
 
 import psf
 import caldb4
 
 
-__all__ = ['PSF', 'psfFrac', 'psfSize']
+__all__ = ['PSF', 'PSFGrid', 'psfFrac', 'psfSize']
+
+
+_shared_pdata = None
+_shared_lock = threading.Lock()
+
+
+def _read_reef():
+    """Read in the REEF file from the CALDB."""
+    cdb = caldb4.Caldb(telescope="CHANDRA", product="REEF")
+    # Need check here that search returns values?
+    reef = cdb.search[0][:-3]
+    cdb.close()
+    return psf.psfInit(reef)
+
+
+def _close_shared():
+    global _shared_pdata
+    if _shared_pdata is not None:
+        psf.psfClose(_shared_pdata)
+        _shared_pdata = None
+
+
+def _get_shared_pdata():
+    """Return the REEF data, which is only read in once per session."""
+    global _shared_pdata
+    with _shared_lock:
+        if _shared_pdata is None:
+            _shared_pdata = _read_reef()
+            atexit.register(_close_shared)
+
+        return _shared_pdata
+
+
+def _evaluate(func, pdata, *args):
+    """Call func(pdata, *args) for each element of the broadcast
+    arguments.
+
+    A float is returned if all the arguments are scalars, otherwise
+    an array with the broadcast shape.
+    """
+    bargs = np.broadcast_arrays(*[np.asarray(arg, dtype=float)
+                                  for arg in args])
+    if bargs[0].ndim == 0:
+        return func(pdata, *[float(arg) for arg in bargs])
+
+    out = np.empty(bargs[0].shape)
+    flat = out.reshape(-1)
+    for idx, vals in enumerate(zip(*[arg.ravel().tolist()
+                                     for arg in bargs])):
+        flat[idx] = func(pdata, *vals)
+
+    return out
 
 
 class PSF(contextlib.AbstractContextManager):
     def __init__(self, pdata=None):
+        # When pdata is not given the REEF data is shared by all
+        # instances, and so is not freed by close.
+        self._owner = pdata is not None
         if pdata is None:
-            cdb = caldb4.Caldb(telescope="CHANDRA", product="REEF")
-            # Need check here that search returns values?
-            reef = cdb.search[0][:-3]
-            cdb.close
-            pdata = psf.psfInit(reef)
+            pdata = _get_shared_pdata()
         self.pdata = pdata
 
     def __exit__(self, exc_type, exc_value, traceback):
         self.close()
 
     def close(self):
-        psf.psfClose(self.pdata)
+        if self._owner:
+            psf.psfClose(self.pdata)
 
     def psfFrac(self, energy_keV, theta_arcmin, phi_deg, size_arcsec):
         """Return approximated enclosed count fraction of a PSF
 
         Parameters
         ----------
-        energy : float
+        energy : float or array
             Energy in keV
-        theta : float
+        theta : float or array
             off-axis angle in arcmin
             (see the MSC coordinate system described in "ahelp coords")
-        phi : float
+        phi : float or array
             angle in degrees
             (see the MSC coordinate system described in "ahelp coords")
-        size : float
+        size : float or array
             radius in arcsec
 
         Returns
         -------
-        eef : float
+        eef : float or array
             enclosed count fraction
         """
-        return psf.psfFrac(self.pdata, energy_keV, theta_arcmin,
-                           phi_deg, size_arcsec)
+        return _evaluate(psf.psfFrac, self.pdata, energy_keV, theta_arcmin,
+                         phi_deg, size_arcsec)
 
     def psfSize(self, energy_keV, theta_arcmin, phi_deg, ecf):
         """Return approximated enclosed count fraction of a PSF
 
         Parameters
         ----------
-        energy : float
+        energy : float or array
             Energy in keV
-        theta : float
+        theta : float or array
             off-axis angle in arcmin
             (see the MSC coordinate system described in "ahelp coords")
-        phi : float
+        phi : float or array
             angle in degrees
             (see the MSC coordinate system described in "ahelp coords")
+        ecf : float or array
+            enclosed count fraction
 
         Returns
         -------
-        size : float
+        size : float or array
             radius in arcsec
-        eef : float
+        """
+        return _evaluate(psf.psfSize, self.pdata, energy_keV,
+                         theta_arcmin, phi_deg, ecf)
+
+
+class PSFGrid:
+    """The PSF size evaluated on a grid of energy, theta, phi, and ecf.
+
+    The psfSize method uses linear interpolation of the grid, so is
+    much faster than calling PSF.psfSize for a large number of
+    positions, but is only as accurate as the grid allows. Values
+    outside the grid are clipped to the grid edges.
+
+    Parameters
+    ----------
+    energy, theta, phi, ecf : array
+        The grid values, in keV, arcmin, degrees, and as a fraction.
+        Each must be in increasing order.
+    size : array
+        The PSF radius, in arcsec, with shape
+        (len(energy), len(theta), len(phi), len(ecf)).
+    """
+
+    def __init__(self, energy, theta, phi, ecf, size):
+        self.axes = [np.asarray(axis, dtype=float)
+                     for axis in (energy, theta, phi, ecf)]
+        for name, axis in zip(["energy", "theta", "phi", "ecf"], self.axes):
+            if axis.ndim != 1 or axis.size == 0:
+                raise ValueError(f"{name} must be a non-empty 1D array")
+            if np.any(np.diff(axis) <= 0):
+                raise ValueError(f"{name} must be in increasing order")
+
+        self.size = np.asarray(size, dtype=float)
+        shape = tuple(axis.size for axis in self.axes)
+        if self.size.shape != shape:
+            raise ValueError(f"size must have shape {shape}, not {self.size.shape}")
+
+    @classmethod
+    def create(cls, energy, theta, phi, ecf, pdata=None):
+        """Evaluate the PSF size on the grid.
+
+        Parameters
+        ----------
+        energy, theta, phi, ecf : array
+            The grid values, in keV, arcmin, degrees, and as a
+            fraction. Each must be in increasing order.
+        pdata : optional
+            The REEF data to use; if not set the default CALDB file
+            is used.
+
+        Returns
+        -------
+        grid : PSFGrid
+        """
+        axes = np.meshgrid(energy, theta, phi, ecf, indexing="ij")
+        with PSF(pdata) as _psf:
+            size = _psf.psfSize(*axes)
+
+        return cls(energy, theta, phi, ecf, size)
+
+    @classmethod
+    def load(cls, filename):
+        """Read in a grid written out by the save method."""
+        with np.load(filename) as data:
+            return cls(data["energy"], data["theta"], data["phi"],
+                       data["ecf"], data["size"])
+
+    def save(self, filename):
+        """Write the grid to filename (a NumPy .npz file)."""
+        energy, theta, phi, ecf = self.axes
+        np.savez(filename, energy=energy, theta=theta, phi=phi,
+                 ecf=ecf, size=self.size)
+
+    def psfSize(self, energy_keV, theta_arcmin, phi_deg, ecf):
+        """Return the interpolated PSF size.
+
+        Parameters
+        ----------
+        energy : float or array
+            Energy in keV
+        theta : float or array
+            off-axis angle in arcmin
+        phi : float or array
+            angle in degrees
+        ecf : float or array
             enclosed count fraction
+
+        Returns
+        -------
+        size : float or array
+            radius in arcsec
         """
-        return psf.psfSize(self.pdata, energy_keV,
-                           theta_arcmin, phi_deg, ecf)
+        pts = np.broadcast_arrays(*[np.asarray(arg, dtype=float)
+                                    for arg in (energy_keV, theta_arcmin,
+                                                phi_deg, ecf)])
+        shape = pts[0].shape
+
+        # For each axis find the lower grid index and the weight of
+        # the upper point.
+        idxs = []
+        wgts = []
+        for axis, pt in zip(self.axes, pts):
+            pt = np.clip(pt.ravel(), axis[0], axis[-1])
+            if axis.size == 1:
+                idxs.append(np.zeros(pt.size, dtype=int))
+                wgts.append(np.zeros(pt.size))
+                continue
+
+            idx = np.clip(np.searchsorted(axis, pt, side="right") - 1,
+                          0, axis.size - 2)
+            idxs.append(idx)
+            wgts.append((pt - axis[idx]) / (axis[idx + 1] - axis[idx]))
+
+        out = np.zeros(idxs[0].size)
+        for corner in itertools.product((0, 1), repeat=4):
+            wgt = np.ones(out.size)
+            index = []
+            for upper, idx, w, axis in zip(corner, idxs, wgts, self.axes):
+                wgt *= w if upper else 1 - w
+                index.append(np.minimum(idx + upper, axis.size - 1))
+
+            out += wgt * self.size[tuple(index)]
+
+        if len(shape) == 0:
+            return float(out[0])
+
+        return out.reshape(shape)
 
 
 def psfFrac(energy, theta, phi, size):
@@ -109,24 +307,23 @@ def psfFrac(energy, theta, phi, size):
 
     Parameters
     ----------
-    energy : float
+    energy : float or array
         Energy in keV
-    theta : float
+    theta : float or array
         off-axis angle in arcmin
         (see the MSC coordinate system described in "ahelp coords")
-    phi : float
+    phi : float or array
         angle in degrees
         (see the MSC coordinate system described in "ahelp coords")
-    size : float
+    size : float or array
         radius in arcsec
 
     Returns
     -------
-    ecf : float
+    ecf : float or array
         enclosed count fraction
     """
-    with PSF() as _psf:
-        return _psf.psfFrac(energy, theta, phi, size)
+    return PSF().psfFrac(energy, theta, phi, size)
 
 
 def psfSize(energy_keV, theta_arcmin, phi_deg, ecf):
@@ -134,21 +331,20 @@ def psfSize(energy_keV, theta_arcmin, phi_deg, ecf):
 
     Parameters
     ----------
-    energy : float
+    energy : float or array
         Energy in keV
-    theta : float
+    theta : float or array
         off-axis angle in arcmin
         (see the MSC coordinate system described in "ahelp coords")
-    phi : float
+    phi : float or array
         angle in degrees
         (see the MSC coordinate system described in "ahelp coords")
-    ecf : float
+    ecf : float or array
         enclosed count fraction
 
     Returns
     -------
-    size : float
+    size : float or array
         radius in arcsec
     """
-    with PSF() as _psf:
-        return _psf.psfSize(energy_keV, theta_arcmin, phi_deg, ecf)
+    return PSF().psfSize(energy_keV, theta_arcmin, phi_deg, ecf)
@@ -28,6 +28,8 @@ Routines to support check_fov tool
 __all__ = (  )
 
 
+import numpy as np
+
 import ciao_contrib.logger_wrapper as lw
 
 lgr = lw.initialize_logger("ciao_contrib.region.check_fov")
@@ -36,6 +38,84 @@ verb1 = lgr.verbose1
 
 from region import *
 
+
+# Padding added to the radius of the bounding cap of each FOV, in
+# degrees, since the FOV polygons are tested in RA/Dec space rather
+# than on the sphere.
+CAP_PADDING = 1.0 / 60
+
+# Maximum number of (position, FOV) pairs to compare at once in
+# the bounding-cap check.
+CHUNK_SIZE = 1000000
+
+
+def _unit_vectors(ra, dec):
+    """Convert RA/Dec, in degrees, to unit vectors (n by 3)."""
+    ra = np.deg2rad(ra)
+    dec = np.deg2rad(dec)
+    cdec = np.cos(dec)
+    return np.stack([cdec * np.cos(ra), cdec * np.sin(ra), np.sin(dec)],
+                    axis=-1)
+
+
+def _read_fov_columns(fov):
+    """Return the SHAPE, POS, and EQPOS columns of the FOV file."""
+    import pycrates
+
+    cr = pycrates.TABLECrate(fov, mode="r")
+    return [cr.get_column(cname).values
+            for cname in ["SHAPE", "POS", "EQPOS"]]
+
+
+def _polygon_vertices(shapes, pos, eqpos):
+    """Return the EQPOS vertices, as a (2, n) array, of each row of
+    the FOV file.
+
+    Each polygon is cut at the last point which repeats the first
+    point, as done by FOVRegion, but - unlike FOVRegion - rows with
+    the same CCD_ID are all kept, since merged FOV files can contain
+    several polygons for a chip. An IOError is raised if any row is
+    not a polygon, or the end of a polygon can not be found.
+    """
+    out = []
+    for shape, xy, eq in zip(shapes, pos, eqpos):
+        if str(shape).strip().lower() != "polygon":
+            raise IOError("Unsupported shape {}".format(shape))
+
+        x = xy[0]
+        y = xy[1]
+        idx = ((x == x[0]) & (y == y[0])).nonzero()[0]
+        if len(idx) < 2:
+            raise IOError("Unable to find end of region")
+
+        out.append(eq[:, :idx[-1]])
+
+    if len(out) == 0:
+        raise IOError("No polygons found")
+
+    return out
+
+
+def _bounding_cap(fov):
+    """Return the center (unit vector) and cosine of the radius of
+    a cap on the sphere which contains all the polygons of the FOV
+    file, or None if the polygons can not be read.
+    """
+    try:
+        polys = _polygon_vertices(*_read_fov_columns(fov))
+    except (IOError, ValueError) as ioe:
+        verb1("Unable to find the extent of {}: {}".format(fov, ioe))
+        return None
+
+    verts = np.concatenate([_unit_vectors(*poly) for poly in polys])
+    center = verts.mean(axis=0)
+    center /= np.linalg.norm(center)
+
+    radius = np.arccos(np.clip(verts @ center, -1, 1)).max()
+    radius += np.deg2rad(CAP_PADDING)
+    return center, np.cos(min(radius, np.pi))
+
+
 class FOVFiles():
     """
     Manage a stack of Field of View (FOV) files
@@ -92,6 +172,90 @@ class FOVFiles():
             # Store region object
             self.fovs[oo] = rr
 
+        self._make_index()
+
+
+    def _make_index( self ):
+        """
+        Store a bounding cap for each FOV file, so that only those
+        files whose cap contains a position need the full region
+        check. Files whose extent can not be calculated are always
+        checked.
+        """
+
+        self.names = list(self.fovs)
+        caps = [_bounding_cap(ff) for ff in self.names]
+
+        # A cap with cos(radius) = -1 covers the whole sky
+        self._centers = np.asarray([(0, 0, 1) if cap is None else cap[0]
+                                    for cap in caps], dtype=float)
+        self._cosrad = np.asarray([-1 if cap is None else cap[1]
+                                   for cap in caps], dtype=float)
+
+
+    def inside_indices( self, ra, dec ):
+        """
+        Check which FOV files contain each of the RA / Dec positions,
+        in decimal degrees (J2000). The return value is a pair of
+        arrays - the index of the position and the index of the FOV
+        file in the names attribute - for each match, ordered by
+        the position index.
+
+        Example:
+
+        >>> myfov = FOVFiles("*fov1.fits.gz")
+        >>> pidx, fidx = myfov.inside_indices(ras, decs)
+        >>> for p, f in zip(pidx, fidx):
+        ...     print(ras[p], decs[p], myfov.names[f])
+
+        """
+
+        ra = np.atleast_1d(np.asarray(ra, dtype=float))
+        dec = np.atleast_1d(np.asarray(dec, dtype=float))
+        if ra.ndim != 1 or ra.shape != dec.shape:
+            raise ValueError("ra and dec must be 1D and have the same size")
+
+        pos = _unit_vectors(ra, dec)
+        nfov = len(self.names)
+        step = max(1, CHUNK_SIZE // max(1, nfov))
+
+        pidx = []
+        fidx = []
+        for start in range(0, len(ra), step):
+            # Candidates are those FOV files whose cap contains the
+            # position.
+            cands = pos[start:start + step] @ self._centers.T >= self._cosrad
+            for pi, fi in zip(*cands.nonzero()):
+                pi += start
+                if regInsideRegion(self.fovs[self.names[fi]], ra[pi], dec[pi]):
+                    pidx.append(pi)
+                    fidx.append(fi)
+
+        return np.asarray(pidx, dtype=int), np.asarray(fidx, dtype=int)
+
+
+    def inside_many( self, ra, dec ):
+        """
+        Check which FOV files contain each of the RA / Dec positions,
+        in decimal degrees (J2000). A list, with one element per
+        position, of the FOV file names containing that position is
+        returned.
+
+        Example:
+
+        >>> myfov = FOVFiles("*fov1.fits.gz")
+        >>> infovs = myfov.inside_many([56.32114, 56.4], [-32.12245, -32.2])
+        >>> print(infovs)
+        [["acisf00635_repro_fov1.fits", "acisf00637_repro_fov1.fits"], []]
+
+        """
+
+        pidx, fidx = self.inside_indices(ra, dec)
+        retval = [[] for _ in range(np.size(ra))]
+        for pi, fi in zip(pidx, fidx):
+            retval[pi].append(self.names[fi])
+        return retval
+
 
     def inside( self, ra, dec ):
         """
@@ -102,18 +266,14 @@ class FOVFiles():
         
         >>> myfov = FOVFiles("*fov1.fits.gz")
         >>> infov = myfov.inside( 56.32114, -32.12245)
-        >>> print infov
+        >>> print(infov)
         [ "acisf00635_repro_fov1.fits", "acisf00637_repro_fov1.fits"]
 
         See ahelp("sex2deg") for examples of how to convert HMS to 
         decimal degrees.
         
         """
-        retval = []
-        for ff in self.fovs:
-            if regInsideRegion( self.fovs[ff], ra,dec ):
-                retval.append(ff)
-        return retval
+        return self.inside_many([ra], [dec])[0]
 
     def __repr__( self ):
         """
@@ -124,4 +284,3 @@ class FOVFiles():
         for ff in self.fovs:
             ss=ss+"  "+ff+"\n"        
         return ss
-
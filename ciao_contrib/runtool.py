@@ -428,6 +428,41 @@ and then run them on files
 The new_tmpdir() and new_pfiles_environment() context managers can
 also be useful when running multiple tools.
 
+Editing header keywords
+=======================
+
+The update_header_keys routine adds, changes, or deletes a set of
+header keywords, with optional units and comments, in one or more
+files. The edits are made directly, rather than by running dmhedit
+for each keyword, and multiple files can be processed in parallel.
+
+  update_header_keys("img.fits", {"BUNIT": "",
+                                  "EXPOSURE": (2.3e4, "s", "Exposure time"),
+                                  "ASPTYPE": None})
+
+Running tools in parallel
+=========================
+
+The submit method of a tool runs it in the background and returns a
+concurrent.futures.Future object, rather than waiting for the tool
+to finish. Each call uses a copy of the tool - so the parameter
+values can be changed, or the tool submitted again, while it is
+running - along with its own parameter file and PFILES directory,
+so that multiple copies of a tool can be run at the same time:
+
+  futs = [dmstat.submit(f"img{i}.fits", centroid=False)
+          for i in range(4)]
+  for fut in futs:
+      fut.result()
+      print(f"Mean = {fut.tool.out_mean}")
+
+The result method returns the screen output of the tool, or raises
+an IOError if it failed, and the tool attribute is the copy of the
+tool that was run. The maximum number of tools that are run at the
+same time is set by set_max_jobs (the default is the number of
+processors). The asyncio.wrap_future routine can be used to await
+the result from a coroutine.
+
 Setting the HISTORY record of a file
 ====================================
 
@@ -471,8 +506,11 @@ import errno
 import shutil
 import glob
 import re
+import multiprocessing
+import threading
 
 from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
 
 # only used to check for floating-point equality
@@ -498,6 +536,11 @@ v3 = logger.verbose3
 v4 = logger.verbose4
 v5 = logger.verbose5
 
+# The parameter library is not known to be thread safe, so access to it
+# is serialized to support running tools with the submit method.
+#
+_pio_lock = threading.RLock()
+
 ParValue = namedtuple("ParValue",
                       ["name", "type", "help", "default"])
 ParSet = namedtuple("ParSet",
@@ -1764,6 +1807,16 @@ class CIAOTool(CIAOParameter):
 
         return rval
 
+    def _execute(self, pfiles=None):
+        """Run the tool with the current parameter settings. The
+        return value and errors are as described for __call__.
+
+        If pfiles is not None then it is used as the user portion of
+        the PFILES environment variable when running the tool.
+        """
+
+        raise NotImplementedError
+
     def __call__(self, *args, **kwargs):
         """Run the tool. Returns the stdout and stderr of the tool as a single
         string on success (or None if the contents are empty/only contain
@@ -1772,7 +1825,53 @@ class CIAOTool(CIAOParameter):
 
         """
 
-        raise NotImplementedError
+        # processing the argument list also validates them
+        self._process_argument_list(args, kwargs)
+        return self._execute()
+
+    def _copy(self):
+        """Returns a new instance of the tool with the same parameter
+        settings (the runtime details are not copied).
+        """
+
+        reqs = [self._store[pname] for pname in self._required]
+        opts = [self._store[pname] for pname in self._optional]
+        tool = self.__class__(self._toolname, reqs, opts)
+        tool._settings = self._settings.copy()
+        return tool
+
+    def submit(self, *args, **kwargs):
+        """Run the tool in the background. The arguments are the
+        same as when calling the tool, and are validated before
+        this method returns.
+
+        The tool is run using a copy of the object, so the parameter
+        settings of the object are not changed by the call and it can
+        be changed - or submitted again - while the tool is running.
+        Each run uses its own parameter file and a temporary PFILES
+        directory, containing a copy of the ardlib parameter file,
+        which is removed once the tool has finished.
+
+        The return value is a concurrent.futures.Future object, whose
+        result method returns the value from running the tool (or
+        raises an IOError on failure). The copy of the tool is stored
+        in the tool attribute of the future, so that the parameter
+        values set by the tool can be accessed once it has finished.
+
+        The number of tools that can run at the same time is set
+        by set_max_jobs.
+        """
+
+        tool = self._copy()
+        tool._process_argument_list(args, kwargs)
+
+        with _pio_lock:
+            ardlibpath = pio.paramgetpath('ardlib')
+
+        v5(f"Submitting {self._toolname}")
+        fut = _get_executor().submit(_run_submitted, tool, ardlibpath)
+        fut.tool = tool
+        return fut
 
 
 class CIAOToolParFile(CIAOTool):
@@ -1783,8 +1882,9 @@ class CIAOToolParFile(CIAOTool):
 
     """
 
-    def _run(self, parfile):
-        """Run the tool, using the given parameter file.
+    def _run(self, parfile, env=None):
+        """Run the tool, using the given parameter file. If env is not
+        None then it is the environment to run the tool in.
 
         Returns the return code and the screen output of the tool.
 
@@ -1809,7 +1909,8 @@ class CIAOToolParFile(CIAOTool):
                                  f"@@{parfile}",
                                  "mode=hl"],
                                 stdout=subprocess.PIPE,
-                                stderr=subprocess.STDOUT)
+                                stderr=subprocess.STDOUT,
+                                env=env)
         out = proc.communicate()
         sout = out[0].decode()
 
@@ -1825,22 +1926,25 @@ class CIAOToolParFile(CIAOTool):
         v4(f"Return code = {rval}")
         return (rval, sout)
 
-    def __call__(self, *args, **kwargs):
+    def _execute(self, pfiles=None):
 
-        # processing the argument list also validates them
-        self._process_argument_list(args, kwargs)
+        with _pio_lock:
+            parfile = self._create_parfile_copy()
 
-        parfile = self._create_parfile_copy()
         stackfiles = {}
         try:
-            stackfiles = self._update_parfile(parfile)
+            with _pio_lock:
+                stackfiles = self._update_parfile(parfile)
+
             self._display_command_line()
             _log_par_file_contents(parfile)
-            (rval, sout) = self._run(parfile)
+            (rval, sout) = self._run(parfile, env=_pfiles_env(pfiles))
             _log_par_file_contents(parfile)
 
             if rval == 0:
-                self.read_params(parfile)
+                with _pio_lock:
+                    self.read_params(parfile)
+
                 for pname in stackfiles:
                     oval = self._get_param_value(pname)
                     v5(f"Replacing {self._toolname}.{pname} = {oval}")
@@ -1891,8 +1995,10 @@ class CIAOToolDirect(CIAOTool):
 
     """
 
-    def _run(self):
+    def _run(self, env=None):
         """Run the tool, giving all the parameter on the command line.
+        If env is not None then it is the environment to run the tool
+        in.
 
         Returns the return code and the screen output of the tool.
 
@@ -1916,7 +2022,8 @@ class CIAOToolDirect(CIAOTool):
         # first item returned by communicate.
         proc = subprocess.Popen(pargs,
                                 stdout=subprocess.PIPE,
-                                stderr=subprocess.STDOUT)
+                                stderr=subprocess.STDOUT,
+                                env=env)
         out = proc.communicate()
         sout = out[0].decode()
 
@@ -1932,14 +2039,10 @@ class CIAOToolDirect(CIAOTool):
         v4(f"Return code = {rval}")
         return (rval, sout)
 
-    def __call__(self, *args, **kwargs):
-
-        # processing the argument list now validates them too
-        self._process_argument_list(args, kwargs)
-        # self._validate_parameters()
+    def _execute(self, pfiles=None):
 
         self._display_command_line()
-        (rval, sout) = self._run()
+        (rval, sout) = self._run(env=_pfiles_env(pfiles))
 
         if rval == 0:
             # Assume there is a par file we can read from
@@ -1947,7 +2050,18 @@ class CIAOToolDirect(CIAOTool):
             # the same way as they do for CIAOToolParFile instances
             # (e.g. hidden params will be reset).
             #
-            self.read_params()
+            # When run with its own PFILES directory, the tool should
+            # have written its parameter file there.
+            #
+            parfile = None
+            if pfiles is not None:
+                parfile = os.path.join(pfiles, f"{self._toolname}.par")
+                if not os.path.exists(parfile):
+                    parfile = None
+
+            with _pio_lock:
+                self.read_params(parfile)
+
             txt = sout.rstrip()
             if txt == "":
                 retval = None
@@ -2338,6 +2452,75 @@ def new_pfiles_environment(ardlib=True,
             os.environ['PFILES'] = origpfiles
 
 
+def _pfiles_env(pfiles):
+    """Returns the environment for running a tool with pfiles as the
+    user portion of the PFILES environment variable. If pfiles is None
+    then None is returned (i.e. use the current environment).
+    """
+
+    if pfiles is None:
+        return None
+
+    sdirs = get_pfiles(userdir=False)
+    syspath = "" if sdirs is None else ":".join(sdirs)
+
+    env = os.environ.copy()
+    env["PFILES"] = f"{pfiles};{syspath}"
+    return env
+
+
+def _run_submitted(tool, ardlibpath):
+    """Run the tool - as set up by CIAOTool.submit - using a new
+    PFILES directory which contains a copy of the ardlib parameter
+    file.
+    """
+
+    with new_tmpdir() as dname:
+        _copy_par_file(ardlibpath, dname)
+        return tool._execute(pfiles=dname)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    """Returns the executor used to run tools by the submit method."""
+
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=multiprocessing.cpu_count(),
+                                           thread_name_prefix="runtool")
+
+        return _executor
+
+
+def set_max_jobs(njobs=None):
+    """Set the maximum number of tools that can be run at the same
+    time using the submit method of a tool. If njobs is None then
+    the number of processors is used, which is the default.
+
+    Tools which have already been submitted are not affected by this
+    call.
+    """
+
+    global _executor
+
+    if njobs is None:
+        njobs = multiprocessing.cpu_count()
+    elif njobs < 1:
+        raise ValueError(f"njobs must be 1 or greater, not {njobs}")
+
+    with _executor_lock:
+        oexecutor = _executor
+        _executor = ThreadPoolExecutor(max_workers=njobs,
+                                       thread_name_prefix="runtool")
+
+    if oexecutor is not None:
+        oexecutor.shutdown(wait=False)
+
+
 def add_comment_lines(infile, comments):
     """Add the text in comments to infile as a COMMENT (adding to the
     most-interesting block). comments can either be a string or
@@ -2367,6 +2550,105 @@ def add_comment_lines(infile, comments):
         cxcdm.dmBlockClose(bl)
 
 
+def _write_header_keys(infile, keys):
+    """Apply the keyword edits to infile; see update_header_keys."""
+
+    v4(f"Editing {len(keys)} keywords in {infile}")
+    bl = cxcdm.dmBlockOpen(infile, update=True)
+    try:
+        for (name, keyval) in keys.items():
+            if keyval is None:
+                v5(f"Deleting keyword {name}")
+                try:
+                    key = cxcdm.dmKeyOpen(bl, name)
+                except RuntimeError:
+                    continue
+
+                cxcdm.dmDescriptorDelete(key)
+                continue
+
+            if isinstance(keyval, tuple):
+                (value, unit, desc) = keyval
+            else:
+                (value, unit, desc) = (keyval, None, None)
+
+            # Convert NumPy scalars to Python values
+            if isinstance(value, np.generic):
+                value = value.item()
+
+            v5(f"Setting keyword {name}={value} unit={unit} desc={desc}")
+            kwargs = {}
+            if unit is not None:
+                kwargs["unit"] = unit
+            if desc is not None:
+                kwargs["desc"] = desc
+
+            cxcdm.dmKeyWrite(bl, name, value, **kwargs)
+
+    finally:
+        cxcdm.dmBlockClose(bl)
+
+
+def _write_header_keys_wrapper(args):
+    """Allow _write_header_keys to be used with a process pool."""
+    _write_header_keys(*args)
+
+
+def update_header_keys(infiles, keys, nproc=1):
+    """Add, change, or delete header keywords in one or more files.
+
+    All the edits to a file are made with a single open and close of
+    the file (the "most interesting" block is edited), rather than
+    running dmhedit once per keyword.
+
+    Parameters
+    ----------
+    infiles : str or sequence of str
+        The file, or files, to edit.
+    keys : dict
+        The keyword edits. The key is the keyword name and the value
+        is either the new value, a tuple of (value, unit, desc) where
+        unit and desc can be None, or None to delete the keyword.
+    nproc : int or None, optional
+        The number of processes to use when editing multiple files.
+        If None then all the processors are used.
+
+    Notes
+    -----
+    Unlike dmhedit, no HISTORY record is added to the files.
+
+    Examples
+    --------
+
+    >>> update_header_keys("evt.fits", {"ONTIME": (2.3e4, "s", None),
+    ...                                 "LIVETIME": (2.2e4, "s", None)})
+
+    >>> update_header_keys(["img1.fits", "img2.fits"],
+    ...                    {"BUNIT": "cm**2 s", "ASPTYPE": None},
+    ...                    nproc=2)
+
+    """
+
+    if isinstance(infiles, str):
+        infiles = [infiles]
+
+    if nproc is None:
+        nproc = os.cpu_count() or 1
+
+    nproc = min(nproc, len(infiles))
+    if nproc < 2:
+        for infile in infiles:
+            _write_header_keys(infile, keys)
+
+        return
+
+    v4(f"Editing keywords in {len(infiles)} files with {nproc} processes")
+    ctx = multiprocessing.get_context('fork')
+    with ctx.Pool(nproc) as pool:
+        pool.map(_write_header_keys_wrapper,
+                 [(infile, keys) for infile in infiles])
+
+
 def add_tool_history(infiles, toolname, params,
                      toolversion=None, tmpdir=None):
     """Add a CIAO history block to each of the files in infiles saying
@@ -3925,7 +4207,7 @@ parinfo['xmatch_viz'] = {
 #
 __all__ = ["get_pfiles", "set_pfiles",
            "new_tmpdir", "new_pfiles_environment",
-           "add_tool_history",
+           "add_tool_history", "update_header_keys", "set_max_jobs",
            "list_tools", "make_tool"]
 
 for toolname in list_tools():
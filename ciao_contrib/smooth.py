@@ -1,5 +1,5 @@
 #
-#  Copyright (C) 2010, 2011, 2014, 2015, 2018
+#  Copyright (C) 2010, 2011, 2014, 2015, 2018, 2026
 #            Smithsonian Astrophysical Observatory
 #
 #
@@ -31,13 +31,21 @@ At present, limited to
 
   ismooth  - smooth image with an image
 
+The Smoother class can be used to apply the same kernel to many
+images, and all the routines accept a 3D stack of images, where
+each plane is smoothed separately.
+
 """
 
+import collections
+import threading
+
 import numpy as np
 import sherpa.utils._psf as psf
 import pycrates as pyc
 
-__all__ = ("ismooth", "gsmooth", "bsmooth", "tsmooth", "fsmooth")
+__all__ = ("ismooth", "gsmooth", "bsmooth", "tsmooth", "fsmooth",
+           "Smoother", "get_smoother", "clear_smoothers")
 
 
 # Create the kernels
@@ -118,8 +126,16 @@ def mk_boxcar(radius):
 
 # Smoothing routines
 #
-def ismooth(image, kernel, origin=None, norm=True):
-    """Convolve image with a kernel.
+class Smoother:
+    """Convolve images with a kernel, re-using the Fourier transform
+    of the kernel.
+
+    The padded kernel transform depends on the image size, so it is
+    only kept for the most-recent image shape that was smoothed; use
+    separate objects when smoothing images of different sizes in
+    turn. The smooth method
+    accepts a 2D image or a 3D stack of images, where each plane
+    (i.e. image[i]) is smoothed separately.
 
     If norm is True then the kernel will be divided by its total
     before convolution. To use the kernel as is, set norm to False
@@ -130,55 +146,201 @@ def ismooth(image, kernel, origin=None, norm=True):
     the center of the kernel is used. It is given using the numpy indexing
     scheme, so (yval,xval).
 
-    To avoid offsets between the input and output image the kernel should
-    have odd dimensions.
+    Non-finite pixels in the kernel are replaced by 0.
+    """
 
-    Non-finite pixels in either the image or kernel are replaced by 0.
-    Any such pixels in the input image are set back to NaN in the output image,
-    but the presence of such values in the kernel image are ignored.
+    def __init__(self, kernel, origin=None, norm=True):
+
+        kernel = np.asarray(kernel)
+        if kernel.ndim != 2:
+            raise ValueError("Smoother kernel must be 2D, sent {0}D".format(kernel.ndim))
+
+        # convolve takes the dimensionality with X first not last
+        kshape = kernel.shape
+        knx = kshape[1]
+        kny = kshape[0]
+        self._ks2 = (knx, kny)
+
+        if norm:
+            nkernel = kernel * 1.0 / kernel.sum()
+        else:
+            nkernel = kernel * 1.0
+
+        self._kernel = np.nan_to_num(nkernel.flatten())
+
+        if origin is None:
+            # We use the same center for even or odd image sizes
+            kcx = knx // 2
+            kcy = kny // 2
+            self._kcen = (kcx, kcy)
+        else:
+            self._kcen = (origin[1], origin[0])
+
+        # The tcdData object stores the kernel FFT once it has been
+        # calculated, which is only valid for one image shape. It is
+        # not safe to use the same object from multiple threads.
+        #
+        self._tcd = None
+        self._tcd_shape = None
+        self._lock = threading.Lock()
+
+    @property
+    def cached_pixels(self):
+        """The number of pixels in the image shape for which the
+        kernel FFT is stored (0 if there is none)."""
+
+        if self._tcd_shape is None:
+            return 0
+
+        return int(np.prod(self._tcd_shape))
+
+    def _convolve(self, image):
+        """Smooth the 2D image."""
+
+        ishape = image.shape
+        is2 = (ishape[1], ishape[0])
+
+        cimage = np.nan_to_num(image.flatten())
+        with self._lock:
+            if self._tcd_shape != ishape:
+                self._tcd = None
+                tcd = psf.tcdData()
+                tcd.clear_kernel_fft()
+                self._tcd = tcd
+                self._tcd_shape = ishape
+
+            out = self._tcd.convolve(cimage, self._kernel, is2,
+                                     self._ks2, self._kcen)
+
+        out = out.reshape(ishape)
+        out[np.isnan(image)] = np.nan
+        return out
+
+    def smooth(self, image):
+        """Smooth a 2D image, or each plane of a 3D stack.
+
+        Non-finite pixels in the image are replaced by 0. Any
+        NaN pixels in the input image are set back to NaN in the
+        output image.
+        """
+
+        image = np.asarray(image)
+        if image.ndim == 2:
+            return self._convolve(image)
+
+        if image.ndim != 3:
+            raise ValueError("Smoother input must be 2D or 3D, sent {0}D".format(image.ndim))
+
+        out = np.empty(image.shape)
+        for i, plane in enumerate(image):
+            out[i] = self._convolve(plane)
+
+        return out
+
+    __call__ = smooth
+
+
+# The smoothers created by ismooth, keyed by the kernel values and
+# settings, so that repeated calls with the same kernel re-use the
+# kernel FFT. The oldest entry is dropped when the cache is full, or
+# when the total number of image pixels they were used for - which
+# sets the size of the stored kernel FFTs - exceeds
+# _SMOOTHER_CACHE_PIXELS. This means that the FFT for a large image
+# is not kept once ismooth returns; create a Smoother to re-use it.
+#
+_SMOOTHER_CACHE_SIZE = 16
+_SMOOTHER_CACHE_PIXELS = 4 * 1024 * 1024
+_smoothers = collections.OrderedDict()
+_smoothers_lock = threading.Lock()
+
+
+def get_smoother(kernel, origin=None, norm=True):
+    """Return a Smoother for the kernel.
 
+    The same object is returned for repeated calls with the same
+    kernel values, origin, and norm setting, so that the kernel
+    FFT can be re-used. The smoothers are dropped by ismooth once
+    they hold the FFT for too many pixels (see _SMOOTHER_CACHE_PIXELS).
     """
 
-    if image.ndim != 2:
-        raise ValueError("ismooth() input image must be 2D, send {0}D".format(image.ndim))
-    if kernel.ndim != 2:
-        raise ValueError("ismooth() input kernel must be 2D, send {0}D".format(kernel.ndim))
+    kernel = np.asarray(kernel)
+    if origin is not None:
+        origin = tuple(origin)
 
-    # convolve takes the dimensionality with X first not last
-    ishape = image.shape
-    is2 = (ishape[1], ishape[0])
+    key = (kernel.shape, kernel.dtype.str, kernel.tobytes(), origin,
+           bool(norm))
+    with _smoothers_lock:
+        try:
+            smoother = _smoothers.pop(key)
+        except KeyError:
+            smoother = Smoother(kernel, origin=origin, norm=norm)
+            while len(_smoothers) >= _SMOOTHER_CACHE_SIZE:
+                _smoothers.popitem(last=False)
 
-    kshape = kernel.shape
+        _smoothers[key] = smoother
 
-    knx = kshape[1]
-    kny = kshape[0]
+    return smoother
 
-    ks2 = (knx, kny)
 
-    tcd = psf.tcdData()
-    tcd.clear_kernel_fft()
+def _trim_smoothers():
+    """Remove the oldest smoothers until the cache is small enough."""
 
-    cimage = np.nan_to_num(image.flatten())
+    with _smoothers_lock:
+        # Smoothers used for large images are dropped first, so they
+        # do not remove the ones for smaller images from the cache.
+        large = [key for key, smoother in _smoothers.items()
+                 if smoother.cached_pixels > _SMOOTHER_CACHE_PIXELS]
+        for key in large:
+            del _smoothers[key]
 
-    if norm:
-        nkernel = kernel * 1.0 / kernel.sum()
-    else:
-        nkernel = kernel * 1.0
+        npix = sum(s.cached_pixels for s in _smoothers.values())
+        while npix > _SMOOTHER_CACHE_PIXELS:
+            (_, smoother) = _smoothers.popitem(last=False)
+            npix -= smoother.cached_pixels
 
-    if origin is None:
-        # We use the same center for even or odd image sizes
-        kcx = knx // 2
-        kcy = kny // 2
-        kcen = (kcx, kcy)
-    else:
-        kcen = (origin[1], origin[0])
 
-    out = tcd.convolve(cimage,
-                       np.nan_to_num(nkernel.flatten()),
-                       is2, ks2, kcen)
+def clear_smoothers():
+    """Remove the cached smoothers used by ismooth."""
+    with _smoothers_lock:
+        _smoothers.clear()
+
+
+def ismooth(image, kernel, origin=None, norm=True):
+    """Convolve image with a kernel.
+
+    The image can be 2D or a 3D stack of images, in which case each
+    plane - that is image[i] - is smoothed by the kernel.
+
+    If norm is True then the kernel will be divided by its total
+    before convolution. To use the kernel as is, set norm to False
+    (the kernel is always converted to have a datatype of float64
+    before use).
+
+    origin is the center to use for the kernel; if set to None then
+    the center of the kernel is used. It is given using the numpy indexing
+    scheme, so (yval,xval).
+
+    To avoid offsets between the input and output image the kernel should
+    have odd dimensions.
+
+    Non-finite pixels in either the image or kernel are replaced by 0.
+    Any such pixels in the input image are set back to NaN in the output image,
+    but the presence of such values in the kernel image are ignored.
+
+    The Fourier transform of the kernel is cached, so repeated calls
+    with the same kernel and image size are faster (see get_smoother).
+    This is only done for images with up to _SMOOTHER_CACHE_PIXELS
+    pixels; use a Smoother object directly for larger images.
+
+    """
+
+    if image.ndim not in (2, 3):
+        raise ValueError("ismooth() input image must be 2D or 3D, send {0}D".format(image.ndim))
+    if kernel.ndim != 2:
+        raise ValueError("ismooth() input kernel must be 2D, send {0}D".format(kernel.ndim))
 
-    out = out.reshape(ishape)
-    out[np.isnan(image)] = np.nan
+    out = get_smoother(kernel, origin=origin, norm=norm).smooth(image)
+    _trim_smoothers()
     return out
 
 
@@ -194,8 +356,8 @@ def gsmooth(image, sigma, hwidth=5):
     the smooth, and then set to NaN on output.
     """
 
-    if image.ndim != 2:
-        raise ValueError("gsmooth only works on 2D arrays, sent a {0}D array/".format(image.ndim))
+    if image.ndim not in (2, 3):
+        raise ValueError("gsmooth only works on 2D or 3D arrays, sent a {0}D array/".format(image.ndim))
 
     return ismooth(image, mk_gauss(sigma, hwidth), norm=True)
 
@@ -211,8 +373,8 @@ def tsmooth(image, radius):
     the smooth, and then set to NaN on output.
     """
 
-    if image.ndim != 2:
-        raise ValueError("tsmooth only works on 2D arrays, sent a {0}D array/".format(image.ndim))
+    if image.ndim not in (2, 3):
+        raise ValueError("tsmooth only works on 2D or 3D arrays, sent a {0}D array/".format(image.ndim))
 
     return ismooth(image, mk_tophat(radius))
 
@@ -230,8 +392,8 @@ def bsmooth(image, radius):
     the smooth, and then set to NaN on output.
     """
 
-    if image.ndim != 2:
-        raise ValueError("bmooth only works on 2D arrays, sent a {0}D array".format(image.ndim))
+    if image.ndim not in (2, 3):
+        raise ValueError("bmooth only works on 2D or 3D arrays, sent a {0}D array".format(image.ndim))
 
     return ismooth(image, mk_boxcar(radius))
 
@@ -1,7 +1,7 @@
 #!/usr/bin/env python
 
 #
-# Copyright (C) 2017, 2019, 2023
+# Copyright (C) 2017, 2019, 2023, 2026
 # Smithsonian Astrophysical Observatory
 #
 # This program is free software; you can redistribute it and/or modify
@@ -28,6 +28,8 @@ given a user supplied ARF and RMF.
 
 import os
 from os.path import basename
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
 
 import numpy as np
 
@@ -39,7 +41,6 @@ from pycrates import set_key
 from sherpa.astro.data import DataPHA, DataRMF
 from sherpa.astro import ui
 from sherpa.astro.io import read_arf, read_rmf
-from sherpa.astro.utils import calc_data_sum
 from sherpa.utils import poisson_noise
 
 from crates_contrib.utils import make_table_crate
@@ -87,6 +88,29 @@ def make_acis_diagonal_rmf(arf):
                    n_chan, matrix, 0, eb_lo, eb_hi, None)
 
 
+def _set_par_values(model, vals):
+    """Set the model parameter values (linked parameters are skipped)."""
+
+    for par, val in zip(model.pars, vals):
+        if par.link is None:
+            par.val = val
+
+
+def _fold_models(model, pha, points):
+    """Evaluate the model, folded through the responses but without
+    noise, for each set of model parameter values in points."""
+
+    resp = pha.get_full_response()
+    folded = resp(model)
+
+    out = []
+    for vals in points:
+        _set_par_values(model, vals)
+        out.append(pha.eval_model(folded))
+
+    return out
+
+
 class EnergyBand():
     """Something to hold all the energy band specific stuff
 
@@ -296,10 +320,22 @@ class ColorColor():
     that repeated runs with the same model and bands are not
     guaranteed to calculate exactly the same result.
 
+    The folded model can be evaluated in separate processes by setting
+    nproc (None means use all the processors), and the noise is then
+    added in the main process, so the results do not depend on nproc.
+    If cache_models is set then the folded model is stored for each
+    set of model parameter values, so that calling the object again
+    with different energy bands does not need to re-evaluate it:
+
+    >>> cc = ColorColor(mymodel, arffile, nproc=4, cache_models=True)
+    >>> matrix1 = cc(photon_index, absorption, soft, medium, hard, broad)
+    >>> matrix2 = cc(photon_index, absorption, soft, medium, hard)
+
     """
 
     def __init__(self, model, arffile, rmffile=None,
-                 axis_class=HardnessRatioAxis):
+                 axis_class=HardnessRatioAxis, nproc=1,
+                 cache_models=False):
         """Create the ColorColor object
 
         This store the needed data, and creates the sherpa dataset that
@@ -314,6 +350,9 @@ class ColorColor():
         self.arffile = arffile
         self.rmffile = rmffile
         self.make_axis = axis_class
+        self.nproc = nproc
+        self._model_cache = {} if cache_models else None
+        self._band_channels = {}
         self._load()
 
     def _load(self):
@@ -355,19 +394,108 @@ class ColorColor():
         """Compute the HR for the Y-axis"""
         self.yy = self.make_axis(soft_band, hard_band, total_band, self.sum)
 
+    def _get_band_channels(self, lo, hi):
+        """The indexes of the channels in the given range.
+
+        This matches the channels selected by calc_data_sum, and is
+        only calculated once for each range.
+        """
+
+        key = (lo, hi)
+        chans = self._band_channels.get(key)
+        if chans is not None:
+            return chans
+
+        old_mask = self.pha.mask
+        try:
+            self.pha.notice()
+            self.pha.notice(lo, hi)
+            idx = np.arange(len(self.pha.channel))
+            chans = self.pha.apply_filter(idx).astype(int)
+        finally:
+            self.pha.mask = old_mask
+
+        self._band_channels[key] = chans
+        return chans
+
     def sum(self, lo, hi):
         """Sum up the data in the given range"""
-        return calc_data_sum(self.pha, lo, hi)
+        chans = self._get_band_channels(lo, hi)
+        return self.pha.get_dep()[chans].sum()
 
-    def fakeit(self):
-        """Evaluate the model and use it to set the data."""
+    def fakeit(self, ymodel=None):
+        """Evaluate the model and use it to set the data.
+
+        The folded model, without noise, can be given - e.g. from
+        eval_models - to avoid re-evaluating the model.
+        """
+
+        if ymodel is None:
+            # should we use fake_pha instead? Probably not here.
+            ymodel = _fold_models(self.model, self.pha,
+                                  [self._par_values()])[0]
 
-        # should we use fake_pha instead? Probably not here.
-        resp = self.pha.get_full_response()
-        model = resp(self.model)
-        ymodel = self.pha.eval_model(model)
         self.pha.counts = poisson_noise(ymodel)
 
+    def _par_values(self):
+        """The current values of the model parameters."""
+        return tuple(par.val for par in self.model.pars)
+
+    def eval_models(self, points):
+        """Evaluate the folded model, without noise, for each set of
+        model parameter values.
+
+        Each element of points lists the values for each parameter in
+        the model (in the order of self.model.pars). The evaluation is
+        done in self.nproc processes and, if cache_models was set,
+        values calculated by earlier calls are re-used. The model
+        parameters are left set to the last element of points.
+
+        The processes are forked, so that they share the settings of
+        the session, such as the XSPEC abundance and cross-section
+        tables.
+        """
+
+        out = [None] * len(points)
+        todo = {}
+        for idx, vals in enumerate(points):
+            if self._model_cache is not None and vals in self._model_cache:
+                out[idx] = self._model_cache[vals]
+            else:
+                todo.setdefault(vals, []).append(idx)
+
+        todo_points = list(todo.keys())
+
+        nproc = self.nproc
+        if nproc is None:
+            nproc = multiprocessing.cpu_count()
+
+        nproc = min(nproc, len(todo_points))
+        if nproc > 1:
+            chunks = [[todo_points[i] for i in chunk]
+                      for chunk in np.array_split(np.arange(len(todo_points)), nproc)]
+            ctx = multiprocessing.get_context("fork")
+            with ProcessPoolExecutor(max_workers=nproc,
+                                     mp_context=ctx) as executor:
+                results = executor.map(_fold_models, [self.model] * nproc,
+                                       [self.pha] * nproc, chunks)
+                ymodels = [ymodel for chunk in results for ymodel in chunk]
+
+        else:
+            ymodels = _fold_models(self.model, self.pha, todo_points)
+
+        for vals, ymodel in zip(todo_points, ymodels):
+            if self._model_cache is not None:
+                self._model_cache[vals] = ymodel
+
+            for idx in todo[vals]:
+                out[idx] = ymodel
+
+        if len(points) > 0:
+            _set_par_values(self.model, points[-1])
+
+        return out
+
     def iterate(self, pri_obj, sec_obj):
         """Compute the HR for each grid point in the pri_obj grid
 
@@ -387,6 +515,10 @@ class ColorColor():
         This has to be done twice.  Once with the 1st model parameter
         as "primary", and again with the 2nd model parameter primary.
 
+        The folded models for all the grid points are evaluated first,
+        with eval_models, and then the noise is added to each one in
+        turn.
+
         """
 
         retvals = {}
@@ -394,10 +526,18 @@ class ColorColor():
         # Get the fine grid for the secondary axis
         sec_fine_grid = sec_obj.finegrid()
 
-        # Loop over values in the primary axis grid
+        # Find the model parameter values for each grid point
+        points = []
         for aa in pri_obj.grid:
-            # Set sherpa model parameter value
             pri_obj.obj.val = aa
+            for bb in sec_fine_grid:
+                sec_obj.obj.val = bb
+                points.append(self._par_values())
+
+        ymodels = iter(self.eval_models(points))
+
+        # Loop over values in the primary axis grid
+        for aa in pri_obj.grid:
 
             # Loop over the fine grid on secondary axis
             lx = []
@@ -406,11 +546,9 @@ class ColorColor():
             lsoft = []
             lmedium = []
             for bb in sec_fine_grid:
-                # Set sherpa model parameter value
-                sec_obj.obj.val = bb
 
                 # fake the spectrum w/ these model paramters
-                self.fakeit()
+                self.fakeit(next(ymodels))
 
                 # Compute the HR in 2 separate energy bands
                 xx, hard, medium = self.xx()
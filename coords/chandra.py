@@ -80,6 +80,15 @@ chip_id  = [8, 7, 1]
 chipx    = [318.9503017010488, 360.6791186060802, 1589.1364367217589]
 chipy    = [-1977.2683032749258, -1672.180553951394, 688.1576177748966]
 
+The cel_to_chandra_array and sky_to_chandra_array routines return the
+same information as NumPy arrays, which is faster when converting a
+large number of positions. The chip location is also returned as a
+structured array, with fields chip_id, chipx, and chipy:
+
+>>> out = sky_to_chandra_array(args, [1000, 2000, 5000], [1500, 1200, 6000])
+>>> out["chip"]["chip_id"]
+array([8, 7, 1], dtype=int32)
+
 Read in the aspect solution and then use it to calculate the chip
 location corresponding to x=4096.5, y=4096.5 for each row. The
 Sherpa plot_scatter command is used to display the data.
@@ -101,8 +110,12 @@ Sherpa plot_scatter command is used to display the data.
 
 """
 
-__all__ = [ "cel_to_chandra", "sky_to_chandra", "get_coord_keywords" ]
+__all__ = [ "cel_to_chandra", "sky_to_chandra",
+            "cel_to_chandra_array", "sky_to_chandra_array",
+            "get_coord_keywords" ]
+
 
+import numpy as np
 
 from pycrates import read_file
 from pixlib import Pixlib
@@ -114,6 +127,13 @@ logger = lw.initialize_module_logger("coords.chandra")
 
 v0 = logger.verbose0
 
+# The chip_id is set to -999, and chipx/y to -999, for positions
+# that do not fall on a chip.
+#
+CHIP_DTYPE = np.dtype([("chip_id", np.int32),
+                       ("chipx", np.float64),
+                       ("chipy", np.float64)])
+
 def _setup_sim( keyword_list ):
     """
     Get the keywords related to the SIM location
@@ -303,6 +323,137 @@ def get_coord_keywords(arg):
     return out
 
 
+def _as_pairs(xs, ys):
+    """Return the inputs (scalars or sequences) as a (n, 2) array."""
+
+    xs = np.atleast_1d(np.asarray(xs, dtype=np.float64))
+    ys = np.atleast_1d(np.asarray(ys, dtype=np.float64))
+    if xs.ndim != 1 or xs.shape != ys.shape:
+        raise ValueError("The coordinate arrays must be 1D and have the same length")
+
+    return np.column_stack((xs, ys))
+
+
+def _transform(func, pairs):
+    """Apply the transform (the apply or invert method) to the
+    (n, 2) array, which can be empty."""
+
+    if pairs.shape[0] == 0:
+        return np.empty((0, 2), dtype=np.float64)
+
+    return np.asarray(func(pairs), dtype=np.float64)
+
+
+def _det_to_chandra(pix, det):
+    """Convert the det positions - a (n, 2) array - to theta, phi,
+    and chip values.
+
+    The pixlib module only converts a single position at a time,
+    so this is the only part of the conversion that loops over
+    the positions.
+    """
+
+    npts = det.shape[0]
+    theta = np.empty(npts)
+    phi = np.empty(npts)
+    chip = np.empty(npts, dtype=CHIP_DTYPE)
+
+    fpc2msc = pix.fpc2msc
+    fpc2chip = pix.fpc2chip
+    for idx, dxy in enumerate(det.tolist()):
+        msc = fpc2msc(dxy)    # msc[0] is focal len
+        theta[idx] = msc[1]
+        phi[idx] = msc[2]
+
+        try:
+            cixy = fpc2chip(dxy)
+            if cixy[0] < 0:
+                raise ValueError("Unknown chip")
+            chip[idx] = (cixy[0], cixy[1][0], cixy[1][1])
+        except:
+            chip[idx] = (-999, -999, -999)
+
+    theta *= 60.0  # arcmin
+    return theta, phi, chip
+
+
+def _as_lists(out):
+    """Convert the output of the *_array routines to lists."""
+
+    return {k: v if k == 'pixsize' else v.tolist()
+            for k, v in out.items() if k != 'chip'}
+
+
+def cel_to_chandra_array(keyword_list, ra_vals, dec_vals):
+    """
+    Convert RA/DEC to various chandra coordinates, returning
+    NumPy arrays.
+
+    This is the same as cel_to_chandra except that the values
+    are returned as NumPy arrays, and there is an additional
+    'chip' field, which is a structured array with the chip_id,
+    chipx, and chipy fields (the chip_id, chipx, and chipy fields
+    of the return value are views of this array). All the
+    positions are converted by the WCS transforms in one call,
+    which makes this much faster for large numbers of positions.
+    """
+
+    pix, my_dettan, my_skytan, cdelt = _setup( keyword_list)
+
+    rd = _as_pairs(ra_vals, dec_vals)
+    det = _transform(my_dettan.invert, rd)
+    sky = _transform(my_skytan.invert, rd)
+    theta, phi, chip = _det_to_chandra(pix, det)
+
+    return { 'pixsize' : cdelt[1]*3600.0, # deg to arcsec
+             'theta'   : theta, # arcmin
+             'phi'     : phi,    # deg
+             'x'       : sky[:, 0],
+             'y'       : sky[:, 1],
+             'detx'    : det[:, 0],
+             'dety'    : det[:, 1],
+             'chip'    : chip,
+             'chip_id' : chip['chip_id'],
+             'chipx'   : chip['chipx'],
+             'chipy'   : chip['chipy']
+             }
+
+
+def sky_to_chandra_array(keyword_list, x_vals, y_vals):
+    """
+    Convert sky x,y to various chandra coordinates, returning
+    NumPy arrays.
+
+    This is the same as sky_to_chandra except that the values
+    are returned as NumPy arrays, and there is an additional
+    'chip' field, which is a structured array with the chip_id,
+    chipx, and chipy fields (the chip_id, chipx, and chipy fields
+    of the return value are views of this array). All the
+    positions are converted by the WCS transforms in one call,
+    which makes this much faster for large numbers of positions.
+    """
+
+    pix, my_dettan, my_skytan, cdelt = _setup( keyword_list)
+
+    xy = _as_pairs(x_vals, y_vals)
+    eqpos = _transform(my_skytan.apply, xy)
+    det = _transform(my_dettan.invert, eqpos)
+    theta, phi, chip = _det_to_chandra(pix, det)
+
+    return { 'pixsize' : cdelt[1]*3600.0, # deg to arcsec
+             'theta'   : theta, # arcmin
+             'phi'     : phi,    # deg
+             'ra'      : eqpos[:, 0],
+             'dec'     : eqpos[:, 1],
+             'detx'    : det[:, 0],
+             'dety'    : det[:, 1],
+             'chip'    : chip,
+             'chip_id' : chip['chip_id'],
+             'chipx'   : chip['chipx'],
+             'chipy'   : chip['chipy']
+             }
+
+
 def cel_to_chandra( keyword_list, ra_vals, dec_vals ):
     """
     Convert RA/DEC to various chandra coordinates
@@ -335,57 +486,12 @@ def cel_to_chandra( keyword_list, ra_vals, dec_vals ):
 
     If they are missing the coordinate transforms will be inaccurate
     (SIM defaults based on INSTRUME|DETNAM).
-    """
-
-    try:
-        rd_vals = zip( ra_vals, dec_vals )
-    except:
-        rd_vals =  [ ( ra_vals,dec_vals ) ]
-
-
-    pix, my_dettan, my_skytan, cdelt = _setup( keyword_list)
-
-    # loop over ra,dec's
-    theta = []
-    phi = []
-    chip = []
-    det = []
-    sky = []
 
-    for ra,dec in rd_vals:
-
-        detxy = my_dettan.invert( [[ra*1.0,dec*1.0]] )  # *1.0 make sure is a float
-        dxy = [ detxy[0][0], detxy[0][1] ]
-        det.append( dxy )
+    The values are returned as lists; use cel_to_chandra_array
+    to get NumPy arrays instead.
+    """
 
-        skyxy = my_skytan.invert( [[ra,dec]] )
-        sxy = [ skyxy[0][0], skyxy[0][1] ]
-        sky.append( sxy )
-
-        msc = pix.fpc2msc( dxy )    # msc[0] is focal len
-        theta.append(msc[1] * 60.0) # arcmin
-        phi.append( msc[2]*1.0 )
-
-        try:
-            cixy = pix.fpc2chip( dxy )
-            if cixy[0] < 0:
-                raise ValueError("Unknown chip")
-            chip.append( cixy )
-        except:
-            chip.append( (-999, (-999,-999)))
-
-
-    return { 'pixsize' : cdelt[1]*3600.0, # deg to arcsec
-             'theta'   : theta, # arcmin
-             'phi'     : phi,    # deg
-             'x'       : [x[0] for x in sky],
-             'y'       : [x[1] for x in sky],
-             'detx'    : [x[0] for x in det],
-             'dety'    : [x[1] for x in det],
-             'chip_id' : [x[0] for x in chip],
-             'chipx'   : [x[1][0] for x in chip],
-             'chipy'   : [x[1][1] for x in chip]
-             }
+    return _as_lists(cel_to_chandra_array(keyword_list, ra_vals, dec_vals))
 
 
 def sky_to_chandra( keyword_list, x_vals, y_vals ):
@@ -419,54 +525,8 @@ def sky_to_chandra( keyword_list, x_vals, y_vals ):
     If they are missing the coordinate transforms will be inaccurate
     (SIM defaults based on INSTRUME|DETNAM).
 
+    The values are returned as lists; use sky_to_chandra_array
+    to get NumPy arrays instead.
     """
 
-    pix, my_dettan, my_skytan, cdelt = _setup( keyword_list)
-
-    # loop over ra,dec's
-    theta = []
-    phi = []
-    chip = []
-    det = []
-    eqpos = []
-
-    try:
-        xy_vals = zip( x_vals, y_vals )
-    except:
-        xy_vals =  [ ( x_vals, y_vals ) ]
-
-
-    for x,y in xy_vals:
-
-        radec = my_skytan.apply( [[x*1.0,y*1.0]] )  # *1.0 make sure is a float
-        rd = [ radec[0][0], radec[0][1] ]
-        eqpos.append( rd )
-
-        detxy = my_dettan.invert( [rd] )
-        dxy = [ detxy[0][0], detxy[0][1] ]
-        det.append( dxy )
-        msc = pix.fpc2msc( dxy )    # msc[0] is focal len
-
-        theta.append(msc[1] * 60.0) # arcmin
-        phi.append( msc[2]*1.0 )
-
-        try:
-            cixy = pix.fpc2chip( dxy )
-            if cixy[0] < 0:
-                raise ValueError("Unknown chip")
-            chip.append( cixy )
-        except:
-            chip.append( (-999, (-999,-999)))
-
-
-    return { 'pixsize' : cdelt[1]*3600.0, # deg to arcsec
-             'theta'   : theta, # arcmin
-             'phi'     : phi,    # deg
-             'ra'      : [x[0] for x in eqpos],
-             'dec'     : [x[1] for x in eqpos],
-             'detx'    : [x[0] for x in det],
-             'dety'    : [x[1] for x in det],
-             'chip_id' : [x[0] for x in chip],
-             'chipx'   : [x[1][0] for x in chip],
-             'chipy'   : [x[1][1] for x in chip]
-             }
+    return _as_lists(sky_to_chandra_array(keyword_list, x_vals, y_vals))
@@ -21,15 +21,18 @@
 #
 
 """
-Utility routines for handling coordinates. At present only one routine
-is exported.
+Utility routines for handling coordinates. The exported routines are
+point_separation, for the separation between two points, and the
+SkyIndex class and the cross_match and resolve_one_to_one routines,
+for matching large lists of positions.
 
 The interface is liable to change.
 """
 
 import numpy as np
 
-__all__ = ("point_separation",)
+__all__ = ("point_separation", "SkyIndex", "cross_match",
+           "resolve_one_to_one")
 
 
 def spherical_to_cartesian(longitude, latitude):
@@ -204,3 +207,316 @@ def point_separation(long1, lat1, long2, lat2):
     a = spherical_to_cartesian(args[0], args[1])
     b = spherical_to_cartesian(args[2], args[3])
     return radtodeg(angular_separation(a, b))
+
+
+def _radec_to_vectors(ra, dec):
+    """Return the (n, 3) unit vectors for the ra, dec values
+    (in degrees)."""
+
+    ra = np.atleast_1d(np.asarray(ra, dtype=float))
+    dec = np.atleast_1d(np.asarray(dec, dtype=float))
+    if ra.ndim != 1 or ra.shape != dec.shape:
+        raise ValueError("ra and dec must be 1D arrays of the same size")
+
+    return spherical_to_cartesian(degtorad(ra), degtorad(dec)).T
+
+
+# The first search radius, in degrees, used by SkyIndex.query_nearest
+# to find the nearest positions, with no limit, when scipy is not
+# available.
+NEAREST_START_RADIUS = 1.0 / 60
+
+
+def _chord_to_angle(chord):
+    "Convert the chord length between unit vectors to degrees"
+    return radtodeg(2 * np.arcsin(np.minimum(chord / 2, 1.0)))
+
+
+def _angle_to_chord(angle):
+    "Convert an angle in degrees to the chord length between unit vectors"
+    return 2 * np.sin(degtorad(np.minimum(angle, 180.0)) / 2)
+
+
+class SkyIndex:
+    """Index a set of positions on the sky to find those near a
+    given position.
+
+    The positions are stored as unit vectors, sorted along the axis
+    which is closest to perpendicular to their mean direction, so a
+    search only has to check those positions in a slab around the
+    query position rather than all of them. This works best when
+    the positions cover a small part of the sky, such as a Chandra
+    field of view.
+
+    Parameters
+    ----------
+    ra, dec : array
+        The positions, in degrees.
+    chunksize : int, optional
+        The maximum number of candidate pairs to process at once,
+        to limit the memory use.
+    """
+
+    def __init__(self, ra, dec, chunksize=1000000):
+        vecs = _radec_to_vectors(ra, dec)
+        self.size = vecs.shape[0]
+        self.chunksize = chunksize
+
+        if self.size > 0:
+            self._axis = np.argmin(np.abs(vecs.mean(axis=0)))
+        else:
+            self._axis = 2
+
+        self._order = np.argsort(vecs[:, self._axis], kind="stable")
+        self._vecs = vecs[self._order]
+        self._keys = self._vecs[:, self._axis]
+        self._tree = None
+
+    def query_radius(self, ra, dec, radius):
+        """Find all the indexed positions within radius of each
+        query position.
+
+        Parameters
+        ----------
+        ra, dec : array
+            The query positions, in degrees.
+        radius : float or array
+            The search radius, in degrees. It can be an array, with
+            one value per query position.
+
+        Returns
+        -------
+        qidx, idx, sep : array
+            The index of the query position, the index of the matching
+            position (in the input to SkyIndex), and the separation in
+            degrees, for each match. The matches are ordered by query
+            index and then separation.
+        """
+
+        qvecs = _radec_to_vectors(ra, dec)
+        nq = qvecs.shape[0]
+        chords = np.broadcast_to(_angle_to_chord(np.asarray(radius, dtype=float)),
+                                 (nq,))
+
+        qkeys = qvecs[:, self._axis]
+        lo = np.searchsorted(self._keys, qkeys - chords, side="left")
+        hi = np.searchsorted(self._keys, qkeys + chords, side="right")
+        counts = hi - lo
+
+        out_q = []
+        out_i = []
+        out_c = []
+
+        # Process the queries in blocks so that the number of candidate
+        # pairs in each block is limited.
+        cumul = np.cumsum(counts)
+        start = 0
+        while start < nq:
+            base = 0 if start == 0 else cumul[start - 1]
+            end = np.searchsorted(cumul, base + self.chunksize, side="right")
+            end = min(max(end, start + 1), nq)
+
+            ncounts = counts[start:end]
+            qi = np.repeat(np.arange(start, end), ncounts)
+            offsets = np.arange(qi.size) - np.repeat(np.cumsum(ncounts) - ncounts,
+                                                     ncounts)
+            ci = lo[qi] + offsets
+
+            delta = self._vecs[ci] - qvecs[qi]
+            chord = np.sqrt(np.sum(delta * delta, axis=1))
+            keep = chord <= chords[qi]
+
+            out_q.append(qi[keep])
+            out_i.append(ci[keep])
+            out_c.append(chord[keep])
+            start = end
+
+        if nq == 0:
+            qidx = np.zeros(0, dtype=int)
+            cidx = np.zeros(0, dtype=int)
+            chord = np.zeros(0)
+        else:
+            qidx = np.concatenate(out_q)
+            cidx = np.concatenate(out_i)
+            chord = np.concatenate(out_c)
+
+        sidx = np.lexsort((chord, qidx))
+        return (qidx[sidx], self._order[cidx[sidx]],
+                _chord_to_angle(chord[sidx]))
+
+    def query_nearest(self, ra, dec, k=1, radius=None):
+        """Find the k nearest indexed positions to each query position.
+
+        Parameters
+        ----------
+        ra, dec : array
+            The query positions, in degrees.
+        k : int, optional
+            The number of neighbours to return.
+        radius : float or array or None, optional
+            If set, only positions within this radius (in degrees) are
+            returned. If not set then there is no limit; a KD-tree
+            is used for the search when scipy is available.
+
+        Returns
+        -------
+        idx, sep : array
+            The indexes of the nearest positions (in the input to
+            SkyIndex) and their separations in degrees, with shape
+            (nquery, k) and ordered by separation. Missing matches
+            have an index of -1 and a separation of inf.
+        """
+
+        if k < 1:
+            raise ValueError(f"k must be 1 or greater, not {k}")
+
+        nq = np.size(ra)
+        idx = np.full((nq, k), -1, dtype=int)
+        sep = np.full((nq, k), np.inf)
+
+        if radius is None:
+            self._query_all(ra, dec, idx, sep)
+        else:
+            self._fill_nearest(idx, sep, *self.query_radius(ra, dec, radius))
+
+        return idx, sep
+
+    @staticmethod
+    def _fill_nearest(idx, sep, qidx, cidx, csep):
+        """Fill in idx and sep, which have shape (nquery, k), from
+        the matches returned by query_radius."""
+
+        if qidx.size == 0:
+            return
+
+        # The matches are sorted by query index then separation, so
+        # the rank of each match is its position within the query.
+        first = np.searchsorted(qidx, qidx, side="left")
+        rank = np.arange(qidx.size) - first
+        keep = rank < idx.shape[1]
+        idx[qidx[keep], rank[keep]] = cidx[keep]
+        sep[qidx[keep], rank[keep]] = csep[keep]
+
+    def _query_all(self, ra, dec, idx, sep):
+        """Fill in idx and sep, which have shape (nquery, k), with
+        the nearest positions to each query position, whatever their
+        separation.
+
+        A KD-tree is used if scipy is available, otherwise the radius
+        search is repeated, with a larger radius each time, for those
+        query positions with too few matches.
+        """
+
+        qvecs = _radec_to_vectors(ra, dec)
+        nmax = min(idx.shape[1], self.size)
+        if qvecs.shape[0] == 0 or nmax == 0:
+            return
+
+        if self._tree is None:
+            try:
+                from scipy.spatial import cKDTree
+            except ImportError:
+                self._query_growing(ra, dec, nmax, idx, sep)
+                return
+
+            self._tree = cKDTree(self._vecs)
+
+        chord, cidx = self._tree.query(qvecs, k=nmax)
+        shape = (qvecs.shape[0], nmax)
+        idx[:, :nmax] = self._order[np.reshape(cidx, shape)]
+        sep[:, :nmax] = _chord_to_angle(np.reshape(chord, shape))
+
+    def _query_growing(self, ra, dec, nmax, idx, sep):
+        """Find the nmax nearest positions with query_radius, starting
+        with a small radius and increasing it until each query
+        position has nmax matches (or the whole sky is searched)."""
+
+        ra = np.atleast_1d(np.asarray(ra, dtype=float))
+        dec = np.atleast_1d(np.asarray(dec, dtype=float))
+        todo = np.arange(ra.size)
+        radius = NEAREST_START_RADIUS
+        while todo.size > 0:
+            qidx, cidx, csep = self.query_radius(ra[todo], dec[todo], radius)
+            nfound = np.bincount(qidx, minlength=todo.size)
+            done = (nfound >= nmax) | (radius >= 180.0)
+
+            # The nmax nearest matches within the radius are the
+            # nearest overall.
+            keep = done[qidx]
+            self._fill_nearest(idx, sep, todo[qidx[keep]], cidx[keep],
+                               csep[keep])
+
+            todo = todo[~done]
+            radius = min(radius * 4, 180.0)
+
+
+def resolve_one_to_one(qidx, idx, sep):
+    """Select matches so that each query and indexed position is
+    used at most once.
+
+    The matches are considered in order of increasing separation,
+    and a match is kept if neither of its positions has already been
+    used.
+
+    Parameters
+    ----------
+    qidx, idx, sep : array
+        The matches, such as returned by SkyIndex.query_radius.
+
+    Returns
+    -------
+    qidx, idx, sep : array
+        The selected matches, ordered by query index.
+    """
+
+    qidx = np.asarray(qidx)
+    idx = np.asarray(idx)
+    sep = np.asarray(sep)
+
+    order = np.argsort(sep, kind="stable")
+    qused = set()
+    iused = set()
+    keep = []
+    for i, (q, c) in zip(order, zip(qidx[order].tolist(), idx[order].tolist())):
+        if q in qused or c in iused:
+            continue
+
+        qused.add(q)
+        iused.add(c)
+        keep.append(i)
+
+    keep = np.asarray(keep, dtype=int)
+    keep = keep[np.argsort(qidx[keep], kind="stable")]
+    return qidx[keep], idx[keep], sep[keep]
+
+
+def cross_match(ra1, dec1, ra2, dec2, radius, one_to_one=True):
+    """Match two lists of positions.
+
+    Parameters
+    ----------
+    ra1, dec1 : array
+        The first list of positions, in degrees.
+    ra2, dec2 : array
+        The second list of positions, in degrees.
+    radius : float or array
+        The maximum separation, in degrees, of a match. It can be an
+        array with one value for each position in the first list.
+    one_to_one : bool, optional
+        If set then each position is used at most once, with the
+        closest pairs taking precedence, otherwise all pairs within
+        the radius are returned.
+
+    Returns
+    -------
+    idx1, idx2, sep : array
+        The indexes into the two lists and the separation, in degrees,
+        of each match.
+    """
+
+    index = SkyIndex(ra2, dec2)
+    matches = index.query_radius(ra1, dec1, radius)
+    if one_to_one:
+        matches = resolve_one_to_one(*matches)
+
+    return matches
@@ -1,5 +1,5 @@
 #
-#  Copyright (C) 2009, 2010, 2011, 2012, 2013, 2014, 2015, 2016, 2018, 2019
+#  Copyright (C) 2009, 2010, 2011, 2012, 2013, 2014, 2015, 2016, 2018, 2019, 2026
 #            Smithsonian Astrophysical Observatory
 #
 #
@@ -22,8 +22,12 @@
 """
 
 import os
+import re
 import time
 import collections
+import multiprocessing
+
+from concurrent.futures import ProcessPoolExecutor
 
 import numpy as np
 import pycrates
@@ -527,8 +531,62 @@ def write_columns(fname, *args, **kwargs):
     cr.write(oname, clobber=clobber)
 
 
+# The number of elements formatted at a time by write_arrays.
+#
+WRITE_CHUNK_SIZE = 1000000
+
+# The conversion specifiers which give the same output for a NumPy
+# scalar and the equivalent Python value (as returned by tolist).
+#
+_simple_format = re.compile(r"%[-#0 +]*[0-9]*(?:\.[0-9]+)?[diouxXeEfFgGs]")
+
+
+def _can_format_rows(vals, format):
+    """Can each row of vals be formatted with a single % operation?
+
+    This is only done when it will give the same result as applying
+    format to each element separately.
+    """
+
+    if vals.dtype.kind not in "iu" and vals.dtype != np.float64:
+        return False
+
+    specs = [spec for spec in re.findall(r"%.", format) if spec != "%%"]
+    if len(specs) != 1:
+        return False
+
+    return len(_simple_format.findall(format.replace("%%", ""))) == 1
+
+
+def _format_rows(rows, sep, linebreak, format, fast):
+    """Convert the rows of data to a string.
+
+    The rows are separated by linebreak, but there is no
+    linebreak after the last row.
+    """
+
+    if not fast:
+        lines = []
+        for row in rows:
+            line = [format % elem for elem in row]
+            lines.append(sep.join(line))
+
+        return linebreak.join(lines)
+
+    nrows, ncols = rows.shape
+    if nrows == 0:
+        return ''
+
+    # Create a format string for all the rows, so the conversion is
+    # done in a single call.
+    #
+    rowfmt = sep.replace("%", "%%").join([format] * ncols)
+    fmt = linebreak.replace("%", "%%").join([rowfmt] * nrows)
+    return fmt % tuple(rows.ravel().tolist())
+
+
 def write_arrays(filename, args, fields=None, sep=' ', comment='#',
-                 clobber=False, linebreak='\n', format='%g'):
+                 clobber=False, linebreak='\n', format='%g', nproc=1):
     """Write a list of arrays to an ASCII file.
 
     Parameters
@@ -552,11 +610,20 @@ def write_arrays(filename, args, fields=None, sep=' ', comment='#',
     format : str, optional
         The format string used to convert each column element into a
         string.
+    nproc : int or None, optional
+        The number of processes to use to convert the data to text.
+        A value of None uses all the available processors. This is
+        only worth changing for large tables.
 
     See Also
     --------
     make_table_crate, write_columns
 
+    Notes
+    -----
+    The data is converted and written out in chunks of
+    WRITE_CHUNK_SIZE elements.
+
     Examples
     --------
 
@@ -584,19 +651,48 @@ def write_arrays(filename, args, fields=None, sep=' ', comment='#',
 
     args = np.column_stack(np.asarray(args))
 
+    if nproc is None:
+        nproc = multiprocessing.cpu_count()
+
+    fast = args.ndim == 2 and _can_format_rows(args, format)
+    ncols = int(np.prod(args.shape[1:]))
+    chunk = max(1, WRITE_CHUNK_SIZE // max(1, ncols))
+    chunks = (args[i:i + chunk] for i in range(0, max(1, len(args)), chunk))
+    fargs = (sep, linebreak, format, fast)
+
     with open(filename, 'w') as f:
         if fields is not None:
             f.write(comment + sep.join(fields) + linebreak)
 
-        lines = []
-        for arg in args:
-            line = [format % elem for elem in arg]
-            lines.append(sep.join(line))
+        # Each chunk is followed by a line break, which also adds the
+        # newline at the end of the file.
+        #
+        if nproc <= 1:
+            for rows in chunks:
+                f.write(_format_rows(rows, *fargs))
+                f.write(linebreak)
+
+            return
+
+        # Limit the number of chunks being processed to bound the
+        # memory use.
+        #
+        v3(f"write_arrays: using {nproc} processes")
+        ctx = multiprocessing.get_context("fork")
+        with ProcessPoolExecutor(max_workers=nproc,
+                                 mp_context=ctx) as executor:
+            pending = collections.deque()
+            for rows in chunks:
+                pending.append(executor.submit(_format_rows, rows, *fargs))
+                if len(pending) < 2 * nproc:
+                    continue
 
-        f.write(linebreak.join(lines))
+                f.write(pending.popleft().result())
+                f.write(linebreak)
 
-        # add a newline at end
-        f.write(linebreak)
+            while pending:
+                f.write(pending.popleft().result())
+                f.write(linebreak)
 
 
 _image_scalings = {
@@ -698,9 +794,11 @@ def smooth_image_crate(cr, stype, *args, **kwargs):
     ----------
     cr
         The IMAGECrate to change.
-    stype : str
+    stype : str or ciao_contrib.smooth.Smoother
         The type of smoothing to apply. The list of supported
-        values is given in the Notes section below.
+        values is given in the Notes section below. A Smoother
+        object can be used to apply an existing kernel, in which
+        case no other arguments are used.
     *args, **kwargs
         The supported arguments depend on the value of the
         'stype' argument.
@@ -730,6 +828,12 @@ def smooth_image_crate(cr, stype, *args, **kwargs):
     Numeric values such as sigma and radius refer to logical
     pixels, and not SKY or WCS units.
 
+    If the crate contains a 3D image then each plane is smoothed
+    separately. The smoothing routines cache the Fourier transform
+    of the kernel (see ciao_contrib.smooth.get_smoother), so
+    smoothing several crates of the same size with the same settings
+    only calculates it once.
+
     This routine modifies the data in the input crate, it does
     *NOT* return a copy of the crate.
 
@@ -759,11 +863,23 @@ def smooth_image_crate(cr, stype, *args, **kwargs):
     >>> kern = np.asarray([0, 1, 0, 1, 2, 1, 0, 1, 0]).reshape(3, 3)
     >>> smooth_image_crate(cr, 'image', kern)
 
+    Smooth a set of images with the same kernel:
+
+    >>> from ciao_contrib.smooth import Smoother
+    >>> smoother = Smoother(kern)
+    >>> for cr in crs:
+    ...     smooth_image_crate(cr, smoother)
+
     """
 
     if not isinstance(cr, pycrates.IMAGECrate):
         raise ValueError("First argument must be an image crate.")
 
+    if isinstance(stype, sm.Smoother):
+        ivals = pycrates.copy_piximgvals(cr)
+        pycrates.set_piximgvals(cr, stype.smooth(ivals))
+        return
+
     # Short cut
     if stype == "none":
         return
@@ -889,22 +1005,19 @@ class SimpleCoordTransform:
             raise ValueError("Invalid coordinate-system name: " +
                              "{}".format(cname))
 
-    # Unfortunately I did not note why I only do this point-by-point rather
-    # than send in all the points at once. There have been issues with checking
-    # coordinate dimensionality, that have been fixed in CIAO 4.5, that
-    # may mean that we can go back to just handling vectors, but for now
-    # keep as is.
-    #
-    def _convert(self, direction, mappings, x, y):
-        """Convert a single (x,y) using the direction and mappings."""
+    def _convert(self, direction, mappings, pts):
+        """Convert the (npts, 2) array of points using the direction
+        and mappings. All the points are sent to each transform in a
+        single call.
+        """
 
-        # Need to make sure x and y are float to avoid Transform bug
+        # Need to make sure the points are float to avoid Transform bug
         # when inputs are integer (forces output to be integer)
-        pt = [[x * 1.0, y * 1.0]]
+        pt = np.asarray(pts, dtype=np.float64)
         for trinfo in mappings:
             pt = getattr(trinfo["transform"], direction)(pt)
 
-        return pt[0, :]
+        return np.asarray(pt)
 
     def convert(self, fromsys, tosys, x, y):
         """Convert image coordinates.
@@ -918,7 +1031,9 @@ class SimpleCoordTransform:
             and "logical" or "image".
         x, y : array of coordinates
             The coordinate values to use. They are expected to have
-            the same shape.
+            the same shape (or to be broadcastable to a common shape).
+            All the points are converted at once, so it is faster to
+            call this once with all the points than once per point.
 
         Returns
         -------
@@ -951,13 +1066,14 @@ class SimpleCoordTransform:
         xin = np.asarray(x)
         yin = np.asarray(y)
 
-        # what was I going to do with this?
-        # otype = np.common_type(xin, yin)
-
-        # Could presumably be a lot more clever with array manipulation here
         b = np.broadcast(xin, yin)
-        v3(" . to convert {}".format(b))
-        out = np.asarray([self._convert(d, trs, u, v) for (u, v) in b])
+        v3(" . to convert {} points with shape {}".format(b.size, b.shape))
+        if b.size == 0:
+            return (np.zeros(b.shape), np.zeros(b.shape))
+
+        (xb, yb) = np.broadcast_arrays(xin, yin)
+        pts = np.column_stack((xb.ravel(), yb.ravel()))
+        out = self._convert(d, trs, pts)
         v3(" . answer = {}".format(out))
         xout = out[:, 0].copy().reshape(b.shape)
         yout = out[:, 1].copy().reshape(b.shape)
@@ -1023,11 +1139,6 @@ def read_ds9_contours(fname, coords=None, fromsys=None, tosys=None):
     x = []
     y = []
 
-    if None in [coords, fromsys, tosys]:
-        tr = None
-    else:
-        tr = SimpleCoordTransform(coords)
-
     with open(fname, "r") as fh:
         for l in fh.readlines():
             l = l.strip()
@@ -1035,14 +1146,8 @@ def read_ds9_contours(fname, coords=None, fromsys=None, tosys=None):
                 if len(x) == 0:
                     raise ValueError("Unexpected blank line: read in x=\n{}\n".format(xall))
 
-                if tr is None:
-                    xo = np.asarray(x)
-                    yo = np.asarray(y)
-                else:
-                    (xo, yo) = tr.convert(fromsys, tosys, x, y)
-
-                xall.append(xo)
-                yall.append(yo)
+                xall.append(np.asarray(x))
+                yall.append(np.asarray(y))
 
                 x = []
                 y = []
@@ -1056,18 +1161,25 @@ def read_ds9_contours(fname, coords=None, fromsys=None, tosys=None):
                 y.append(float(toks[1]))
 
     if len(x) != 0:
-        if tr is None:
-            xo = np.asarray(x)
-            yo = np.asarray(y)
-        else:
-            (xo, yo) = tr.convert(fromsys, tosys, x, y)
-
-        xall.append(xo)
-        yall.append(yo)
+        xall.append(np.asarray(x))
+        yall.append(np.asarray(y))
 
     if len(xall) == 0:
         raise ValueError("No data read in from: {}".format(fname))
 
+    if None in [coords, fromsys, tosys]:
+        return (xall, yall)
+
+    # Convert all the contours in one go and then split them back up.
+    #
+    tr = SimpleCoordTransform(coords)
+    (xc, yc) = tr.convert(fromsys, tosys,
+                          np.concatenate(xall), np.concatenate(yall))
+
+    idx = np.cumsum([len(xs) for xs in xall])[:-1]
+    xall = np.split(xc, idx)
+    yall = np.split(yc, idx)
+
     return (xall, yall)
 
 # End
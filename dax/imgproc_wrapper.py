@@ -21,16 +21,204 @@
 
 import sys
 import os
+import hashlib
+import json
+import re
+import shutil
 
 import subprocess as sp
 from tempfile import NamedTemporaryFile
 
 
+def _link_or_copy(src, dest):
+    'Hard link src to dest, or copy it if that fails'
+
+    if os.path.exists(dest):
+        os.unlink(dest)
+    try:
+        os.link(src, dest)
+    except OSError:
+        shutil.copyfile(src, dest)
+
+
+class DaxSession():
+    """Cache the ds9 image, and task outputs, between dax tasks.
+
+    Each dax task is run in a new process, so the cache is stored in
+    the dax_cache directory of DAX_OUTDIR. The image sent by ds9 is
+    stored after it has been cropped and the WCS updated for blocking,
+    using a key created from the ds9 frame, file, crop, block, bin
+    filter, and FITS header. The output of an image task is also
+    stored, using a key created from the tool parameters, so that
+    re-running a task with the same settings does not re-run the tool.
+
+    The cache is not used if the dax.cache parameter is set to no.
+    """
+
+    max_images = 4
+    max_outputs = 32
+
+    def __init__(self, xpaget, outdir):
+        self.xpaget = xpaget
+        self.cachedir = os.path.join(outdir, "dax_cache")
+        self.outputs = os.path.join(self.cachedir, "outputs.json")
+
+        from paramio import pget
+        try:
+            self.enabled = "yes" == pget("dax", "cache")
+        except (ValueError, RuntimeError, OSError):
+            # An old dax.par file which does not have the parameter
+            self.enabled = True
+
+        if self.enabled:
+            os.makedirs(self.cachedir, exist_ok=True)
+
+    def image_key(self):
+        'Return the key for the current ds9 image, or None'
+
+        if not self.enabled:
+            return None
+
+        state = {"frame": self.xpaget("frame").strip(),
+                 "file": self.xpaget("file").strip(),
+                 "crop": self.xpaget("crop image").strip(),
+                 "block": self.xpaget("block").strip(),
+                 "filter": self.xpaget("bin filter").strip(),
+                 "header": self.xpaget(["fits", "header"])}
+
+        # For event files the image depends on how ds9 bins the
+        # events, which is not recorded in the header.
+        for binpar in ["factor", "function", "buffersize", "about", "cols"]:
+            state[f"bin {binpar}"] = self.xpaget(["bin", binpar]).strip()
+
+        # Include the modification time of the file, if it is on disk
+        fname = state["file"].split("[")[0]
+        if os.path.isfile(fname):
+            state["mtime"] = os.stat(fname).st_mtime_ns
+
+        state = json.dumps(state, sort_keys=True)
+        return hashlib.sha1(state.encode()).hexdigest()
+
+    def _image_name(self, key):
+        return os.path.join(self.cachedir, f"img_{key}.fits")
+
+    def copy_image(self, key, outfile):
+        'Copy the cached image to outfile, returning False if there is none'
+
+        if key is None:
+            return False
+
+        cached = self._image_name(key)
+        if not os.path.exists(cached):
+            return False
+
+        print("Using cached ds9 image\n")
+        os.utime(cached)
+        _link_or_copy(cached, outfile)
+        return True
+
+    def store_image(self, key, infile):
+        'Add the image to the cache'
+
+        if key is None:
+            return
+
+        tmpname = self._image_name(key) + ".tmp"
+        _link_or_copy(infile, tmpname)
+        os.replace(tmpname, self._image_name(key))
+
+        # Remove the oldest images
+        images = [os.path.join(self.cachedir, f)
+                  for f in os.listdir(self.cachedir)
+                  if f.startswith("img_") and f.endswith(".fits")]
+        images.sort(key=os.path.getmtime, reverse=True)
+        for fname in images[self.max_images:]:
+            os.unlink(fname)
+
+    @staticmethod
+    def output_key(tool, outfile, image_keys):
+        """Return the key for the tool output.
+
+        The temporary file names are replaced by the image keys so
+        that the same settings will create the same key. There is no
+        key if the parameters refer to other temporary files created
+        from the outfile name - such as the PSF used by arestore - since
+        their contents are not known.
+        """
+
+        if None in image_keys.values():
+            return None
+
+        pars = str(tool)
+        for match in re.finditer(re.escape(outfile) + r"(\S*)", pars):
+            if match.group(1) != "":
+                return None
+
+        pars = pars.replace(outfile, "<outfile>")
+        for fname, key in image_keys.items():
+            pars = pars.replace(fname, key)
+
+        return hashlib.sha1(pars.encode()).hexdigest()
+
+    def _read_outputs(self):
+        try:
+            with open(self.outputs, "r", encoding="utf-8") as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return {}
+
+    def copy_output(self, key, outfile):
+        """Copy the output of an earlier run to outfile.
+
+        The return value is the screen output of the earlier run,
+        or None if there is no output to use.
+        """
+
+        if key is None:
+            return None
+
+        try:
+            (fname, verb) = self._read_outputs()[key]
+        except (KeyError, ValueError):
+            return None
+
+        if not os.path.exists(fname):
+            return None
+
+        print("Re-using output from {}\n".format(fname))
+        _link_or_copy(fname, outfile)
+        return verb
+
+    def store_output(self, key, outfile, verb):
+        'Record the output of the tool'
+
+        if key is None or not os.path.exists(outfile):
+            return
+
+        outputs = self._read_outputs()
+        outputs.pop(key, None)
+        outputs[key] = [outfile, "" if verb is None else verb]
+
+        # Keep the most-recent entries whose files still exist
+        keep = [(k, v) for k, v in outputs.items() if os.path.exists(v[0])]
+        outputs = dict(keep[-self.max_outputs:])
+
+        tmpname = self.outputs + ".tmp"
+        with open(tmpname, "w", encoding="utf-8") as fh:
+            json.dump(outputs, fh)
+
+        os.replace(tmpname, self.outputs)
+
+
 class ImageProcTask():
     'Base classs for image processing tasks'
 
     toolname = None
 
+    # Can the output of a previous run be re-used if the parameters
+    # are unchanged?
+    reuse_output = True
+
     def __init__(self, xpa, args):
         'Init: save image, and setup parameters'
 
@@ -41,6 +229,8 @@ class ImageProcTask():
         print(datetime.datetime.now())
 
         self.xpa = xpa
+        self.session = DaxSession(self.xpaget, os.environ["DAX_OUTDIR"])
+        self.image_keys = {}
 
         self.infile = self.save_ds9_image()
         self.keep_infiles = False
@@ -173,8 +363,8 @@ class ImageProcTask():
             retval = retval.decode()
         return retval
 
-    def update_wcs_for_blocking(self, infile):
-        'Update the WCS if image has been blocked'
+    def update_wcs_for_blocking(self, img):
+        'Update the WCS of the image crate if image has been blocked'
 
         # ds9 does not update the WCS in the FITS header when it blocks
         # data so we need to.
@@ -185,14 +375,12 @@ class ImageProcTask():
         # BUT -- dax is using all DM tools so it's going to
         # get broken at some point anyways.
 
-        from pycrates import read_file
         from pytransform import LINEARTransform, LINEAR2DTransform
 
         block = float(self.xpaget("block"))
         if block == 1.0:
             return
 
-        img = read_file(infile, mode="rw")
         for axis in img.get_axisnames():
             xform = img.get_transform(axis)
             if xform is None:
@@ -210,12 +398,10 @@ class ImageProcTask():
 
             scale.set_value(scale.get_value()*block)
 
-        img.write()
-        del img
         return
 
-    def save_ds9_image(self):
-        'Save image currently displayed by ds9'
+    def fetch_ds9_image(self, outfile):
+        'Get the image currently displayed by ds9 and write it to outfile'
 
         # ds9 can crop images; but when you get the file it
         # sends the whole thing.  We can get the crop info
@@ -232,17 +418,32 @@ class ImageProcTask():
         # Get fits image from ds9
         fits = self.xpaget(["fits", ], decode=False)
 
-        # Use dmcopy to filter on cropped region; pipe
-        # fits file into dmcopy via stdin.
+        # Apply the crop when reading in the image, and fix the WCS
+        # before writing it out, rather than running dmcopy.
+        from pycrates import read_file
+        with NamedTemporaryFile(dir=os.environ["DAX_OUTDIR"],
+                                suffix="_raw.fits") as raw:
+            raw.write(fits)
+            raw.flush()
+
+            img = read_file(raw.name + filt)
+            self.update_wcs_for_blocking(img)
+            img.write(outfile, clobber=True)
+            del img
+
+    def save_ds9_image(self):
+        'Save image currently displayed by ds9'
+
         ds9_file = NamedTemporaryFile(dir=os.environ["DAX_OUTDIR"],
                                       suffix="_ds9.fits", delete=False)
-        cmd = ['dmcopy', '-{}'.format(filt), ds9_file.name, "clobber=yes"]
-        dmc = sp.Popen(cmd, stdin=sp.PIPE)
-        dmc.stdin.write(fits)
-        dmc.communicate()
+        ds9_file.close()
 
-        self.update_wcs_for_blocking(ds9_file.name)
+        key = self.session.image_key()
+        if not self.session.copy_image(key, ds9_file.name):
+            self.fetch_ds9_image(ds9_file.name)
+            self.session.store_image(key, ds9_file.name)
 
+        self.image_keys[ds9_file.name] = key
         return ds9_file.name
 
     def _get_header(self):
@@ -439,6 +640,15 @@ class ImageProcTaskImgOut(ImageProcTask):
     def run_tool(self):
         'Runs tool.  Overrides outfile to provide nice blocks name'
 
+        key = None
+        if self.reuse_output and not self.keep_infiles and \
+           hasattr(self.tool, "outfile"):
+            key = self.session.output_key(self.tool, self.outfile.name,
+                                          self.image_keys)
+            verb = self.session.copy_output(key, self.outfile.name)
+            if verb is not None:
+                return verb
+
         if hasattr(self.tool, "outfile"):
             # If the tool has an outfile, then add the
             # tool name as the extension name, eg
@@ -452,6 +662,7 @@ class ImageProcTaskImgOut(ImageProcTask):
         else:
             verb = self.tool()
 
+        self.session.store_output(key, self.outfile.name, verb)
         return verb
 
 
@@ -1017,6 +1228,9 @@ class Arestore(ImageProcTaskImgOut):
 
     toolname = "arestore"
 
+    # The PSF is created from the source region
+    reuse_output = False
+
     def set_args(self, args):
         'Args: none'
 
@@ -1043,6 +1257,7 @@ class Dmfilth(ImageProcTaskImgOut):
     'CIAO dmfilth task'
 
     toolname = 'dmfilth'
+    reuse_output = False
 
     def set_args(self, args):
         self.tool.method = args[0]
@@ -1372,6 +1587,7 @@ class Simulatepsf(ImageProcTaskImgOut):
     'Contrib simulate_psf tool'
 
     toolname = 'simulate_psf'
+    reuse_output = False
 
     def set_args(self, args):
         'args:  energy flux blur niter steak pileup ideal extend'
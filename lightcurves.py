@@ -1,5 +1,5 @@
 #
-#  Copyright (C) 2008, 2009, 2010, 2011, 2014, 2015, 2016, 2017, 2018, 2019, 2021, 2023, 2025
+#  Copyright (C) 2008, 2009, 2010, 2011, 2014, 2015, 2016, 2017, 2018, 2019, 2021, 2023, 2025, 2026
 #            Smithsonian Astrophysical Observatory
 #
 #
@@ -38,6 +38,7 @@ Threads:
 
 from itertools import groupby
 from operator import itemgetter
+import re
 import tempfile
 
 import numpy as np
@@ -56,10 +57,10 @@ else:
 import matplotlib.pyplot as plt
 
 # NOTE: the lc_sigma_uclip algorithm is not ready for release
-# __all__ = ("lc_sigma_clip", "lc_sigma_uclip", "lc_clean")
-__all__ = ("lc_sigma_clip", "lc_clean")
+# __all__ = ("lc_sigma_clip", "lc_sigma_uclip", "lc_clean", "lc_multi_gti")
+__all__ = ("lc_sigma_clip", "lc_clean", "lc_multi_gti")
 
-__revision = "16 May 2023"
+__revision = "18 October 2026"
 
 
 def _write_gti_text(outfile, tstart, tend):
@@ -181,10 +182,23 @@ class LightCurve:
     """Store data from a lightcurve and provide
     methods to manipulate and display the data"""
 
-    def __init__(self, filename, verbose=1):
+    def __init__(self, filename, verbose=1, data=None):
+        """If data is not None then it is used rather than reading
+        in the light curve from filename. It is a dictionary with
+        keys time, count_rate, exposure, time_min, time_max, and
+        labels (see bin_event_times).
+        """
         self.filename = filename
         self.verbose = verbose
-        self.__read_data()
+        if data is None:
+            self.__read_data()
+        else:
+            self.ratename = "count_rate"
+            self.labels = dict(data["labels"])
+            self.__set_data(data["time"], data["count_rate"],
+                            exposure=data["exposure"],
+                            time_min=data["time_min"],
+                            time_max=data["time_max"])
 
         # The storage is rather redundant here (e.g. filter and clean_gti
         # are the same) but was originally written to support easy comparison
@@ -225,7 +239,32 @@ class LightCurve:
         else:
             raise IOError(f"No count_rate or rate column in file '{self.filename}'")
 
-        self.time = cr.get_column("time").values.copy()
+        def getcol(name):
+            if not cr.column_exists(name):
+                return None
+            return cr.get_column(name).values.copy()
+
+        self.labels = {}
+        self.add_label(cr, "OBJECT")
+        self.add_label(cr, "OBS_ID")
+        self.add_label(cr, "EXPOSURE", protect=False)
+        self.add_label(cr, "DTCOR", protect=False)
+        self.add_label(cr, "ONTIME", protect=False)
+        self.add_label(cr, "TIMEDEL", protect=False)
+
+        self.__set_data(cr.get_column("time").values.copy(),
+                        getcol(self.ratename),
+                        exposure=getcol("exposure"),
+                        time_min=getcol("time_min"),
+                        time_max=getcol("time_max"))
+
+    def __set_data(self, time, rate, exposure=None, time_min=None,
+                   time_max=None):
+        """Store and validate the light curve. The time_min and time_max
+        values are only used if both are given.
+        """
+
+        self.time = time
         if self.time.size < 1:
             raise IOError(f"No data read in from the lightcurve '{self.filename}'")
         elif self.time.size < 2:
@@ -233,10 +272,10 @@ class LightCurve:
 
         self.report(f"Total number of bins in lightcurve   = {self.time.size:d}")
 
-        self.rate = cr.get_column(self.ratename).values.copy()
+        self.rate = rate
 
-        if cr.column_exists("exposure"):
-            self.exposure = cr.get_column("exposure").values.copy()
+        if exposure is not None:
+            self.exposure = exposure
             self.bin_width = self.exposure.max()
 
             # We do not make use of this filter, so commenting out for now
@@ -254,23 +293,15 @@ class LightCurve:
             self.exposure = None
             self.bin_width = None
 
-        if cr.column_exists("time_min") and cr.column_exists("time_max"):
-            self.time_min = cr.get_column("time_min").values.copy()
-            self.time_max = cr.get_column("time_max").values.copy()
+        if time_min is not None and time_max is not None:
+            self.time_min = time_min
+            self.time_max = time_max
             self.time_offset = self.time_min[0]
         else:
             self.time_min = None
             self.time_max = None
             self.time_offset = self.time[0]
 
-        self.labels = {}
-        self.add_label(cr, "OBJECT")
-        self.add_label(cr, "OBS_ID")
-        self.add_label(cr, "EXPOSURE", protect=False)
-        self.add_label(cr, "DTCOR", protect=False)
-        self.add_label(cr, "ONTIME", protect=False)
-        self.add_label(cr, "TIMEDEL", protect=False)
-
         self.filter = self.rate > 0.0
         if any(self.filter) is False:
             raise IOError(f"No rows with a count rate > 0 ({self.filename})")
@@ -921,8 +952,8 @@ class LightCurve:
 class CleanLightCurve(LightCurve):
     "Light curve filtering using the same method as the ACIS background files"
 
-    def __init__(self, filename, verbose=1):
-        LightCurve.__init__(self, filename, verbose=verbose)
+    def __init__(self, filename, verbose=1, data=None):
+        LightCurve.__init__(self, filename, verbose=verbose, data=data)
         if self.exposure is None:
             raise IOError(f"The lightcurve '{filename}' does not contain an EXPOSURE column!")
 
@@ -1013,10 +1044,10 @@ class SigmaClipBaseLightCurve(LightCurve):
     """Provide an iterative sigma-clipping filter for a lightcurve. This
     is intended to be sub-classed and should not be created."""
 
-    def __init__(self, filename, verbose=1):
+    def __init__(self, filename, verbose=1, data=None):
         """The sub-class should set the self.method field after
         calling this method."""
-        LightCurve.__init__(self, filename, verbose=verbose)
+        LightCurve.__init__(self, filename, verbose=verbose, data=data)
 
     def _clip_data(self, sigmas, sigma=3.0):
         """Return True/False for each points: True indicates that
@@ -1091,8 +1122,9 @@ class SigmaClipBaseLightCurve(LightCurve):
 class SigmaClipLightCurve(SigmaClipBaseLightCurve):
     "Provide an iterative sigma-clipping filter for a lightcurve"
 
-    def __init__(self, filename, verbose=1):
-        SigmaClipBaseLightCurve.__init__(self, filename, verbose=verbose)
+    def __init__(self, filename, verbose=1, data=None):
+        SigmaClipBaseLightCurve.__init__(self, filename, verbose=verbose,
+                                         data=data)
         self.method = "lc_sigma_clip"
 
     def _clip_data(self, sigmas, sigma=3.0):
@@ -1112,14 +1144,256 @@ class SigmaUpperClipLightCurve(SigmaClipBaseLightCurve):
     *** AS AN EXPERIMENTAL FEATURE. ITS BEHAVIOR MAY CHANGE AT ANY TIME.
     """
 
-    def __init__(self, filename, verbose=1):
-        SigmaClipBaseLightCurve.__init__(self, filename, verbose=verbose)
+    def __init__(self, filename, verbose=1, data=None):
+        SigmaClipBaseLightCurve.__init__(self, filename, verbose=verbose,
+                                         data=data)
         self.method = "lc_sigma_uclip"
 
     def _clip_data(self, sigmas, sigma=3.0):
         return (sigmas > sigma)
 
 
+# Create light curves directly from the event file
+#
+
+def _gti_time_before(t, gtistart, gtistop):
+    """Return the amount of time within the GTIs that occurs before
+    each time in t. The GTIs must be sorted and not overlap."""
+
+    duration = gtistop - gtistart
+    cumulative = np.concatenate(([0], np.cumsum(duration)))
+    idx = np.searchsorted(gtistart, t, side="right") - 1
+    ok = idx >= 0
+    out = np.zeros(np.shape(t))
+    i = idx[ok]
+    out[ok] = cumulative[i] + np.minimum(t[ok] - gtistart[i], duration[i])
+    return out
+
+
+def bin_event_times(times, binsizes, tstart, tstop, gti=None, dtcor=1.0,
+                    labels=None):
+    """Create light curves from the event times.
+
+    The events are binned into bins of width binsize starting at
+    tstart, for each binsize in binsizes (in seconds), with the last
+    bin containing tstop. The exposure of a bin is the time it
+    overlaps the GTI - given as the (start, stop) arrays - multiplied
+    by dtcor. If gti is None then the whole of tstart to tstop is
+    used.
+
+    The times only need to be sorted once, and the counts in each bin
+    are found from the cumulative counts at the bin edges, so many
+    bin sizes can be calculated cheaply.
+
+    The return value is a list of dictionaries, one per binsize,
+    with keys time, time_min, time_max, counts, exposure, count_rate,
+    and labels (the labels argument with TIMEDEL set to the bin size),
+    which can be used as the data argument of the LightCurve classes.
+    """
+
+    times = np.sort(np.asarray(times, dtype=np.float64))
+    if gti is None:
+        gtistart = np.asarray([tstart], dtype=np.float64)
+        gtistop = np.asarray([tstop], dtype=np.float64)
+    else:
+        gtistart = np.asarray(gti[0], dtype=np.float64)
+        gtistop = np.asarray(gti[1], dtype=np.float64)
+        idx = np.argsort(gtistart)
+        gtistart = gtistart[idx]
+        gtistop = gtistop[idx]
+
+    if labels is None:
+        labels = {}
+
+    out = []
+    for binsize in binsizes:
+        if binsize <= 0:
+            raise ValueError(f"binsize must be > 0, not {binsize:g}")
+
+        nbins = max(1, int(np.ceil((tstop - tstart) / binsize)))
+        edges = tstart + binsize * np.arange(nbins + 1)
+
+        counts = np.diff(np.searchsorted(times, edges, side="left"))
+        gtitime = _gti_time_before(edges, gtistart, gtistop)
+        exposure = np.diff(gtitime) * dtcor
+
+        rate = np.zeros(nbins)
+        ok = exposure > 0
+        rate[ok] = counts[ok] / exposure[ok]
+
+        blabels = dict(labels)
+        blabels["TIMEDEL"] = binsize
+        out.append({"binsize": binsize,
+                    "time_min": edges[:-1],
+                    "time_max": edges[1:],
+                    "time": (edges[:-1] + edges[1:]) / 2,
+                    "counts": counts,
+                    "exposure": exposure,
+                    "count_rate": rate,
+                    "labels": blabels})
+
+    return out
+
+
+def _time_filter_ranges(evtfile):
+    """Return the time ranges selected by any DM filter in evtfile.
+
+    The return value is None if there is no time filter, otherwise a
+    list of (lo, hi) pairs, where None indicates an open limit. If the
+    file name contains several time filters then they are all listed,
+    as a list of lists. Only the simple range syntax - e.g.
+    time=lo:hi,lo2:hi2 - is supported, and a ValueError is raised for
+    other forms.
+    """
+
+    filters = []
+    for filt in re.findall(r"\[([^\]]*)\]", evtfile):
+        for match in re.finditer(r"(?<![\w.])time\s*=", filt, flags=re.I):
+            ranges = []
+            for token in filt[match.end():].split(","):
+                if "=" in token:
+                    break
+
+                token = token.strip()
+                if token.count(":") != 1:
+                    raise ValueError(f"Unsupported time filter in '{evtfile}'")
+
+                lims = []
+                for lim in token.split(":"):
+                    lim = lim.strip()
+                    try:
+                        lims.append(float(lim) if lim != "" else None)
+                    except ValueError:
+                        raise ValueError(f"Unsupported time filter in '{evtfile}'") from None
+
+                ranges.append(tuple(lims))
+
+            if len(ranges) == 0:
+                raise ValueError(f"Unsupported time filter in '{evtfile}'")
+
+            filters.append(ranges)
+
+    if len(filters) == 0:
+        return None
+
+    return filters
+
+
+def _intersect_gti(gtistart, gtistop, ranges):
+    """Return the parts of the GTIs that lie within any of the ranges,
+    which are (lo, hi) pairs where None indicates an open limit. The
+    GTIs must be sorted and not overlap."""
+
+    starts = []
+    stops = []
+    for (lo, hi) in sorted(ranges, key=lambda r: -np.inf if r[0] is None else r[0]):
+        lo = -np.inf if lo is None else lo
+        hi = np.inf if hi is None else hi
+        start = np.maximum(gtistart, lo)
+        stop = np.minimum(gtistop, hi)
+        ok = start < stop
+        starts.append(start[ok])
+        stops.append(stop[ok])
+
+    start = np.concatenate(starts)
+    stop = np.concatenate(stops)
+    idx = np.argsort(start, kind="stable")
+    start = start[idx]
+    stop = stop[idx]
+
+    # Merge any overlapping ranges
+    outstart = []
+    outstop = []
+    for (t0, t1) in zip(start, stop):
+        if len(outstop) > 0 and t0 <= outstop[-1]:
+            outstop[-1] = max(outstop[-1], t1)
+        else:
+            outstart.append(t0)
+            outstop.append(t1)
+
+    return (np.asarray(outstart, dtype=np.float64),
+            np.asarray(outstop, dtype=np.float64))
+
+
+def read_event_times(evtfile):
+    """Return the event times, TSTART, TSTOP, DTCOR, the GTI, and the
+    labels for the event file (which can include a DM filter).
+
+    If the file contains several GTI blocks then the events must all
+    come from one chip, and the GTI block with the matching CCD_ID
+    value is used. Any time filter in the file name is also applied
+    to the GTI.
+    """
+
+    from ciao_contrib.cxcdm_wrapper import get_info_from_file
+
+    try:
+        cr = pcr.read_file(f"{evtfile}[cols time,ccd_id]")
+        ccds = np.unique(cr.get_column("ccd_id").values)
+    except (IOError, OSError, ValueError):
+        cr = pcr.read_file(f"{evtfile}[cols time]")
+        ccds = None
+
+    times = cr.get_column("time").values.copy()
+    tstart = cr.get_key_value("TSTART")
+    tstop = cr.get_key_value("TSTOP")
+    if tstart is None or tstop is None:
+        raise IOError(f"Missing TSTART/TSTOP keywords in '{evtfile}'")
+
+    dtcor = cr.get_key_value("DTCOR")
+    if dtcor is None:
+        dtcor = 1.0
+
+    labels = {}
+    for key in ["OBJECT", "OBS_ID", "EXPOSURE", "DTCOR", "ONTIME"]:
+        val = cr.get_key_value(key)
+        if val is not None:
+            labels[key] = val
+
+    basename = evtfile.split("[")[0]
+    gtis = [(blname, blinfo) for (blname, blinfo) in get_info_from_file(basename)
+            if blname.upper().startswith("GTI") and blinfo["type"] == "TABLE"]
+
+    if len(gtis) == 0:
+        gtiname = None
+    elif len(gtis) == 1:
+        gtiname = gtis[0][0]
+    else:
+        if ccds is None or len(ccds) != 1:
+            raise ValueError(f"Multiple GTI blocks in '{evtfile}': filter the events by ccd_id")
+
+        gtiname = None
+        for (blname, blinfo) in gtis:
+            ccd = blinfo["records"].get("CCD_ID")
+            if ccd is not None and ccd.value == ccds[0]:
+                gtiname = blname
+                break
+
+        if gtiname is None:
+            raise ValueError(f"No GTI block for ccd_id={ccds[0]} in '{evtfile}'")
+
+    if gtiname is None:
+        gti = None
+    else:
+        gcr = pcr.read_file(f"{basename}[{gtiname}]")
+        gti = (gcr.get_column("start").values.copy(),
+               gcr.get_column("stop").values.copy())
+
+    tfilters = _time_filter_ranges(evtfile)
+    if tfilters is not None:
+        if gti is None:
+            gti = (np.asarray([tstart], dtype=np.float64),
+                   np.asarray([tstop], dtype=np.float64))
+        else:
+            idx = np.argsort(gti[0])
+            gti = (gti[0][idx], gti[1][idx])
+
+        for ranges in tfilters:
+            gti = _intersect_gti(gti[0], gti[1], ranges)
+
+    return (times, tstart, tstop, dtcor, gti, labels)
+
+
 # Public access to the filtering
 #
 
@@ -1412,4 +1686,106 @@ def lc_sigma_uclip(filename, outfile=None, sigma=3.0, minlength=3, plot=True,
                    pcol=pcol, erase=erase,
                    verbose=verbose)
 
+
+def lc_multi_gti(evtfile, binsizes, method="sigma", outroot=None,
+                 sigma=3.0, minlength=3, mean=None, clip=3.0, scale=1.2,
+                 minfrac=0.1, verbose=1):
+    """Calculate the good times for light curves created from an event
+    file using several bin sizes.
+
+    The event times are read in once and binned using each of the
+    binsizes (in seconds), and then filtered with the lc_clean
+    (method='clean'), lc_sigma_clip (method='sigma'), or lc_sigma_uclip
+    (method='usigma') algorithm. This makes it easy to compare the
+    results for different bin sizes without having to create each
+    light curve with dmextract. The evtfile argument can include a DM
+    filter, such as an energy range or a ccd_id selection. A time
+    filter, which must use the lo:hi range syntax, is also applied to
+    the GTI when calculating the exposure.
+
+    The sigma and minlength arguments are used by the sigma-clipping
+    methods, and mean, clip, sigma, scale, and minfrac by the clean
+    method (where sigma can be None), as described in lc_sigma_clip
+    and lc_clean.
+
+    The return value is a list, one element per bin size, of
+    dictionaries with keys binsize, tstart, tstop (the good time
+    intervals), exposure (the filtered exposure time in seconds),
+    min_rate, max_rate, and mean_rate. If a bin size can not be
+    filtered then tstart and tstop are None and the error key
+    contains the reason.
+
+    If outroot is not None then a GTI file is created for each
+    bin size, called <outroot>_<binsize>.gti.
+
+    A summary is displayed if verbose is not 0.
+    """
+
+    labels = {"clean": "lc_clean", "sigma": "lc_sigma_clip",
+              "usigma": "lc_sigma_uclip"}
+    if method not in labels:
+        raise ValueError(f"method argument must be one of clean, sigma, usigma, not '{method}'")
+
+    minlength = int(minlength)
+    if minlength < 1:
+        raise ValueError(f"minlength argument must be >= 1, not {minlength:d}")
+
+    (times, tstart, tstop, dtcor, gti, hdr) = read_event_times(evtfile)
+    curves = bin_event_times(times, binsizes, tstart, tstop, gti=gti,
+                             dtcor=dtcor, labels=hdr)
+
+    out = []
+    for data in curves:
+        ans = {"binsize": data["binsize"], "tstart": None, "tstop": None,
+               "exposure": 0.0, "min_rate": None, "max_rate": None,
+               "mean_rate": None}
+        out.append(ans)
+
+        try:
+            if method == "clean":
+                lc = CleanLightCurve(evtfile, verbose=0, data=data)
+                lc.calculate_filter(mean=mean, clip=clip, sigma=sigma,
+                                    scale=scale)
+                lc.check_valid(minfrac)
+                nmin = 1
+            else:
+                if method == "sigma":
+                    lc = SigmaClipLightCurve(evtfile, verbose=0, data=data)
+                else:
+                    lc = SigmaUpperClipLightCurve(evtfile, verbose=0,
+                                                  data=data)
+
+                lc.calculate_filter(sigma=sigma, minlength=minlength)
+                nmin = minlength
+
+            (tlo, thi, exposure, tflag) = \
+                lc.calculate_valid_time_bins(minlength=nmin)
+
+        except (IOError, ValueError) as exc:
+            ans["error"] = str(exc)
+            continue
+
+        ans["tstart"] = tlo
+        ans["tstop"] = thi
+        ans["exposure"] = exposure.sum()
+        ans["min_rate"] = lc.clean_min_rate
+        ans["max_rate"] = lc.clean_max_rate
+        ans["mean_rate"] = lc.clean_mean_rate
+
+        if outroot is not None:
+            _write_gti_text(f"{outroot}_{data['binsize']:g}.gti", tlo, thi)
+
+    if verbose > 0:
+        print(f"Light curves filtered with {labels[method]}:")
+        print("    binsize  intervals  exposure (ks)  mean rate (ct/s)")
+        for ans in out:
+            if ans["tstart"] is None:
+                print(f"  {ans['binsize']:9g}  {ans['error']}")
+            else:
+                print(f"  {ans['binsize']:9g}  {len(ans['tstart']):9d}  "
+                      f"{ans['exposure'] / 1e3:13.2f}  {ans['mean_rate']:16g}")
+        print("")
+
+    return out
+
 # End
@@ -1,5 +1,5 @@
 #
-#  Copyright (C) 2024
+#  Copyright (C) 2024, 2026
 #           Smithsonian Astrophysical Observatory
 #
 #
@@ -47,24 +47,33 @@ or
 >>> bkgspec = get_bkg()
 >>> diagrmf,flatarf = mkdiagresp(refspec=bkgspec)
 
+The responses are only built once for a given energy grid, and
+set_diagresp can be used to set the same responses for many datasets:
+
+>>> set_diagresp([1, 2, 3], bkg_id=1, refspec="bkg.pi")
+
 """
 
-__revision__ = "20 October 2024"
+__revision__ = "18 October 2026"
 
 import os
 import warnings
+from collections import OrderedDict
+from copy import deepcopy
 from logging import getLogger
 from functools import wraps
 from re import sub
 
 import numpy.typing as npt
-from numpy import arange
+from numpy import arange, asarray
 
 from ciao_contrib._tools.fileio import get_keys_from_file
 
 from sherpa.astro.data import DataPHA
 from sherpa.astro.ui import create_rmf as shpmkrmf
 from sherpa.astro.ui import create_arf as shpmkarf
+from sherpa.astro.ui import set_rmf as shpsetrmf
+from sherpa.astro.ui import set_arf as shpsetarf
 from sherpa import __version__ as shpver
 
 
@@ -637,12 +646,39 @@ def _fix_bin_edges(elo: npt.NDArray, ehi: npt.NDArray,
 
 
 
+### the responses created by build_resp, keyed by the energy grid ###
+_RESP_CACHE_SIZE: int = 16
+_resp_cache: OrderedDict = OrderedDict()
+
+
+def clear_resp_cache():
+    """
+    Remove the responses stored by build_resp, so that they are re-created.
+    """
+
+    _resp_cache.clear()
+
+
+
+def _resp_key(emin, emax, offset, ethresh) -> tuple:
+    elo = asarray(emin)
+    ehi = asarray(emax)
+
+    return (elo.dtype.str, elo.tobytes(), ehi.dtype.str, ehi.tobytes(),
+            int(offset), ethresh)
+
+
+
 @_reformat_wmsg
 def build_resp(emin, emax, offset: int, ethresh: float|None = 1e-12):
     """
     Return a diagonal RMF and flat ARF data objects with matching energy grid.
     Use set_rmf and set_arf on the respective instances.
 
+    The responses are only created once for a given energy grid, channel
+    offset, and ethresh value; each call returns a copy of them, so
+    they can be changed without affecting later calls.
+
     Parameters:
         emin - array of energy grid lower bin edge
         emax - array of energy grid upper bin edge
@@ -653,6 +689,38 @@ def build_resp(emin, emax, offset: int, ethresh: float|None = 1e-12):
 
     logger = getLogger(__name__)
 
+    key = _resp_key(emin, emax, offset, ethresh)
+    resps = _resp_cache.pop(key, None)
+
+    if resps is None:
+        resps = _build_resp(emin, emax, offset, ethresh)
+
+        while len(_resp_cache) >= _RESP_CACHE_SIZE:
+            _resp_cache.popitem(last=False)
+
+    _resp_cache[key] = resps
+
+
+    wmsg = "RMF and ARF data objects returned; use 'set_rmf' and 'set_arf' to set the respective instances to dataset ID."
+
+    logger.warning("%s", f"\n{wmsg:>{len(wmsg)+4}}")
+
+
+    ### each caller gets its own copy, since Sherpa stores the channel
+    ### filter in the objects and the arrays can be changed in place
+    diag_rmf, flatarf = resps
+
+    return deepcopy(diag_rmf), deepcopy(flatarf)
+
+
+
+def _build_resp(emin, emax, offset: int, ethresh: float|None = 1e-12):
+    """
+    Create the diagonal RMF and flat ARF data objects.
+    """
+
+    logger = getLogger(__name__)
+
     try:
         flatarf = shpmkarf(emin, emax, ethresh=ethresh)
         diag_rmf = shpmkrmf(emin, emax, startchan=offset, ethresh=ethresh)
@@ -680,11 +748,6 @@ def build_resp(emin, emax, offset: int, ethresh: float|None = 1e-12):
         raise RuntimeError(exc) from exc
 
 
-    wmsg = "RMF and ARF data objects returned; use 'set_rmf' and 'set_arf' to set the respective instances to dataset ID."
-
-    logger.warning("%s", f"\n{wmsg:>{len(wmsg)+4}}")
-
-
     return diag_rmf, flatarf
 
 
@@ -898,3 +961,44 @@ def mkdiagresp(telescope: str = "Chandra",
 
 
     return build_resp(emin=elo, emax=ehi, offset=offset, ethresh=ethresh)
+
+
+
+def set_diagresp(ids, bkg_id: int|str|None = None,
+                 rmf=None, arf=None, **kwargs):
+    """
+    Set a diagonal RMF and flat ARF for each of the datasets in ids.
+
+    The responses are only created once - by calling mkdiagresp with
+    the remaining arguments - unless they are given with the rmf and
+    arf arguments. Each dataset is given its own copy of the response
+    objects.
+
+    Parameters:
+        ids - sequence of dataset identifiers
+        bkg_id - if not None, set the responses for this background
+                 component of each dataset
+        rmf, arf - the responses to use, as returned by mkdiagresp or
+                   build_resp; if either is None then mkdiagresp is called
+        kwargs - the arguments for mkdiagresp, such as telescope,
+                 instrument, or refspec
+
+    Returns the RMF and ARF objects.
+
+    Example:
+
+    >>> set_diagresp([1, 2, 3], bkg_id=1, refspec="bkg.pi")
+
+    """
+
+    if rmf is None or arf is None:
+        rmf,arf = mkdiagresp(**kwargs)
+
+    elif kwargs:
+        raise TypeError("The mkdiagresp arguments can not be set when 'rmf' and 'arf' are given.")
+
+    for dataid in ids:
+        shpsetrmf(dataid, deepcopy(rmf), bkg_id=bkg_id)
+        shpsetarf(dataid, deepcopy(arf), bkg_id=bkg_id)
+
+    return rmf, arf
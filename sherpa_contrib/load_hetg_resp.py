@@ -1,8 +1,26 @@
+import copy
+import os
+from collections import OrderedDict
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
 import numpy as np
 import glob
 from pathlib import Path
-from sherpa.astro.ui import load_data, load_arf, load_rmf
-from pycrates import read_file, get_keyval, read_pha, get_history_records, is_pha_type2
+from sherpa.astro.ui import load_data, set_arf, set_rmf, unpack_arf, unpack_rmf
+from pycrates import get_keyval, read_pha, get_history_records, is_pha_type2
+
+from ciao_contrib.cxcdm_wrapper import get_block_info_from_file
+
+
+# The ARF and RMF objects read in by load_gratings_pha2, stored by
+# (file name, response type) along with the size and modification
+# time of the file, so that re-loading the same responses does not
+# need to read the files again. The least-recently used responses
+# are removed once the arrays they hold exceed _RESP_CACHE_BYTES.
+_RESP_CACHE_BYTES = 256 * 1024 * 1024
+_resp_cache = OrderedDict()
 
 
 def find_resp_files(pha2_file, resp_type, resp_dir=None):
@@ -216,23 +234,25 @@ def match_resp_order(pha2_file, resp_list, resp_type, verbose=False):
     # of 3/23/26. TGCat ACIS HETG RMFs do not have OBS_ID and TGCat HRC LETG RMFs do not have tg_part or tg_m keywords.
     # The archive and repro RMFs do not have this problem.
 
-    # read each response file and append appropriate header values
+    # read the header of each response file and append appropriate header values. Only the header is read, and the
+    # values are re-used if the file has not changed since it was last read.
     for i in resp_list:
 
-        #load the response file
-        resp_data = read_file(i)
+        #read the header of the response file
+        (_, binfo) = get_block_info_from_file(i)
+        resp_keys = {key: rec.value for (key, rec) in binfo['records'].items()}
 
         #identify the gratings order
-        try:
-            resp_m_arr.append(get_keyval(resp_data, "TG_M"))
-        except:
-            resp_m_arr.append(get_keyval(resp_data, "ORDER"))
+        if "TG_M" in resp_keys:
+            resp_m_arr.append(resp_keys["TG_M"])
+        else:
+            resp_m_arr.append(resp_keys["ORDER"])
 
         #identify the gratings type (HEG, MEG or LEG).
-        try:
-            resp_pha2_tg_part_arr.append(get_keyval(resp_data, "TG_PART"))
-        except:
-            grating_type = get_keyval(resp_data, "GRATING")
+        if "TG_PART" in resp_keys:
+            resp_pha2_tg_part_arr.append(resp_keys["TG_PART"])
+        else:
+            grating_type = resp_keys.get("GRATING")
             if grating_type == 'LETG':
                resp_pha2_tg_part_arr.append(3) #note LEG --> tg_part = 3
             else:
@@ -240,9 +260,9 @@ def match_resp_order(pha2_file, resp_list, resp_type, verbose=False):
                     f"ERROR-- Could not identify grating type and/or order. Please load responses manually.")
 
         #identify the obsID
-        try:
-            resp_obsid_arr.append(get_keyval(resp_data, "OBS_ID"))
-        except:
+        if "OBS_ID" in resp_keys:
+            resp_obsid_arr.append(resp_keys["OBS_ID"])
+        else:
             resp_obsid_arr.append(pha2_tg_obsid)
             obsid_missing_count = obsid_missing_count + 1
 
@@ -304,6 +324,142 @@ def match_resp_order(pha2_file, resp_list, resp_type, verbose=False):
     return matched_resp_list
 
 
+def _get_file_stamp(filename):
+    """
+    Returns the values used to check whether a file has changed since it was read (or None if it can not be found).
+    """
+
+    try:
+        st = os.stat(filename)
+    except OSError:
+        return None
+
+    return (st.st_size, st.st_mtime_ns)
+
+
+def _get_resp_nbytes(resp):
+    """
+    Returns the number of bytes used by the arrays of the response (including those held by its attributes, such as
+    the data space). Arrays stored in more than one attribute are only counted once.
+    """
+
+    arrays = {}
+    for val in vars(resp).values():
+        vals = vars(val).values() if hasattr(val, "__dict__") else [val]
+        for arr in vals:
+            if isinstance(arr, np.ndarray):
+                arrays[id(arr)] = arr.nbytes
+
+    return sum(arrays.values())
+
+
+def _cache_response(key, stamp, resp):
+    """
+    Stores the response, removing the least-recently used responses so that the cache holds at most
+    _RESP_CACHE_BYTES bytes of arrays. A response larger than this is not stored.
+    """
+
+    _resp_cache.pop(key, None)
+    nbytes = _get_resp_nbytes(resp)
+    if nbytes > _RESP_CACHE_BYTES:
+        return
+
+    total = sum(cached[2] for cached in _resp_cache.values())
+    while _resp_cache and total + nbytes > _RESP_CACHE_BYTES:
+        total -= _resp_cache.popitem(last=False)[1][2]
+
+    _resp_cache[key] = (stamp, resp, nbytes)
+
+
+def _unpack_resp(filename, resp_type):
+    """
+    Reads in the ARF or RMF and returns it along with the time taken (in seconds).
+    """
+
+    t0 = time.perf_counter()
+    if resp_type == "arf":
+        resp = unpack_arf(filename)
+    else:
+        resp = unpack_rmf(filename)
+
+    return resp, time.perf_counter() - t0
+
+
+def read_responses(filenames, resp_type, verbose=False):
+    """
+    Reads in the ARF or RMF files, using separate processes for each file.
+
+    A response is only read in once for each file, as long as the size and modification time of the file have not
+    changed, so loading the same responses into new datasets does not require the files to be read again.
+
+    Parameters
+    ----------
+
+    filenames : list of str
+        The response files to read in.
+    resp_type: 'arf' or 'rmf'
+        The type of response files.
+    verbose: bool, optional
+        If 'True' then the time taken to read each file is printed to the screen. The default is 'False'.
+
+    Returns
+    --------
+    resp_list: list
+        The responses - as Sherpa DataARF or DataRMF objects - in the same order as filenames. Each element is a
+        separate copy, so it can be changed without affecting the other datasets.
+
+    """
+
+    if resp_type != "arf" and resp_type != "rmf":
+        raise ValueError("Response type must be either arf or rmf")
+
+    out = {}
+    timing = {}
+    stamps = {}
+    todo = []
+    for filename in dict.fromkeys(filenames):
+        key = (os.path.abspath(filename), resp_type)
+        stamps[filename] = _get_file_stamp(filename)
+        cached = _resp_cache.get(key)
+        if cached is not None and stamps[filename] is not None and cached[0] == stamps[filename]:
+            _resp_cache.move_to_end(key)
+            out[filename] = cached[1]
+            timing[filename] = None
+        else:
+            todo.append(filename)
+
+    nproc = min(len(todo), multiprocessing.cpu_count())
+    if nproc > 1:
+        ctx = multiprocessing.get_context("fork")
+        with ProcessPoolExecutor(max_workers=nproc, mp_context=ctx) as executor:
+            results = list(executor.map(_unpack_resp, todo, [resp_type] * len(todo)))
+    else:
+        results = [_unpack_resp(filename, resp_type) for filename in todo]
+
+    for (filename, (resp, dt)) in zip(todo, results):
+        out[filename] = resp
+        timing[filename] = dt
+        if stamps[filename] is not None:
+            _cache_response((os.path.abspath(filename), resp_type), stamps[filename], resp)
+
+    if verbose is True:
+        for filename in out:
+            if timing[filename] is None:
+                print(f"{resp_type.upper()}: {filename} -- re-used")
+            else:
+                print(f"{resp_type.upper()}: {filename} -- read in {timing[filename]:.2f} s")
+
+    return [copy.deepcopy(out[filename]) for filename in filenames]
+
+
+def clear_response_cache():
+    """
+    Removes the responses stored by read_responses(), so that they will be read in again.
+    """
+
+    _resp_cache.clear()
+
+
 def load_gratings_pha2(pha2_file=None, arf_dir=None, rmf_dir=None, dataset_id_start=1, use_errors=False, verbose=False):
     """
     Loads the HETG/LETG PHA2 spectrum and responses into the sherpa session.
@@ -314,6 +470,9 @@ def load_gratings_pha2(pha2_file=None, arf_dir=None, rmf_dir=None, dataset_id_st
     search for the responses in subdirectories where the PHA2 file is located using standard CIAO directory naming
     formats.
 
+    The response files are read in parallel, and responses which have already been read in - and whose files have not
+    changed - are re-used rather than read in again (see read_responses).
+
     Example
     -------
     >>> load_gratings_pha2(pha2_file="16370/repro/acisf16370_repro_pha2.fits", dataset_id_start=1)
@@ -336,7 +495,8 @@ def load_gratings_pha2(pha2_file=None, arf_dir=None, rmf_dir=None, dataset_id_st
         If 'True' then the statistical errors are taken from the input data, rather than calculated by Sherpa from
         the count values. The default is 'False'.
     verbose: bool, optional
-        If 'True' then the matched response files to each spectrum will be printed to the screen. The default is 'False'.
+        If 'True' then the matched response files to each spectrum, and the time taken to read each one, will be
+        printed to the screen. The default is 'False'.
 
     Related Sherpa functions
     ------------------------
@@ -383,10 +543,14 @@ def load_gratings_pha2(pha2_file=None, arf_dir=None, rmf_dir=None, dataset_id_st
 
     # for every identified response (arf), load matching arf and rmf. It should be ok to load RMFs with the arf loop
     # cause an error would be previously thrown if every arf didn't have a matching rmf.
-    for i in range(len(arf_list_matched)):
-        if arf_list_matched[i] != "no match":
-            # note, i+dataset_id_start here cause sherpa starts with dataset 1 and not 0.
-            load_arf(i + dataset_id_start, arf_list_matched[i])
-            load_rmf(i + dataset_id_start, rmf_list_matched[i])
+    #
+    # The files are read in together - in parallel - before being added to the datasets.
+    matched = [i for i in range(len(arf_list_matched)) if arf_list_matched[i] != "no match"]
+    arfs = read_responses([arf_list_matched[i] for i in matched], "arf", verbose=verbose)
+    rmfs = read_responses([rmf_list_matched[i] for i in matched], "rmf", verbose=verbose)
+    for (i, arf, rmf) in zip(matched, arfs, rmfs):
+        # note, i+dataset_id_start here cause sherpa starts with dataset 1 and not 0.
+        set_arf(i + dataset_id_start, arf)
+        set_rmf(i + dataset_id_start, rmf)
 
     return
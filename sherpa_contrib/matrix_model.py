@@ -85,16 +85,33 @@ class MatrixConvolution(ConvolutionModel, CompositeModel):
 
 
 class MatrixModel(Model):
-    'Implements a convolution that is a matrix multiplication'
+    '''Implements a convolution that is a matrix multiplication
+
+    If sparse is True then the matrix is stored, and multiplied, as
+    a scipy.sparse CSR matrix, which is faster for matrices that are
+    mostly zero.
+    '''
 
     string_types = (str, )
 
-    def __init__(self, matrix, grid, name="matrix"):
+    def __init__(self, matrix, grid, name="matrix", sparse=False):
         'Init'
-        self.matrix = numpy.array(matrix)
+        if sparse:
+            from scipy.sparse import csr_matrix
+            self.matrix = csr_matrix(matrix)
+        else:
+            self.matrix = numpy.array(matrix)
+
         self.name = name
         self.full_grid = numpy.array(grid)
         self.check_parameters()
+
+        # The filter indices for the last data grid, and the rows of
+        # the matrix they select, which are re-used until the filter
+        # changes.
+        self._filter = None
+        self._rows = None
+
         super().__init__(name)
 
     def check_parameters(self):
@@ -133,19 +150,20 @@ class MatrixModel(Model):
 
         return MatrixConvolution(MatrixValue(self.matrix), model, self)
 
-    def calc(self, pl, pr, lhs, rhs, *args, **kwargs):
-        'Perform the matrix multiplication'
+    def _get_filter(self, data_grid):
+        '''Return the indices of data_grid in the full grid, or None
+        if they are the same. The indices are only re-calculated when
+        the grid changes.'''
 
-        # pl and pr are model parameter values
-        # args is x-array
-        # kwargs = ??
-
-        data_grid = args[0]
+        if self._filter is not None and \
+                numpy.array_equal(self._filter[0], data_grid):
+            return self._filter[1]
 
         if len(data_grid) == len(self.full_grid):
             are_equal = (data_grid == self.full_grid)
             if not are_equal.all():
                 raise PSFErr("Input X-array does not match Full grid used to create MatrixModel")
+            filter_indices = None
         elif len(data_grid) > len(self.full_grid):
             raise PSFErr("Mismatch in data grid compared to MatrixModel grid")
         else:
@@ -154,13 +172,52 @@ class MatrixModel(Model):
             if not are_equal.all():
                 raise PSFErr("Data grid have values not in original grid")
 
-        data = numpy.asarray(rhs(pr, self.full_grid, **kwargs))
-        matrix = numpy.asarray(lhs(pl, self.full_grid, **kwargs))
+            order = numpy.argsort(self.full_grid, kind="stable")
+            pos = numpy.searchsorted(self.full_grid[order], data_grid)
+            filter_indices = order[pos]
+
+        self._filter = (numpy.array(data_grid), filter_indices)
+        self._rows = None
+        return filter_indices
+
+    def _get_rows(self, filter_indices):
+        '''Return the rows of the matrix selected by the filter.'''
 
+        if filter_indices is None:
+            return self.matrix
+
+        if self._rows is None:
+            self._rows = self.matrix[filter_indices]
+
+        return self._rows
+
+    def calc(self, pl, pr, lhs, rhs, *args, **kwargs):
+        'Perform the matrix multiplication'
+
+        # pl and pr are model parameter values
+        # args is x-array
+        # kwargs = ??
+
+        data_grid = numpy.asarray(args[0])
+        filter_indices = self._get_filter(data_grid)
+
+        data = numpy.asarray(rhs(pr, self.full_grid, **kwargs))
         dshape = data.shape
         if len(dshape) != 1:
             raise PSFErr("Data must be 1D")
 
+        # The matrix is normally the one this object was created with,
+        # which has already been checked, so only the rows selected by
+        # the filter need to be multiplied.
+        #
+        matrix = lhs(pl, self.full_grid, **kwargs)
+        if matrix is self.matrix:
+            if self.matrix.shape[0] != dshape[0]:
+                raise PSFErr("Matrix size must equal data length")
+
+            return self._get_rows(filter_indices) @ data
+
+        matrix = numpy.asarray(matrix)
         mshape = matrix.shape
         if len(mshape) != 2:
             raise PSFErr("Matrix must be 2D")
@@ -172,13 +229,10 @@ class MatrixModel(Model):
             raise PSFErr("Matrix size must equal data length")
 
         full_model = numpy.matmul(matrix, data)
-
-        if len(self.full_grid) == len(data_grid):
+        if filter_indices is None:
             return full_model
 
-        filter_indeces, = numpy.where([c in self.full_grid for c in data_grid])
-        filtered_model = full_model[filter_indeces]
-        return filtered_model
+        return full_model[filter_indices]
 
     # ~ def get_center(self):
         # ~ 'defined in abc'
@@ -1,5 +1,5 @@
 #
-#  Copyright (C) 2009, 2010, 2015, 2019
+#  Copyright (C) 2009, 2010, 2015, 2019, 2026
 #            Smithsonian Astrophysical Observatory
 #
 #
@@ -23,12 +23,6 @@ Routines to calculate the radial profile of a 2D image and fit,
 along with the residuals.
 """
 
-#
-# Perhaps there should be a routine to calculate the indexes
-# for the radial bins, and then one to perform the actual
-# "binning"?
-#
-
 import sherpa.astro.ui as ui
 
 from sherpa.utils.err import ArgumentErr
@@ -529,6 +523,94 @@ def _calc_error(n):
     return (1.0 + np.sqrt(n + 0.75))
 
 
+def _grouping_threshold(grouping):
+    """Return the comparison function for the grouping scheme and the
+    smallest group sum that meets it.
+
+    The comparison functions are monotonic in the group sum (for sums
+    >= 0), which is what allows the grouping to be calculated from the
+    cumulative sum of the data.
+    """
+
+    (gtype, gval) = grouping
+    if gtype == "counts":
+        def comparison_fn(s):
+            return s >= gval
+
+        smin = gval
+
+    elif gtype == "snr":
+        def comparison_fn(s):
+            return (s / _calc_error(s)) >= gval
+
+        # Solve s = gval * (1 + sqrt(s + 0.75)) for s, using
+        # u = sqrt(s + 0.75).
+        #
+        if gval <= 0:
+            smin = 0.0
+        else:
+            u = (gval + np.sqrt(gval * gval + 4 * gval + 3)) / 2.0
+            smin = u * u - 0.75
+
+    else:
+        raise ValueError("Unrecognized grouping type '{0}' (value={1})".format(gtype, gval))
+
+    return (comparison_fn, smin)
+
+
+def _group_ends_search(data, comparison_fn, smin):
+    """Return the index of the last bin in each group.
+
+    Since the bin values are >= 0 the cumulative sum is
+    non-decreasing, so the end of each group can be found with a
+    binary search, rather than looping through each bin. The search
+    is followed by a check using comparison_fn to guard against
+    rounding errors.
+    """
+
+    nbins = data.size
+    csum = np.cumsum(data)
+
+    ends = []
+    start = 0
+    base = 0.0
+    while start < nbins:
+        end = max(start, np.searchsorted(csum, base + smin, side="left"))
+        while end < nbins and not comparison_fn(csum[end] - base):
+            end += 1
+
+        while end > start and comparison_fn(csum[end - 1] - base):
+            end -= 1
+
+        if end >= nbins:
+            break
+
+        ends.append(end)
+        base = csum[end]
+        start = end + 1
+
+    return ends
+
+
+def _group_ends_loop(data, comparison_fn):
+    """Return the index of the last bin in each group.
+
+    Each bin is added to the current group until it meets the
+    criterion. This is used when there are negative bin values,
+    such as with background-subtracted data.
+    """
+
+    ends = []
+    total = 0
+    for i, val in enumerate(data):
+        total += val
+        if comparison_fn(total):
+            ends.append(i)
+            total = 0
+
+    return ends
+
+
 def _apply_grouping(prof, grouping, last=False):
     """Apply the user's grouping scheme to the data.
 
@@ -538,60 +620,86 @@ def _apply_grouping(prof, grouping, last=False):
 
     If no bins match then an ValueError is thrown.
 
-    Bin values are expected to be >= 0.
-
     The input dictionary can contain keys other than
       data, area, rlo, rhi, model, resid
     but the output content of these keys is not guaranteed to
     be in any way useful.
     """
 
-    (gtype, gval) = grouping
-    if gtype == "counts":
-        def comparison_fn(s):
-            return s >= gval
-    elif gtype == "snr":
-        def comparison_fn(s):
-            return (s / _calc_error(s)) >= gval
-    else:
-        raise ValueError("Unrecognized grouping type '{0}' (value={1})".format(gtype, gval))
+    (comparison_fn, smin) = _grouping_threshold(grouping)
 
     data = prof["data"]
+    nbins = data.size
+    if np.any(data < 0):
+        ends = _group_ends_loop(data, comparison_fn)
+    else:
+        ends = _group_ends_search(data, comparison_fn, smin)
+
+    start = ends[-1] + 1 if ends else 0
+    if last and start < nbins:
+        ends.append(nbins - 1)
+
+    valid_size = len(ends)
+    if valid_size == 0:
+        raise ValueError("Unable to find any radial profile data within the min/max limits after grouping.")
+
+    ends = np.asarray(ends)
+    starts = np.concatenate(([0], ends[:-1] + 1))
 
     out = {}
     for k in prof:
-        out[k] = np.zeros_like(prof[k])
+        out[k] = np.zeros(valid_size, dtype=prof[k].dtype)
 
     sum_names = ["data", "area"]
     if "model" in out:
         sum_names.extend(["model", "resid"])
 
-    group_idx = 0
-    for i in range(data.size):
+    nused = ends[-1] + 1
+    for n in sum_names:
+        out[n] = np.add.reduceat(prof[n][:nused], starts)
 
-        ingrp = True
-        for n in sum_names:
-            out[n][group_idx] += prof[n][i]
-        out["rhi"][group_idx] = prof["rhi"][i]
+    out["rlo"] = prof["rlo"][starts]
+    out["rhi"] = prof["rhi"][ends]
 
-        if comparison_fn(out["data"][group_idx]):
-            ingrp = False
-            group_idx += 1
-            if i < (data.size - 1):
-                out["rlo"][group_idx] = prof["rlo"][i + 1]
+    return out
 
-    if last and ingrp:
-        valid_size = group_idx + 1
-    else:
-        valid_size = group_idx
 
-    if valid_size == 0:
-        raise ValueError("Unable to find any radial profile data within the min/max limits after grouping.")
+def _bin_indexes(dr2, rlo2, rhi2):
+    """Return the bin number for each pixel, or -1 if it lies outside
+    all the bins.
 
-    for k in out:
-        out[k] = np.resize(out[k], valid_size)
+    A pixel is in bin i if rlo2[i] <= dr2 < rhi2[i]. The bins must be
+    contiguous - that is rhi2[i] = rlo2[i + 1] - and increasing, as
+    created by _calc_bin_edges. If they are not then None is returned.
+    """
+
+    if np.any(rhi2[:-1] != rlo2[1:]) or np.any(rlo2 >= rhi2):
+        return None
+
+    nbins = rlo2.size
+    edges = np.append(rlo2, rhi2[-1])
+    idx = np.searchsorted(edges, dr2, side="right") - 1
+    idx[idx >= nbins] = -1
+    return idx
 
-    return out
+
+def _sum_annuli(dr2, rlo2, rhi2, values):
+    """Sum up the values in each annulus, along with the number of
+    pixels, by looping through each annulus.
+
+    This is used when the bins are not contiguous.
+    """
+
+    nbins = rlo2.size
+    npix = np.zeros(nbins, dtype=int)
+    sums = [np.zeros(nbins) for v in values]
+    for i in range(nbins):
+        idx, = np.where((dr2 >= rlo2[i]) & (dr2 < rhi2[i]))
+        npix[i] = idx.size
+        for (s, v) in zip(sums, values):
+            s[i] = np.sum(v[idx])
+
+    return (npix, sums)
 
 
 def _calc_radial_profile(data, model, dr2, bins_lo, bins_hi, pixarea,
@@ -618,14 +726,9 @@ def _calc_radial_profile(data, model, dr2, bins_lo, bins_hi, pixarea,
     # good_idx = data.mask
     good_idx = data.mask & np.isfinite(data.y)
 
-    if model is None:
-        dr2 = dr2[good_idx]
-        zdata = zdata[good_idx]
-
-    else:
-
-        dr2 = dr2[good_idx]
-        zdata = zdata[good_idx]
+    dr2 = dr2[good_idx]
+    zdata = zdata[good_idx]
+    if model is not None:
         zmodel = (model.y * 1.0).flatten()[good_idx]
 
     good_idx = None
@@ -633,34 +736,30 @@ def _calc_radial_profile(data, model, dr2, bins_lo, bins_hi, pixarea,
     rlo2 = bins_lo * bins_lo
     rhi2 = bins_hi * bins_hi
 
-    nbins = bins_lo.size
-    hist_data = np.zeros(nbins)
-    hist_area = np.zeros(nbins)
-    flag = np.zeros(nbins, dtype=bool)
-    if model is not None:
-        hist_model = np.zeros(nbins)
-
-    # Could try argsort on dr2 to sort the array, then
-    # instead of a where(dr2>=lo & dr2<hi) statement
-    # we could loop through the sorted array.
-    # It is not clear that it would be faster, and
-    # it would definitely be more complex.
+    # Find the bin for each pixel and then sum up the values in each
+    # bin, dropping those pixels that are not in a bin.
     #
-    for i in range(0, nbins, 1):
-
-        # Find the pixels that are within this annulus
-        idx, = np.where((dr2 >= rlo2[i]) & (dr2 < rhi2[i]))
-        npix = idx.size
-
-        if npix != 0:
-            zs = np.sum(zdata[idx])
+    values = [zdata]
+    if model is not None:
+        values.append(zmodel)
 
-            hist_data[i] = zs * 1.0
-            hist_area[i] = npix * pixarea
-            flag[i] = True
+    nbins = bins_lo.size
+    idx = _bin_indexes(dr2, rlo2, rhi2)
+    if idx is None:
+        (npix, sums) = _sum_annuli(dr2, rlo2, rhi2, values)
 
-            if model is not None:
-                hist_model[i] = np.sum(zmodel[idx]) * 1.0
+    else:
+        keep = idx >= 0
+        idx = idx[keep]
+        npix = np.bincount(idx, minlength=nbins)
+        sums = [np.bincount(idx, weights=v[keep], minlength=nbins)
+                for v in values]
+
+    hist_data = sums[0]
+    hist_area = npix * pixarea
+    flag = npix > 0
+    if model is not None:
+        hist_model = sums[1]
 
     # Remove bins for which there are no valid pixels. Note that we do this
     # before grouping (although the order doesn't actually matter to the end
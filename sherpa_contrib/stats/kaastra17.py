@@ -1,5 +1,5 @@
 #
-#  Copyright (C) 2025
+#  Copyright (C) 2025, 2026
 #  Smithsonian Astrophysical Observatory
 #
 #
@@ -48,8 +48,10 @@ compared to `calc_cstat_gof_kaastra17` to see how well the Kaastra
 """
 
 from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
 import logging
+import multiprocessing
 
 import numpy as np
 import numpy.typing as npt
@@ -58,7 +60,8 @@ from sherpa.astro import ui
 from sherpa.data import Data, Data1D
 from sherpa.fit import Fit
 from sherpa.models.model import ArithmeticConstantModel, Model
-from sherpa.stats import Stat, CStat
+from sherpa.stats import Stat, Cash, CStat
+import sherpa.stats
 from sherpa.utils import sao_fcmp, send_to_pager
 from sherpa.utils.random import RandomType, poisson_noise
 from sherpa.utils.types import IdType
@@ -99,12 +102,155 @@ def get_fake_info(data: Data,
     return fake_data, fake_model
 
 
+# The maximum number of elements (iterations times bins) to simulate
+# at once by simulate_model_stats.
+#
+CHUNK_SIZE = 4 * 1024 * 1024
+
+
+def _calc_stats_vector(kind: str,
+                       mu: np.ndarray,
+                       sims: np.ndarray,
+                       trunc_value: float
+                       ) -> np.ndarray:
+    """Calculate the Cash or CStat statistic for each row of sims.
+
+    Parameters
+    ----------
+    kind
+       Either "cash" or "cstat".
+    mu
+       The model values (1D).
+    sims
+       The simulated data, with shape (nsim, mu.size).
+    trunc_value
+       The value used to replace model values <= 0, matching
+       Sherpa.
+
+    Returns
+    -------
+    stats
+       The statistic value for each simulation.
+
+    """
+
+    mvals = np.where(mu > 0, mu, trunc_value)
+    logm = np.log(mvals)
+    if kind == "cash":
+        return 2 * (mvals.sum() - sims @ logm)
+
+    # Bins with no counts contribute the model value.
+    with np.errstate(divide="ignore", invalid="ignore"):
+        terms = sims * (np.log(sims) - logm)
+
+    terms = np.where(sims > 0, terms, 0)
+    return 2 * (mvals.sum() - sims.sum(axis=1) + terms.sum(axis=1))
+
+
+def _get_vector_stat(stat: Stat,
+                     fake_data: Data1D,
+                     fake_model: ArithmeticConstantModel
+                     ) -> str | None:
+    """Can the statistic be calculated by _calc_stats_vector?
+
+    Returns
+    -------
+    kind
+       The kind argument for _calc_stats_vector or None if the
+       statistic is not supported.
+
+    Notes
+    -----
+    The result is checked against the statistic object, using
+    the observed data, in case Sherpa's calculation differs (e.g.
+    the truncation setting).
+
+    """
+
+    if isinstance(stat, CStat):
+        kind = "cstat"
+    elif isinstance(stat, Cash):
+        kind = "cash"
+    else:
+        return None
+
+    mu = np.asarray(fake_model.val, dtype=float)
+    sims = np.asarray(fake_data.y, dtype=float).reshape(1, -1)
+    trunc_value = getattr(sherpa.stats, "truncation_value", 1e-25)
+    try:
+        got = _calc_stats_vector(kind, mu, sims, trunc_value)[0]
+        expected = stat.calc_stat(fake_data, fake_model)[0]
+    except Exception as exc:
+        lgr.debug(f"Unable to use vectorized {stat.name}: {exc}")
+        return None
+
+    if not np.isclose(got, expected, rtol=1e-8, atol=1e-8):
+        lgr.debug(f"Unable to use vectorized {stat.name}: " +
+                  f"expected {expected} but calculated {got}")
+        return None
+
+    return kind
+
+
+def _simulate_poisson_stats(kind: str,
+                            mu: np.ndarray,
+                            niter: int,
+                            trunc_value: float,
+                            rng: RandomType | int | None = None
+                            ) -> np.ndarray:
+    """Create niter Poisson realisations of mu and calculate the statistic.
+
+    The simulations are created in chunks of at most CHUNK_SIZE
+    elements, each with a single call to the RNG. If rng is an
+    integer it is used to seed a new generator (this is used to run
+    the simulations in separate processes).
+
+    """
+
+    if rng is None:
+        rng = np.random
+    elif not isinstance(rng, (np.random.Generator, np.random.RandomState)):
+        rng = np.random.default_rng(rng)
+
+    # Match sherpa.utils.random.poisson_noise, which sets bins with
+    # a model value <= 0 to 0.
+    #
+    good = mu > 0
+    lam = mu[good]
+
+    nrows = max(1, CHUNK_SIZE // max(mu.size, 1))
+    out = np.empty(niter)
+    for lo in range(0, niter, nrows):
+        hi = min(lo + nrows, niter)
+        sims = np.zeros((hi - lo, mu.size))
+        sims[:, good] = rng.poisson(lam, size=(hi - lo, lam.size))
+        out[lo:hi] = _calc_stats_vector(kind, mu, sims, trunc_value)
+
+    return out
+
+
+def _make_seeds(rng: RandomType | None,
+                n: int) -> list[int]:
+    """Create independent seeds for n processes from the RNG."""
+
+    if rng is None:
+        seq = np.random.SeedSequence()
+    elif isinstance(rng, np.random.Generator):
+        seq = np.random.SeedSequence(int(rng.integers(0, 2**63)))
+    else:
+        seq = np.random.SeedSequence(int(rng.randint(0, 2**31 - 1)))
+
+    return [int(s.generate_state(1, dtype=np.uint64)[0])
+            for s in seq.spawn(n)]
+
+
 def simulate_model_stats(data: Data,
                          model: Model,
                          stat: Stat,
                          niter: int,
                          method: Callable | None = None,
-                         rng: RandomType | None = None
+                         rng: RandomType | None = None,
+                         nproc: int | None = 1
                          ) -> np.ndarray:
     """Simulate the data from the model and evaluate the statistic.
 
@@ -130,6 +276,10 @@ def simulate_model_stats(data: Data,
        returns a ndarray of the same size with the simulated data.
     rng
        The RNG (or None) to send to method.
+    nproc
+       The number of processes to use, where None means use all the
+       available processors. This is only used when method is None
+       and the statistic is Cash or CStat.
 
     Returns
     -------
@@ -145,6 +295,13 @@ def simulate_model_stats(data: Data,
     is unlikley to work, thanks to the background handling, but
     it has not been tested.
 
+    When method is None and the statistic is Cash or CStat then the
+    realisations are created as a 2D array, with one call to the
+    RNG per chunk, and the statistic is calculated for all of them
+    at once. When nproc is not 1 the iterations are split between
+    processes, each of which uses its own RNG, seeded from rng. The
+    results therefore depend on nproc.
+
     Should the data be re-grouped? This has large consequences for how
     the code is called but also the interpretation of the results.
 
@@ -153,17 +310,46 @@ def simulate_model_stats(data: Data,
     if niter < 1:
         raise ValueError("niter must be >= 1")
 
-    predictor = poisson_noise if method is None else method
-
     fake_data, fake_model = get_fake_info(data, model)
 
-    out = np.full(niter, np.nan)
-    for idx in range(niter):
-        # Simulate the data based on the model prediction
-        fake_data.y = predictor(fake_model.val, rng=rng)
-        out[idx] = stat.calc_stat(fake_data, fake_model)[0]
+    kind = None
+    if method is None:
+        kind = _get_vector_stat(stat, fake_data, fake_model)
 
-    return out
+    if kind is None:
+        if nproc != 1:
+            lgr.warning("Unable to run the simulations in parallel " +
+                        f"with the {stat.name} statistic or a user method")
+
+        predictor = poisson_noise if method is None else method
+
+        out = np.full(niter, np.nan)
+        for idx in range(niter):
+            # Simulate the data based on the model prediction
+            fake_data.y = predictor(fake_model.val, rng=rng)
+            out[idx] = stat.calc_stat(fake_data, fake_model)[0]
+
+        return out
+
+    mu = np.asarray(fake_model.val, dtype=float)
+    trunc_value = getattr(sherpa.stats, "truncation_value", 1e-25)
+
+    if nproc is None:
+        nproc = multiprocessing.cpu_count()
+
+    nproc = min(nproc, niter)
+    if nproc <= 1:
+        return _simulate_poisson_stats(kind, mu, niter, trunc_value,
+                                       rng=rng)
+
+    counts = [len(c) for c in np.array_split(np.arange(niter), nproc)]
+    seeds = _make_seeds(rng, nproc)
+    ctx = multiprocessing.get_context("fork")
+    with ProcessPoolExecutor(max_workers=nproc, mp_context=ctx) as executor:
+        results = executor.map(_simulate_poisson_stats,
+                               [kind] * nproc, [mu] * nproc, counts,
+                               [trunc_value] * nproc, seeds)
+        return np.concatenate(list(results))
 
 
 def validate_model_stats(f: Fit,
@@ -204,7 +390,8 @@ def simulate_stats(id: IdType | None = None,
                    *otherids: IdType,
                    bkg_only: bool = False,
                    niter: int = 1000,
-                   method: Callable | None = None
+                   method: Callable | None = None,
+                   nproc: int | None = 1
                    ) -> np.ndarray:
     """Simulate data using the current model and calculate the statistic.
 
@@ -229,6 +416,10 @@ def simulate_stats(id: IdType | None = None,
        a callable that takes a ndarray of the predicted values and an
        optional rng argument that takes a NumPy random generator, and
        returns a ndarray of the same size with the simulated data.
+    nproc : int or None, optional
+       The number of processes to use for the simulations, where None
+       means use all the available processors. This is only used
+       when method is None and the statistic is cash or cstat.
 
     Returns
     -------
@@ -249,6 +440,12 @@ def simulate_stats(id: IdType | None = None,
 
     This will not work with the WStat statistic.
 
+    When method is None and the statistic is cash or cstat then all
+    the simulations are created and evaluated at once, rather than
+    one at a time. When nproc is not 1 the simulations are split
+    between processes, each using a random-number generator seeded
+    from the session generator, so the results depend on nproc.
+
     Examples
     --------
 
@@ -309,7 +506,8 @@ def simulate_stats(id: IdType | None = None,
 
     rng = session.get_rng()
     return simulate_model_stats(f.data, f.model, f.stat,
-                                niter=niter, method=method, rng=rng)
+                                niter=niter, method=method, rng=rng,
+                                nproc=nproc)
 
 def process_range(mu: np.ndarray,
                   out: np.ndarray,
@@ -27,6 +27,7 @@ from os import environ
 from random import choice, randint, randrange, shuffle
 from collections import namedtuple
 import pytest
+from numpy.testing import assert_allclose
 
 from sherpa.astro.io import backend
 
@@ -43,7 +44,7 @@ except (ImportError,ModuleNotFoundError) as E:
     astropy_status = False
 
 from sherpa.utils.err import DataErr, IOErr
-from sherpa_contrib.diag_resp import mkdiagresp, build_resp, EGrid
+from sherpa_contrib.diag_resp import mkdiagresp, build_resp, EGrid, set_diagresp
 
 
 
@@ -554,6 +555,69 @@ def test_channel_offset():
 
 
 
+@pytest.mark.filterwarnings("ignore:.*was 0 and has been replaced by*:UserWarning")
+def test_build_resp_cached():
+    """
+    Test that the responses are re-used for the same grid, and that each call returns separate copies
+    """
+
+    elo,ehi,_ = EGrid("Chandra","ACIS",None,None,None,"PI").get_acis_egrid()
+
+    rmf1,arf1 = build_resp(elo, ehi, offset=1)
+    specresp = arf1.specresp.copy()
+    matrix = rmf1.matrix.copy()
+
+    ### changing the arrays in place must not change the cached responses
+    arf1.specresp *= 0.5
+    rmf1.matrix *= 0.5
+
+    rmf2,arf2 = build_resp(elo.copy(), ehi.copy(), offset=1)
+    rmf3,_ = build_resp(elo, ehi, offset=2)
+
+    assert rmf1 is not rmf2, "Each call should return a separate RMF object."
+    assert arf1 is not arf2, "Each call should return a separate ARF object."
+    assert_allclose(arf2.specresp, specresp, err_msg="The cached ARF data should not be changed.")
+    assert_allclose(rmf2.matrix, matrix, err_msg="The cached RMF data should not be changed.")
+    assert min(rmf3.f_chan) == 2, "A different channel offset should create a new RMF."
+
+
+
+@pytest.mark.filterwarnings("ignore:.*was 0 and has been replaced by*:UserWarning")
+def test_set_diagresp():
+    """
+    Test that the same responses can be set for several datasets
+    """
+
+    from sherpa.astro.ui import dataspace1d, get_rmf, get_arf, get_filter, ignore_id, delete_data, DataPHA as uiDataPHA
+
+    dataids = [_get_random_string(strlen=16) for _ in range(3)]
+    for dataid in dataids:
+        dataspace1d(1, 1024, id=dataid, dstype=uiDataPHA)
+
+    try:
+        rmf,arf = set_diagresp(dataids)
+
+        for dataid in dataids:
+            assert_allclose(get_rmf(dataid).matrix, rmf.matrix, err_msg="The datasets should use the same RMF.")
+            assert_allclose(get_arf(dataid).specresp, arf.specresp, err_msg="The datasets should use the same ARF.")
+
+        assert get_rmf(dataids[0]) is not get_rmf(dataids[1]), "Each dataset should have its own RMF object."
+        assert get_arf(dataids[0]).specresp is not get_arf(dataids[1]).specresp, "Each dataset should have its own ARF data."
+
+        ### filtering one dataset must not change the others
+        orig = get_filter(dataids[1])
+        ignore_id(dataids[0], 0.5, 2.0)
+
+        assert get_filter(dataids[0]) != orig, "The filter should have been changed."
+        assert get_filter(dataids[1]) == orig, "The filter of the other datasets should not change."
+        assert get_filter(dataids[2]) == orig, "The filter of the other datasets should not change."
+
+    finally:
+        for dataid in dataids:
+            delete_data(dataid)
+
+
+
 @pytest.mark.filterwarnings("ignore:.*was 0 and has been replaced by*:UserWarning")
 def test_reference_spec_file():
     """
@@ -0,0 +1,99 @@
+#
+#  Copyright (C) 2026
+#            Smithsonian Astrophysical Observatory
+#
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301 USA.
+#
+
+"""
+Test the simulation code in sherpa_contrib.stats.kaastra17
+"""
+
+import numpy as np
+
+import pytest
+
+from sherpa.data import Data1D
+from sherpa.models.basic import Polynom1D
+from sherpa.models.model import ArithmeticConstantModel
+from sherpa.stats import Cash, CStat
+import sherpa.stats
+from sherpa.utils.random import poisson_noise
+
+from sherpa_contrib.stats import kaastra17
+
+
+def make_data():
+    """A dataset whose model is 0 in the first bin."""
+
+    x = np.arange(20)
+    mdl = Polynom1D()
+    mdl.c0 = 0
+    mdl.c1 = 0.5
+    y = poisson_noise(mdl(x), rng=np.random.default_rng(3843))
+    return Data1D("tst", x, y), mdl
+
+
+@pytest.mark.parametrize("stat,kind", [(Cash(), "cash"), (CStat(), "cstat")])
+def test_calc_stats_vector(stat, kind):
+
+    rng = np.random.default_rng(273)
+    mu = rng.uniform(0, 5, size=30)
+    mu[[0, 7, 12]] = 0
+    sims = rng.poisson(3, size=(10, mu.size)).astype(float)
+    sims[:, 5] = 0
+    sims[2, 7] = 4
+
+    trunc_value = sherpa.stats.truncation_value
+    got = kaastra17._calc_stats_vector(kind, mu, sims, trunc_value)
+
+    mdl = ArithmeticConstantModel(mu)
+    expected = [stat.calc_stat(Data1D("x", np.arange(mu.size), sim), mdl)[0]
+                for sim in sims]
+    assert got == pytest.approx(expected)
+
+
+@pytest.mark.parametrize("stat", [Cash(), CStat()])
+def test_simulate_model_stats_matches_loop(stat):
+    """nproc=1 should draw the same values as the per-iteration loop"""
+
+    data, mdl = make_data()
+    got = kaastra17.simulate_model_stats(data, mdl, stat, 50,
+                                         rng=np.random.default_rng(98),
+                                         nproc=1)
+
+    # Setting method forces the loop to be used
+    expected = kaastra17.simulate_model_stats(data, mdl, stat, 50,
+                                              method=poisson_noise,
+                                              rng=np.random.default_rng(98))
+    assert got == pytest.approx(expected)
+
+
+def test_simulate_model_stats_nproc():
+    """The results are repeatable when the seed is set"""
+
+    data, mdl = make_data()
+    stat = CStat()
+    got1 = kaastra17.simulate_model_stats(data, mdl, stat, 51,
+                                          rng=np.random.default_rng(12),
+                                          nproc=2)
+    got2 = kaastra17.simulate_model_stats(data, mdl, stat, 51,
+                                          rng=np.random.default_rng(12),
+                                          nproc=2)
+    assert got1.shape == (51,)
+    assert np.all(np.isfinite(got1))
+    assert got1 == pytest.approx(got2)
@@ -0,0 +1,197 @@
+#
+#  Copyright (C) 2026
+#            Smithsonian Astrophysical Observatory
+#
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301 USA.
+#
+
+"""
+Test the response cache in sherpa_contrib.load_hetg_resp
+"""
+
+import os
+
+import numpy as np
+from numpy.testing import assert_allclose
+
+import pytest
+
+from sherpa.astro.instrument import create_arf, create_delta_rmf
+from sherpa.astro.io import write_arf, write_rmf
+
+from sherpa_contrib import load_hetg_resp
+
+
+EGRID = np.linspace(0.5, 2.0, 11)
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    load_hetg_resp.clear_response_cache()
+    yield
+    load_hetg_resp.clear_response_cache()
+
+
+def make_arf(path, scale=1.0):
+    specresp = scale * np.linspace(10, 20, EGRID.size - 1)
+    arf = create_arf(EGRID[:-1], EGRID[1:], specresp)
+    write_arf(str(path), arf, ascii=False, clobber=True)
+    return str(path), specresp
+
+
+def make_rmf(path):
+    rmf = create_delta_rmf(EGRID[:-1], EGRID[1:],
+                           e_min=EGRID[:-1], e_max=EGRID[1:])
+    write_rmf(str(path), rmf, clobber=True)
+    return str(path)
+
+
+def bump_mtime(filename):
+    """Make sure the modification time changes."""
+
+    st = os.stat(filename)
+    os.utime(filename, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+
+
+def test_read_responses_invalid_type():
+    with pytest.raises(ValueError):
+        load_hetg_resp.read_responses(["x.fits"], "pha")
+
+
+def test_read_responses_cache(tmp_path, capsys):
+
+    (arf1, resp1) = make_arf(tmp_path / "a1.arf")
+    (arf2, resp2) = make_arf(tmp_path / "a2.arf", scale=2)
+
+    got = load_hetg_resp.read_responses([arf1, arf2, arf1], "arf",
+                                        verbose=True)
+    assert len(got) == 3
+    assert_allclose(got[0].specresp, resp1)
+    assert_allclose(got[1].specresp, resp2)
+    assert_allclose(got[2].specresp, resp1)
+
+    out = capsys.readouterr().out
+    assert "re-used" not in out
+    assert out.count("read in") == 2
+
+    # Each element is a separate copy
+    assert got[0] is not got[2]
+    got[0].specresp *= 0
+    assert_allclose(got[2].specresp, resp1)
+
+    again = load_hetg_resp.read_responses([arf2, arf1], "arf", verbose=True)
+    assert_allclose(again[0].specresp, resp2)
+    assert_allclose(again[1].specresp, resp1)
+
+    out = capsys.readouterr().out
+    assert out.count("re-used") == 2
+    assert "read in" not in out
+
+
+def test_read_responses_types_are_separate(tmp_path, capsys):
+
+    (arf, _) = make_arf(tmp_path / "a.arf")
+    rmf = make_rmf(tmp_path / "a.rmf")
+
+    load_hetg_resp.read_responses([arf], "arf")
+    got = load_hetg_resp.read_responses([rmf], "rmf", verbose=True)
+    assert_allclose(got[0].e_min, EGRID[:-1])
+    assert "read in" in capsys.readouterr().out
+
+    got = load_hetg_resp.read_responses([rmf], "rmf", verbose=True)
+    assert_allclose(got[0].e_min, EGRID[:-1])
+    assert "re-used" in capsys.readouterr().out
+
+
+@pytest.mark.parametrize("scale", [1.0, 3.0])
+def test_read_responses_file_changed(scale, tmp_path, capsys):
+    """The file is re-read when its size or modification time changes"""
+
+    (arf, _) = make_arf(tmp_path / "a.arf")
+    load_hetg_resp.read_responses([arf], "arf")
+
+    (arf, resp) = make_arf(tmp_path / "a.arf", scale=scale)
+    bump_mtime(arf)
+    capsys.readouterr()
+
+    got = load_hetg_resp.read_responses([arf], "arf", verbose=True)
+    assert_allclose(got[0].specresp, resp)
+    out = capsys.readouterr().out
+    assert "read in" in out
+    assert "re-used" not in out
+
+
+def test_clear_response_cache(tmp_path, capsys):
+
+    (arf, resp) = make_arf(tmp_path / "a.arf")
+    load_hetg_resp.read_responses([arf], "arf")
+    capsys.readouterr()
+
+    load_hetg_resp.clear_response_cache()
+
+    got = load_hetg_resp.read_responses([arf], "arf", verbose=True)
+    assert_allclose(got[0].specresp, resp)
+    out = capsys.readouterr().out
+    assert "read in" in out
+    assert "re-used" not in out
+
+
+def test_get_resp_nbytes(tmp_path):
+
+    (arf, _) = make_arf(tmp_path / "a.arf")
+    got = load_hetg_resp.read_responses([arf], "arf")[0]
+
+    # The specresp, energ_lo, and energ_hi arrays are included
+    nbytes = load_hetg_resp._get_resp_nbytes(got)
+    assert nbytes >= 3 * (EGRID.size - 1) * 8
+
+
+def test_read_responses_cache_size(tmp_path, capsys, monkeypatch):
+    """The least-recently used responses are removed"""
+
+    arfs = [make_arf(tmp_path / f"a{i}.arf", scale=i + 1)[0]
+            for i in range(3)]
+    got = load_hetg_resp.read_responses(arfs[:1], "arf")[0]
+    nbytes = load_hetg_resp._get_resp_nbytes(got)
+    load_hetg_resp.clear_response_cache()
+
+    monkeypatch.setattr(load_hetg_resp, "_RESP_CACHE_BYTES",
+                        int(2.5 * nbytes))
+
+    load_hetg_resp.read_responses(arfs[:2], "arf")
+    load_hetg_resp.read_responses(arfs[:1], "arf")
+    load_hetg_resp.read_responses(arfs[2:], "arf")
+    assert len(load_hetg_resp._resp_cache) == 2
+    capsys.readouterr()
+
+    # a1 was the least-recently used so has been removed
+    load_hetg_resp.read_responses(arfs, "arf", verbose=True)
+    out = capsys.readouterr().out
+    assert "a0.arf -- re-used" in out
+    assert "a1.arf -- read in" in out
+    assert "a2.arf -- re-used" in out
+    assert len(load_hetg_resp._resp_cache) == 2
+
+
+def test_read_responses_too_large(tmp_path, capsys, monkeypatch):
+    """A response larger than the cache is not stored"""
+
+    monkeypatch.setattr(load_hetg_resp, "_RESP_CACHE_BYTES", 10)
+
+    (arf, _) = make_arf(tmp_path / "a.arf")
+    load_hetg_resp.read_responses([arf], "arf")
+    assert len(load_hetg_resp._resp_cache) == 0
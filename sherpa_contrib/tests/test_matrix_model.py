@@ -0,0 +1,95 @@
+#
+#  Copyright (C) 2026
+#            Smithsonian Astrophysical Observatory
+#
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301 USA.
+#
+
+"""
+Test sherpa_contrib.matrix_model
+"""
+
+import numpy as np
+
+import pytest
+
+from sherpa.astro import ui
+from sherpa.utils.err import PSFErr
+
+from sherpa_contrib.matrix_model import MatrixModel
+
+
+@pytest.fixture
+def reset():
+    """Run the test with a clean environment"""
+    ui.clean()
+    yield
+    ui.clean()
+
+
+def make_matrix(nbins):
+    """A banded matrix, so most elements are 0"""
+
+    matrix = np.zeros((nbins, nbins))
+    for i in range(nbins):
+        lo = max(0, i - 2)
+        hi = min(nbins, i + 3)
+        matrix[i, lo:hi] = np.arange(1, hi - lo + 1)
+
+    return matrix
+
+
+@pytest.mark.parametrize("sparse", [False, True])
+def test_matrix_model_filter(sparse, reset):
+    """The filtered model matches the noticed rows of the full model"""
+
+    if sparse:
+        pytest.importorskip("scipy")
+
+    xx = np.arange(1, 21) + 0.5
+    yy = np.ones_like(xx)
+    matrix = make_matrix(len(xx))
+    ui.load_arrays(1, xx, yy, ui.Data1D)
+
+    mdl = MatrixModel(matrix, xx, name="mm", sparse=sparse)
+    poly = ui.polynom1d("poly")
+    poly.c1 = 2
+    ui.set_source(mdl(poly))
+
+    expected = matrix @ (poly.c0.val + 2 * xx)
+    assert ui.get_model_plot().y == pytest.approx(expected)
+
+    # Check the filter twice, to check the cached indices
+    for _ in range(2):
+        ui.notice(5, 12)
+        ans = ui.get_fit_plot().modelplot.y
+        assert ans == pytest.approx(expected[4:11])
+
+    ui.notice()
+    ui.ignore(5, 12)
+    ans = ui.get_fit_plot().modelplot.y
+    assert ans == pytest.approx(np.concatenate((expected[:4],
+                                                expected[11:])))
+
+
+def test_matrix_model_grid_mismatch(reset):
+
+    xx = np.arange(1, 6) + 0.5
+    mdl = MatrixModel(np.identity(len(xx)), xx)
+    cpt = ui.const1d("cpt")
+    with pytest.raises(PSFErr):
+        mdl(cpt)(xx + 1)
@@ -0,0 +1,94 @@
+#
+#  Copyright (C) 2026
+#            Smithsonian Astrophysical Observatory
+#
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301 USA.
+#
+
+"""
+Test the binning code in sherpa_contrib.profiles.calculate
+"""
+
+import numpy as np
+
+import pytest
+
+from sherpa_contrib.profiles import calculate
+
+
+def test_bin_indexes_edges():
+    """Lower edges are included, upper edges are not"""
+
+    rlo2 = np.asarray([1.0, 4.0, 9.0])
+    rhi2 = np.asarray([4.0, 9.0, 16.0])
+    dr2 = np.asarray([0.5, 1.0, 3.9, 4.0, 9.0, 15.9, 16.0, 20.0])
+    idx = calculate._bin_indexes(dr2, rlo2, rhi2)
+    assert idx == pytest.approx([-1, 0, 0, 1, 2, 2, -1, -1])
+
+
+def test_bin_indexes_not_contiguous():
+    rlo2 = np.asarray([1.0, 5.0])
+    rhi2 = np.asarray([4.0, 9.0])
+    assert calculate._bin_indexes(np.asarray([2.0]), rlo2, rhi2) is None
+
+
+def make_profile(data):
+    nbins = len(data)
+    return {"data": np.asarray(data, dtype=float),
+            "area": np.ones(nbins),
+            "rlo": np.arange(nbins) + 1.0,
+            "rhi": np.arange(nbins) + 2.0}
+
+
+@pytest.mark.parametrize("last,ngrp", [(False, 2), (True, 3)])
+def test_group_counts(last, ngrp):
+
+    prof = make_profile([1, 4, 0, 2, 3, 1, 2])
+    out = calculate._apply_grouping(prof, ("counts", 5), last=last)
+
+    assert out["data"] == pytest.approx([5, 5, 3][:ngrp])
+    assert out["area"] == pytest.approx([2, 3, 2][:ngrp])
+    assert out["rlo"] == pytest.approx([1, 3, 6][:ngrp])
+    assert out["rhi"] == pytest.approx([3, 6, 8][:ngrp])
+
+
+def test_group_snr():
+    """The group sums must have s / (1 + sqrt(s + 0.75)) >= 2"""
+
+    # The smallest count that meets the criterion is 8.
+    prof = make_profile([3, 4, 1, 8, 0, 2, 7, 10])
+    out = calculate._apply_grouping(prof, ("snr", 2))
+    assert out["data"] == pytest.approx([8, 8, 9, 10])
+    assert out["rlo"] == pytest.approx([1, 4, 5, 8])
+
+
+def test_group_no_match():
+    prof = make_profile([1, 1])
+    with pytest.raises(ValueError):
+        calculate._apply_grouping(prof, ("counts", 5))
+
+
+@pytest.mark.parametrize("last,expected",
+                         [(False, [3, 3]), (True, [3, 3, 0])])
+def test_group_negative_values(last, expected):
+    """Bins can be negative, e.g. for background-subtracted data"""
+
+    prof = make_profile([3, -2, 4, 1, 0])
+    out = calculate._apply_grouping(prof, ("counts", 3), last=last)
+    assert out["data"] == pytest.approx(expected)
+    assert out["rlo"] == pytest.approx([1, 2, 5][:len(expected)])
+    assert out["rhi"] == pytest.approx([2, 5, 6][:len(expected)])
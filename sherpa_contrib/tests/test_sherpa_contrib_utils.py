@@ -1,5 +1,5 @@
 #
-#  Copyright (C) 2021
+#  Copyright (C) 2021, 2026
 #            Smithsonian Astrophysical Observatory
 #
 #
@@ -33,7 +33,8 @@ from sherpa.astro import instrument
 from sherpa.astro import ui
 from sherpa.utils.err import ArgumentErr, ParameterErr
 
-from sherpa_contrib.utils import renorm
+from sherpa_contrib.utils import renorm, estimate_weighted_expmap, \
+    estimate_weighted_expmaps, get_instmap_weights
 
 
 @pytest.fixture
@@ -280,3 +281,64 @@ def test_renorm_specify_cpt(model, omodel, reset, setup_src):
     assert omdl.pars[-1].val == pytest.approx(1)
     assert omdl.pars[-1].min == pytest.approx(0)
     assert omdl.pars[-1].max >= 1e24
+
+
+@pytest.fixture
+def setup_grid():
+    """Create a grid with a power-law model"""
+
+    ui.dataspace1d(0.5, 7.0, 0.1)
+    pl = ui.create_model_component('powlaw1d', 'pl')
+    ui.set_source(pl)
+    pl.gamma = 1.7
+    return pl
+
+
+def make_arf(scale):
+    egrid = np.arange(0.3, 8.0, 0.13)
+    elo = egrid[:-1]
+    ehi = egrid[1:]
+    return (elo, ehi, scale * 0.5 * (elo + ehi))
+
+
+def test_estimate_weighted_expmap_pvals(reset, setup_grid):
+    """The batched evaluation matches a separate call per value"""
+
+    pl = setup_grid
+
+    arf = make_arf(100)
+    gvals = [1.2, 1.7, 2.5]
+    evals = estimate_weighted_expmap(elo=arf[0], ehi=arf[1],
+                                     specresp=arf[2],
+                                     par=pl.gamma, pvals=gvals)
+
+    expected = []
+    for gval in gvals:
+        pl.gamma = gval
+        expected.append(estimate_weighted_expmap(elo=arf[0], ehi=arf[1],
+                                                 specresp=arf[2]))
+
+    assert evals == pytest.approx(expected)
+
+
+def test_estimate_weighted_expmaps(reset, setup_grid):
+    """Several weights and ARFs"""
+
+    pl = setup_grid
+
+    gvals = [1.2, 2.5]
+    wgts = get_instmap_weights(par=pl.gamma, pvals=gvals)
+    assert len(wgts) == 2
+    assert pl.gamma.val == pytest.approx(1.7)
+
+    arfs = [make_arf(100), make_arf(200), make_arf(50)]
+    evals = estimate_weighted_expmaps(wgts, arfs)
+    assert evals.shape == (2, 3)
+
+    for (i, wgt) in enumerate(wgts):
+        for (j, arf) in enumerate(arfs):
+            assert evals[i, j] == pytest.approx(wgt.estimate_expmap(*arf))
+
+    # The ARFs only differ by a scale factor
+    assert evals[:, 1] == pytest.approx(2 * evals[:, 0])
+    assert evals[:, 2] == pytest.approx(0.5 * evals[:, 0])
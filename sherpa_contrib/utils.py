@@ -1,5 +1,5 @@
 #
-#  Copyright (C) 2009, 2010, 2011, 2012, 2014, 2015, 2016, 2019, 2021
+#  Copyright (C) 2009, 2010, 2011, 2012, 2014, 2015, 2016, 2019, 2021, 2026
 #            Smithsonian Astrophysical Observatory
 #
 #
@@ -36,6 +36,7 @@ weights file used by mkinstmap when making a weighted instrument map::
     save_instmap_weights()
     plot_instmap_weights()
     estimate_weighted_expmap()
+    estimate_weighted_expmaps()
 
 See the `Calculating Spectral Weights
 <https://cxc.harvard.edu/ciao/threads/spectral_weights/>`_ thread
@@ -43,9 +44,12 @@ for more information.
 
 """
 
+import collections
+import copy
 import os
 
 import logging
+import threading
 import time
 
 import numpy as np
@@ -66,6 +70,7 @@ import pycrates
 
 __all__ = ["renorm", "get_instmap_weights", "save_instmap_weights",
            "plot_instmap_weights", "estimate_weighted_expmap",
+           "estimate_weighted_expmaps",
            "InstMapWeights", "InstMapWeights1DInt",
            "InstMapWeightsPHA"
            ]
@@ -84,6 +89,105 @@ def _is_boolean(val):
     return isinstance(val, (bool, np.bool_))
 
 
+def _read_arf(*args):
+    """Return the energ_lo, energ_hi, and specresp columns of an ARF.
+
+    The arguments are either a TABLECrate or the name of an ARF
+    file, or the three arrays.
+    """
+
+    if len(args) == 3:
+        (elo, ehi, specresp) = args
+        if len(elo) == 1 or len(ehi) == 1 or len(specresp) == 1:
+            emsg = "Expected three arrays of the same " + \
+                "length, with more than one element in"
+            raise TypeError(emsg)
+        if len(elo) != len(ehi) or len(elo) != len(specresp):
+            emsg = "Expected three arrays of the same length"
+            raise ValueError(emsg)
+
+        return (np.asarray(elo), np.asarray(ehi), np.asarray(specresp))
+
+    if isinstance(args[0], pycrates.TABLECrate):
+        cr = args[0]
+    else:
+        cr = pycrates.TABLECrate(args[0], mode="r")
+
+    try:
+        elo = cr.get_column("ENERG_LO").values.copy()
+        ehi = cr.get_column("ENERG_HI").values.copy()
+        specresp = cr.get_column("SPECRESP").values.copy()
+    except ValueError as e:
+        fname = cr.get_filename()
+        raise ValueError(f"Crate {fname} - {e}") from None
+
+    return (elo, ehi, specresp)
+
+
+# The interpolation indices depend only on the two grids, so they
+# are re-used when several ARFs - or the same ARF with several sets
+# of weights - are evaluated on the same grid.
+#
+_INTERP_CACHE_SIZE = 16
+_interp_cache = collections.OrderedDict()
+_interp_lock = threading.Lock()
+
+
+def _get_interp_indices(xout, xin):
+    """Return the indices and fractional offsets used to linearly
+    interpolate from xin to xout.
+
+    This matches sherpa.utils.linear_interp, which extrapolates
+    using the first or last pair of points. None is returned if
+    the offsets can not be calculated (e.g. xin contains repeated
+    values).
+    """
+
+    key = (xout.dtype.str, xout.tobytes(), xin.dtype.str, xin.tobytes())
+    with _interp_lock:
+        try:
+            out = _interp_cache.pop(key)
+            _interp_cache[key] = out
+            return out
+        except KeyError:
+            pass
+
+    i1 = np.searchsorted(xin, xout)
+    i1 = np.clip(i1, 1, len(xin) - 1)
+    x0 = xin[i1 - 1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        frac = (xout - x0) / (xin[i1] - x0)
+
+    out = (i1, frac) if np.all(np.isfinite(frac)) else None
+    with _interp_lock:
+        while len(_interp_cache) >= _INTERP_CACHE_SIZE:
+            _interp_cache.popitem(last=False)
+
+        _interp_cache[key] = out
+
+    return out
+
+
+def _interpolate(xout, xin, yin):
+    """Linearly interpolate yin onto xout, re-using the indices
+    from previous calls with the same grids."""
+
+    xout = np.asarray(xout)
+    xin = np.asarray(xin)
+    yin = np.asarray(yin)
+    idx = _get_interp_indices(xout, xin)
+    if idx is None:
+        return su.interpolate(xout, xin, yin)
+
+    (i1, frac) = idx
+    y0 = yin[i1 - 1]
+    val = frac * (yin[i1] - y0) + y0
+    if np.isnan(val).any():
+        return su.interpolate(xout, xin, yin)
+
+    return val
+
+
 class InstMapWeights:
     """Store the weights information needed by mkinstmap.
 
@@ -149,6 +253,17 @@ class InstMapWeights:
         #
         mdl = ui.get_source(id)
         self.modelexpr = mdl.name
+        self.weight = self._calc_weight(mdl)
+
+        # Conversion to a single datatype is a bit excessive here.
+        #
+        dtype = self.weight.dtype
+        self.xlo = self.xlo.astype(dtype)
+        self.xhi = self.xhi.astype(dtype)
+        self.xmid = self.xmid.astype(dtype)
+
+    def _calc_weight(self, mdl):
+        "Evaluate the model on the grid and return the weights"
 
         # We do not use xlo/xhi but the _xlo/_xhi attributes which
         # contain an extra bin, in case of X-Spec models
@@ -163,21 +278,13 @@ class InstMapWeights:
                 "evaluates to 0!"
             raise RuntimeError(emsg)
 
-        # Conversion to a single datatype is a bit excessive here.
-        #
-        dtype = src.dtype
-
         if self.fluxtype == "erg":
             norm = charge_e * np.sum(src * self.xmid)
         else:
             norm = np.sum(src)
 
-        self.weight = src / norm
-
-        self.weight = self.weight.astype(dtype)
-        self.xlo = self.xlo.astype(dtype)
-        self.xhi = self.xhi.astype(dtype)
-        self.xmid = self.xmid.astype(dtype)
+        weight = src / norm
+        return weight.astype(src.dtype)
 
     def _calc_bins(self, data):
         "Calculate the bin edges"
@@ -394,51 +501,31 @@ class InstMapWeights:
         """
 
         nargs = len(args)
-        if nargs == 3:
-            elo = args[0]
-            ehi = args[1]
-            specresp = args[2]
-
-            if len(elo) == 1 or len(ehi) == 1 or len(specresp) == 1:
-                emsg = "Expected three arrays of the same " + \
-                    "length, with more than one element in"
-                raise TypeError(emsg)
-            if len(elo) != len(ehi) or len(elo) != len(specresp):
-                emsg = "Expected three arrays of the same length"
-                raise ValueError(emsg)
-
-        elif nargs != 1:
+        if nargs != 1 and nargs != 3:
             emsg = "_estimate_expmap() takes 2 or 4 arguments " + \
                 f"({nargs + 1} given)"
             raise TypeError(emsg)
 
-        else:
-            if isinstance(args[0], pycrates.TABLECrate):
-                cr = args[0]
-            else:
-                cr = pycrates.TABLECrate(args[0], mode="r")
-
-            try:
-                elo = cr.get_column("ENERG_LO").values.copy()
-                ehi = cr.get_column("ENERG_HI").values.copy()
-                specresp = cr.get_column("SPECRESP").values.copy()
-            except ValueError as e:
-                fname = cr.get_filename()
-                raise ValueError(f"Crate {fname} - {e}") from None
-
-        # Interpolate using the mid-point of the ARF
-        # onto the mid-point of the grid if necessary.
-        #
+        arf = self._interpolate_arf(*_read_arf(*args))
+        return np.sum(self.weight * arf)
+
+    def _interpolate_arf(self, elo, ehi, specresp):
+        """Interpolate the ARF onto the grid of the dataset.
+
+        The mid-point of each ARF bin is linearly interpolated onto
+        the mid-point of the grid, if necessary, and negative values
+        are replaced by 0.
+        """
+
         emid = 0.5 * (elo + ehi)
         if emid.shape == self.xmid.shape and \
                 np.all(emid == self.xmid):
-            arf = specresp
-        else:
-            arf = su.interpolate(self.xmid, emid, specresp)
-            arf = np.asarray(arf, dtype=self.weight.dtype)
-            arf[arf < 0] = 0.0
+            return specresp
 
-        return np.sum(self.weight * arf)
+        arf = _interpolate(self.xmid, emid, specresp)
+        arf = np.asarray(arf, dtype=self.weight.dtype)
+        arf[arf < 0] = 0.0
+        return arf
 
     def estimate_expmap(self, *args):
         """Estimate the exposure map given an ARF.
@@ -563,7 +650,8 @@ class InstMapWeightsPHA(InstMapWeights):
             return self._estimate_expmap(*args)
 
 
-def get_instmap_weights(id=None, fluxtype="photon"):
+def get_instmap_weights(id=None, fluxtype="photon", par=None,
+                        pvals=None):
     """Returns the weights information for use by mkinstmap.
 
     Parameters
@@ -574,16 +662,24 @@ def get_instmap_weights(id=None, fluxtype="photon"):
     fluxtype : 'photon' or 'erg'
         The units of the instrument map are
         cm^2 count / ``fluxtype``.
+    par : Sherpa parameter object or None
+        If given, the weights are calculated for each of the
+        values in pvals (which must be set).
+    pvals : array of numbers or None
+        The values of par to use. The parameter value is reset to
+        its original value when the routine exits.
 
     Return
     ------
     weights
-        A weights object. When ``fluxtype="photon"`` the
+        A weights object, or a list of them - one for each element
+        of pvals - when par is set. When ``fluxtype="photon"`` the
         weights will sum to 1.
 
     See Also
     --------
     estimate_weighted_expmap
+    estimate_weighted_expmaps
     plot_instmap_weights
     save_instmap_weights
 
@@ -605,20 +701,69 @@ def get_instmap_weights(id=None, fluxtype="photon"):
     if id is None:
         id = ui.get_default_id()
 
+    _validate_par(id, par, pvals)
+
     # Since sherpa.astro.data.DataPHA is a subclass of
     # sherpa.data.Data1DInt we need to check for it first.
     #
     d = ui.get_data(id)
     if isinstance(d, DataPHA):
-        return InstMapWeightsPHA(id, fluxtype=fluxtype)
+        wgts = InstMapWeightsPHA(id, fluxtype=fluxtype)
     elif isinstance(d, Data1DInt):
-        return InstMapWeights1DInt(id, fluxtype=fluxtype)
+        wgts = InstMapWeights1DInt(id, fluxtype=fluxtype)
     else:
         emsg = "Unable to calculate weights from a dataset " + \
             "of type {0}.{1}".format(d.__class__.__module__,
                                      d.__class__.__name__)
         raise RuntimeError(emsg)
 
+    if par is None:
+        return wgts
+
+    # The grid does not change, so only the model needs to be
+    # evaluated for each parameter value.
+    #
+    mdl = ui.get_source(id)
+    orig = par.val
+    out = []
+    try:
+        for pval in pvals:
+            par.val = pval
+            wgt = copy.copy(wgts)
+            wgt.weight = wgt._calc_weight(mdl)
+            out.append(wgt)
+
+    finally:
+        par.val = orig
+
+    return out
+
+
+def _validate_par(id, par, pvals):
+    "Check the par and pvals arguments."
+
+    if par is None and pvals is None:
+        return
+
+    if par is None or pvals is None:
+        emsg = "Either both par and pvals are set or they " + \
+            "are both None."
+        raise TypeError(emsg)
+
+    if not isinstance(par, Parameter):
+        emsg = "par argument must be a Sherpa model parameter."
+        raise TypeError(emsg)
+
+    if not hasattr(pvals, "__iter__"):
+        emsg = "pvals argument must be an iterable (array/list)."
+        raise TypeError(emsg)
+
+    smdl = ui.get_source(id)
+    if par not in smdl.pars:
+        emsg = "par argument is not a parameter of the " + \
+            "source model"
+        raise TypeError(emsg)
+
 
 def save_instmap_weights(*args, **kwargs):
     """Save a weights file in a format usable by mkinstmap.
@@ -646,6 +791,13 @@ def save_instmap_weights(*args, **kwargs):
     clobber : bool, optional
         If the output file already exists, should it be deleted
         (``True``) or an IOError raised? The default is ``True``.
+    par : Sherpa parameter object or None
+        If given, a file is written for each of the values in pvals
+        (which must be set), and filename must contain a ``{}``
+        field which is replaced by the parameter value.
+    pvals : array of numbers or None
+        The values of par to use. The parameter value is reset to
+        its original value when the routine exits.
 
     See Also
     --------
@@ -674,6 +826,12 @@ def save_instmap_weights(*args, **kwargs):
     >>> pl.phoindex = 1.7
     >>> save_instmap_weights("wgt.dat", fluxtype="erg", clobber=False)
 
+    Create the files wgt_1.0.dat, wgt_1.5.dat, and wgt_2.0.dat for
+    three values of the photon index:
+
+    >>> save_instmap_weights("wgt_{:.1f}.dat", par=pl.phoindex,
+    ...                      pvals=[1, 1.5, 2])
+
     """
 
     fname = "save_instmap_weights"
@@ -690,7 +848,9 @@ def save_instmap_weights(*args, **kwargs):
     user = {"id": ui.get_default_id(),
             "filename": None,
             "clobber": True,
-            "fluxtype": "photon"}
+            "fluxtype": "photon",
+            "par": None,
+            "pvals": None}
     argnames = user.keys()
 
     if nargs == 1:
@@ -727,8 +887,20 @@ def save_instmap_weights(*args, **kwargs):
             raise TypeError(emsg)
         user[n] = v
 
-    wgts = get_instmap_weights(user["id"], fluxtype=user["fluxtype"])
-    wgts.save(user["filename"], clobber=user["clobber"])
+    wgts = get_instmap_weights(user["id"], fluxtype=user["fluxtype"],
+                               par=user["par"], pvals=user["pvals"])
+    if user["par"] is None:
+        wgts.save(user["filename"], clobber=user["clobber"])
+        return
+
+    filenames = [user["filename"].format(pval) for pval in user["pvals"]]
+    if len(set(filenames)) != len(filenames):
+        emsg = f"The filename {user['filename']} does not create " + \
+            "a separate file for each parameter value"
+        raise ValueError(emsg)
+
+    for (wgt, filename) in zip(wgts, filenames):
+        wgt.save(filename, clobber=user["clobber"])
 
 
 def plot_instmap_weights(id=None, fluxtype="photon",
@@ -845,6 +1017,7 @@ def estimate_weighted_expmap(id=None, arf=None, elo=None, ehi=None,
 
     See Also
     --------
+    estimate_weighted_expmaps
     get_instmap_weights
     plot_instmap_weights
     save_instmap_weights
@@ -852,6 +1025,8 @@ def estimate_weighted_expmap(id=None, arf=None, elo=None, ehi=None,
     Notes
     -----
     The ARF is interpolated onto the energy grid of the dataspace.
+    When par is set the ARF is only interpolated once, and only the
+    source model is evaluated for each element of pvals.
 
     Examples
     --------
@@ -883,26 +1058,7 @@ def estimate_weighted_expmap(id=None, arf=None, elo=None, ehi=None,
     if id is None:
         id = ui.get_default_id()
 
-    if par is not None or pvals is not None:
-
-        if par is None or pvals is None:
-            emsg = "Either both par and pvals are set or they " + \
-                "are both None."
-            raise TypeError(emsg)
-
-        if not isinstance(par, Parameter):
-            emsg = "par argument must be a Sherpa model parameter."
-            raise TypeError(emsg)
-
-        if not hasattr(pvals, "__iter__"):
-            emsg = "pvals argument must be an iterable (array/list)."
-            raise TypeError(emsg)
-
-        smdl = ui.get_source(id)
-        if par not in smdl.pars:
-            emsg = "par argument is not a parameter of the " + \
-                "source model"
-            raise TypeError(emsg)
+    _validate_par(id, par, pvals)
 
     wgts = get_instmap_weights(id, fluxtype=fluxtype)
     if isinstance(wgts, InstMapWeights1DInt) and arf is None and \
@@ -922,22 +1078,93 @@ def estimate_weighted_expmap(id=None, arf=None, elo=None, ehi=None,
     if par is None:
         return wgts.estimate_expmap(*args)
 
+    if len(args) == 0:
+        darf = ui.get_arf(id)
+        arf = (darf.energ_lo, darf.energ_hi, darf.specresp)
+    elif len(args) == 1:
+        arf = args[0]
     else:
-        # Ugh: we have to create an object for each evaluation, which
-        # is rather wasteful.
-        #
-        orig = par.val
-        out = []
-        try:
-            for pval in pvals:
-                par.val = pval
-                wgts = get_instmap_weights(id, fluxtype=fluxtype)
-                out.append(wgts.estimate_expmap(*args))
+        arf = tuple(args)
+
+    wgts = get_instmap_weights(id, fluxtype=fluxtype, par=par,
+                               pvals=pvals)
+    return estimate_weighted_expmaps(wgts, [arf])[:, 0]
+
+
+def estimate_weighted_expmaps(wgts, arfs):
+    """Estimate the weighted exposure map values for several weights
+    and ARFs.
+
+    Parameters
+    ----------
+    wgts : InstMapWeights or sequence of InstMapWeights
+        The weights, such as returned by get_instmap_weights. They
+        do not need to use the same grid.
+    arfs : sequence
+        The ARFs to use. Each element is the name of an ARF file,
+        a TABLECrate, or a (elo, ehi, specresp) tuple.
+
+    Return
+    ------
+    expmaps : 2D array of numbers
+        The exposure map values, with shape (number of weights,
+        number of ARFs).
 
-        finally:
-            par.val = orig
+    See Also
+    --------
+    estimate_weighted_expmap
+    get_instmap_weights
 
-        return np.asarray(out)
+    Notes
+    -----
+    Each ARF is read in once, and is only interpolated once for
+    each energy grid used by the weights.
+
+    Examples
+    --------
+
+    Calculate the exposure map for a range of gamma values and
+    three ARFs (the return value has shape (45, 3)):
+
+    >>> dataspace1d(0.3, 8.0, 0.1)
+    >>> set_source(xsphabs.gal * powlaw1d.pl)
+    >>> gal.nh = 0.087
+    >>> gvals = np.arange(0.5, 5, 0.1)
+    >>> wgts = get_instmap_weights(par=pl.gamma, pvals=gvals)
+    >>> arfs = ["src1.arf", "src2.arf", "src3.arf"]
+    >>> evals = estimate_weighted_expmaps(wgts, arfs)
+
+    """
+
+    if isinstance(wgts, InstMapWeights):
+        wgts = [wgts]
+
+    arfdata = []
+    for arf in arfs:
+        if isinstance(arf, (tuple, list)):
+            arfdata.append(_read_arf(*arf))
+        else:
+            arfdata.append(_read_arf(arf))
+
+    # Group the weights by grid, so that the ARFs are interpolated
+    # once per grid.
+    #
+    grids = {}
+    for (idx, wgt) in enumerate(wgts):
+        key = (wgt.xmid.dtype.str, wgt.xmid.tobytes())
+        grids.setdefault(key, []).append(idx)
+
+    out = np.zeros((len(wgts), len(arfdata)))
+    if len(arfdata) == 0:
+        return out
+
+    for idxs in grids.values():
+        ref = wgts[idxs[0]]
+        resp = np.asarray([ref._interpolate_arf(*arf) for arf in arfdata])
+        weights = np.asarray([wgts[idx].weight for idx in idxs])
+        out[idxs] = weights @ resp.T
+
+    return out
 
 
 # Note that the current guess methods are not ideal, in particular
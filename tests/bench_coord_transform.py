@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+
+"""Compare the time taken to convert coordinates with
+SimpleCoordTransform to that of the original point-by-point approach.
+
+Usage:
+
+    python bench_coord_transform.py image.fits [npts]
+
+where image.fits is a CIAO image with SKY and EQPOS coordinates and
+npts defaults to 1000000. The point-by-point conversion is only run
+on a sub-set of the points and the time scaled up to npts.
+
+"""
+
+import sys
+import time
+
+import numpy as np
+
+from crates_contrib.utils import SimpleCoordTransform
+
+
+def convert_by_point(tr, fromsys, tosys, x, y):
+    """The original approach, which converts each point separately."""
+
+    cinfo = tr.conversions[tr._validate_coordsys(fromsys)][tr._validate_coordsys(tosys)]
+    out = []
+    for (u, v) in zip(x, y):
+        pt = [[u * 1.0, v * 1.0]]
+        for trinfo in cinfo["transforms"]:
+            pt = getattr(trinfo["transform"], cinfo["direction"])(pt)
+
+        out.append(pt[0, :])
+
+    out = np.asarray(out)
+    return out[:, 0], out[:, 1]
+
+
+def run(infile, npts=1000000, nsample=10000):
+
+    tr = SimpleCoordTransform(infile)
+
+    rng = np.random.default_rng(2026)
+    x = rng.uniform(1, 1024, size=npts)
+    y = rng.uniform(1, 1024, size=npts)
+
+    t0 = time.perf_counter()
+    ra, dec = tr.convert("logical", "world", x, y)
+    tvec = time.perf_counter() - t0
+
+    nsample = min(nsample, npts)
+    t0 = time.perf_counter()
+    ra1, dec1 = convert_by_point(tr, "logical", "world",
+                                 x[:nsample], y[:nsample])
+    tpt = (time.perf_counter() - t0) * npts / nsample
+
+    assert np.allclose(ra[:nsample], ra1)
+    assert np.allclose(dec[:nsample], dec1)
+
+    print(f"Converting {npts} points from logical to world")
+    print(f"  vectorized:     {tvec:8.3f} s")
+    print(f"  point by point: {tpt:8.3f} s (scaled from {nsample} points)")
+    print(f"  speed up:       {tpt / tvec:8.1f}")
+
+
+if __name__ == "__main__":
+
+    if len(sys.argv) not in [2, 3]:
+        sys.stderr.write(f"Usage: {sys.argv[0]} image.fits [npts]\n")
+        sys.exit(1)
+
+    npts = 1000000 if len(sys.argv) == 2 else int(sys.argv[2])
+    run(sys.argv[1], npts=npts)
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+
+"""Compare the time taken to fit a model convolved with MatrixModel
+when the matrix is stored as a dense array or a sparse (CSR) matrix,
+with and without a filter.
+
+Usage:
+
+    python bench_matrix_model.py [nbins] [nfits]
+
+where nbins is the size of the grid (default 500) and nfits the number
+of fits (default 20). The matrix is banded, so most elements are 0,
+similar to the matrices created by mkrprm.
+
+"""
+
+import sys
+import time
+
+import numpy as np
+
+from sherpa.astro import ui
+
+from sherpa_contrib.matrix_model import MatrixModel
+
+
+def make_matrix(nbins, width=10):
+    rng = np.random.default_rng(2026)
+    matrix = np.zeros((nbins, nbins))
+    for i in range(nbins):
+        lo = max(0, i - width)
+        hi = min(nbins, i + width + 1)
+        matrix[i, lo:hi] = rng.uniform(size=hi - lo)
+
+    return matrix
+
+
+def time_fit(matrix, xx, yy, sparse, nfits, filt):
+
+    ui.clean()
+    ui.load_arrays(1, xx, yy, np.sqrt(yy), ui.Data1D)
+    if filt is not None:
+        ui.notice(*filt)
+
+    mdl = MatrixModel(matrix, xx, name="mm", sparse=sparse)
+    gmdl = ui.gauss1d("gmdl")
+    ui.set_source(mdl(gmdl))
+
+    t0 = time.perf_counter()
+    for _ in range(nfits):
+        gmdl.fwhm = 20
+        gmdl.pos = xx[len(xx) // 3]
+        gmdl.ampl = 10
+        ui.fit()
+
+    return time.perf_counter() - t0, gmdl.pos.val
+
+
+def run(nbins=500, nfits=20):
+
+    ui.set_stat("chi2")
+
+    xx = np.arange(nbins) + 0.5
+    matrix = make_matrix(nbins)
+    yy = matrix @ (100 * np.exp(-0.5 * ((xx - nbins / 2) / 15)**2)) + 10
+
+    print(f"Fitting {nfits} times with a {nbins} by {nbins} matrix")
+    for filt in [None, (nbins / 4, 3 * nbins / 4)]:
+        label = "full grid" if filt is None else "filtered"
+        for sparse in [False, True]:
+            t, pos = time_fit(matrix, xx, yy, sparse, nfits, filt)
+            store = "sparse" if sparse else "dense "
+            print(f"  {label:9s} {store}: {t:8.3f} s  (pos = {pos:.3f})")
+
+
+if __name__ == "__main__":
+
+    if len(sys.argv) > 3:
+        sys.stderr.write(f"Usage: {sys.argv[0]} [nbins] [nfits]\n")
+        sys.exit(1)
+
+    args = [int(arg) for arg in sys.argv[1:]]
+    run(*args)
@@ -0,0 +1,209 @@
+"""Check the event sampling in blanksky_sample"""
+
+import importlib.machinery
+import importlib.util
+import os
+
+import numpy as np
+
+import pytest
+
+pcr = pytest.importorskip("pycrates")
+
+from crates_contrib.utils import add_colvals
+
+
+def load_script():
+    """Load bin/blanksky_sample as a module."""
+
+    path = os.path.join(os.path.dirname(__file__), "..", "bin",
+                        "blanksky_sample")
+    loader = importlib.machinery.SourceFileLoader("blanksky_sample", path)
+    spec = importlib.util.spec_from_loader(loader.name, loader)
+    module = importlib.util.module_from_spec(spec)
+    loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(scope="module")
+def bs():
+    return load_script()
+
+
+CHIPS = [0, 2, 3, 7]
+NEVT = 2000
+SEED = 8273
+
+KW_PSF = {"ONTIME": 4000.0, "LIVETIME": 3900.0, "EXPOSURE": 3900.0,
+          "TSTART": 1.0e8, "TSTOP": 1.0e8 + 4000.0, "DTCOR": 0.975}
+for _chip in CHIPS:
+    KW_PSF[f"ONTIME{_chip}"] = 4000.0
+    KW_PSF[f"LIVTIME{_chip}"] = 3900.0 - _chip
+    KW_PSF[f"EXPOSUR{_chip}"] = 3900.0 - _chip
+
+
+def bkg_keywords(bkgmeth):
+    kw = {"INSTRUME": "ACIS", "BKGMETH": bkgmeth}
+    for chip in CHIPS:
+        kw[f"BKGSCAL{chip}"] = 0.05 * (chip + 1)
+        kw[f"LIVTIME{chip}"] = 1.0e5 + 1000 * chip
+
+    # A scale factor larger than 1 keeps everything
+    kw["BKGSCAL7"] = 1.5
+    return kw
+
+
+def old_randnum(kw, kw_infile, ccd_id, rand):
+    """The RANDNUM value calculated by the dmtcalc call used before
+    the selection was done in Python; events with a value in 0:1 were
+    kept.
+    """
+
+    randnum = np.zeros(rand.size)
+    for chip in CHIPS:
+        idx = ccd_id == chip
+        bkgscale = kw[f"BKGSCAL{chip}"]
+        if kw["BKGMETH"] == "particle-rate":
+            tobs = kw_infile[f"LIVTIME{chip}"]
+            tbsky = kw[f"LIVTIME{chip}"]
+            randnum[idx] = rand[idx] * (tbsky / (tobs * bkgscale))
+        else:
+            randnum[idx] = rand[idx] / bkgscale
+
+    return randnum
+
+
+def make_bkg(outfile, kw):
+    """Create an events file with a GTI block."""
+
+    rng = np.random.default_rng(18)
+    ds = pcr.CrateDataset()
+
+    evt = pcr.TABLECrate()
+    evt.name = "EVENTS"
+    add_colvals(evt, "time", np.sort(rng.uniform(0, 1e5, NEVT)), unit="s")
+    add_colvals(evt, "ccd_id", rng.choice(CHIPS, NEVT).astype(np.int16))
+    add_colvals(evt, "expno", np.arange(NEVT, dtype=np.int32))
+    add_colvals(evt, "energy", rng.uniform(500, 7000, NEVT).astype(np.float32),
+                unit="eV")
+    for key, val in kw.items():
+        pcr.set_key(evt, key, val)
+
+    gti = pcr.TABLECrate()
+    gti.name = "GTI"
+    add_colvals(gti, "start", np.asarray([0.0, 6e4]), unit="s")
+    add_colvals(gti, "stop", np.asarray([5e4, 1e5]), unit="s")
+
+    ds.add_crate(evt)
+    ds.add_crate(gti)
+    ds.write(outfile, clobber=True)
+    return pcr.read_file(outfile)
+
+
+@pytest.mark.parametrize("bkgmeth", ["default", "particle-rate"])
+def test_keep_fraction(bkgmeth, bs):
+    """The fraction matches the chance of RANDNUM lying in 0:1"""
+
+    kw = bkg_keywords(bkgmeth)
+    kw_infile = {f"LIVTIME{chip}": 2.0e4 for chip in CHIPS}
+    rand = np.linspace(0, 1, 100001)
+    for chip in CHIPS:
+        frac = bs._keep_fraction(kw, kw_infile[f"LIVTIME{chip}"],
+                                 bs._bkg_livetime(kw, chip),
+                                 kw[f"BKGSCAL{chip}"])
+        ccd_id = np.full(rand.size, chip)
+        randnum = old_randnum(kw, kw_infile, ccd_id, rand)
+        expected = np.mean((randnum >= 0) & (randnum <= 1))
+        assert frac == pytest.approx(expected, abs=1e-4)
+
+
+def test_bkg_livetime(bs):
+
+    assert bs._bkg_livetime({"LIVTIME3": 1, "LIVETIME": 2}, 3) == 1
+    assert bs._bkg_livetime({"LIVETIM3": 4, "LIVETIME": 2}, 3) == 4
+    assert bs._bkg_livetime({"LIVETIME": 2}, 3) == 2
+    with pytest.raises(KeyError):
+        bs._bkg_livetime({}, 3)
+
+
+@pytest.mark.parametrize("bkgmeth", ["default", "particle-rate"])
+def test_sample_background(bkgmeth, bs, tmp_path, monkeypatch):
+    """The selected rows match the old rule and all blocks are kept"""
+
+    kw = bkg_keywords(bkgmeth)
+    bkgfile = str(tmp_path / "bkg.fits")
+    orig = make_bkg(bkgfile, kw)
+    ccd_id = orig.get_column("ccd_id").values
+    expno = orig.get_column("expno").values
+    energy = orig.get_column("energy").values
+
+    kw_infile = {f"LIVTIME{chip}": 2.0e4 for chip in CHIPS}
+    monkeypatch.setattr(bs.fileio, "get_keys_from_file",
+                        lambda fname: kw_infile)
+
+    outfile = str(tmp_path / "out.fits")
+    bs.sample_background(bkgfile, "infile.fits", outfile, kw, KW_PSF, SEED)
+
+    # The random numbers are drawn for the selection and then for
+    # the times.
+    rng = np.random.default_rng(SEED)
+    randnum = old_randnum(kw, kw_infile, ccd_id, rng.random(NEVT))
+    keep = np.flatnonzero(randnum <= 1)
+    assert 0 < keep.size < NEVT
+    times = rng.random(keep.size)
+    order = np.argsort(times, kind="stable")
+    keep = keep[order]
+
+    ds = pcr.CrateDataset(outfile, mode="r")
+    evt = ds.get_crate("EVENTS")
+    assert evt.get_nrows() == keep.size
+    for colname in ["time", "ccd_id", "expno", "energy"]:
+        assert evt.get_column(colname).values.size == keep.size
+
+    assert (evt.get_column("expno").values == expno[keep]).all()
+    assert (evt.get_column("ccd_id").values == ccd_id[keep]).all()
+    assert evt.get_column("energy").values == pytest.approx(energy[keep])
+
+    got = evt.get_column("time").values
+    assert (np.diff(got) >= 0).all()
+    assert got.min() >= KW_PSF["TSTART"]
+    assert got.max() <= KW_PSF["TSTOP"]
+
+    # Every event on the chip with BKGSCAL7 > 1 is kept (the
+    # particle-rate method uses the ratio of the livetimes).
+    if bkgmeth == "default":
+        assert (ccd_id[keep] == 7).sum() == (ccd_id == 7).sum()
+
+    for key in ["ONTIME", "LIVETIME", "TSTART", "TSTOP", "LIVTIME3"]:
+        assert evt.get_key_value(key) == pytest.approx(KW_PSF[key])
+
+    gti = ds.get_crate("GTI")
+    assert gti.get_nrows() == 2
+    assert gti.get_column("start").values == pytest.approx([0, 6e4])
+    assert gti.get_column("stop").values == pytest.approx([5e4, 1e5])
+
+
+def test_sample_background_seed(bs, tmp_path, monkeypatch):
+    """The output only depends on the seed"""
+
+    kw = bkg_keywords("default")
+    bkgfile = str(tmp_path / "bkg.fits")
+    make_bkg(bkgfile, kw)
+    kw_infile = {f"LIVTIME{chip}": 2.0e4 for chip in CHIPS}
+    monkeypatch.setattr(bs.fileio, "get_keys_from_file",
+                        lambda fname: kw_infile)
+
+    def sample(seed, name):
+        outfile = str(tmp_path / name)
+        bs.sample_background(bkgfile, "infile.fits", outfile, kw, KW_PSF,
+                             seed)
+        cr = pcr.read_file(f"{outfile}[EVENTS]")
+        return cr.get_column("expno").values, cr.get_column("time").values
+
+    expno1, time1 = sample(SEED, "out1.fits")
+    expno2, time2 = sample(SEED, "out2.fits")
+    expno3, _ = sample(SEED + 1, "out3.fits")
+
+    assert (expno1 == expno2).all()
+    assert (time1 == time2).all()
+    assert expno1.size != expno3.size or (expno1 != expno3).any()
@@ -0,0 +1,209 @@
+"""Check the decompression code in ciao_contrib.downloadutils"""
+
+import gzip
+import io
+from types import SimpleNamespace
+
+import numpy as np
+
+import pytest
+
+from ciao_contrib import downloadutils
+
+
+def make_data(nbytes=100000, seed=3872):
+    """Data that compresses, but not to nothing."""
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, 16, size=nbytes, dtype=np.uint8).tobytes()
+
+
+def multi_member(*parts):
+    """A gzip file made up of one member per part."""
+    return b"".join(gzip.compress(part) for part in parts)
+
+
+class FakeConnection:
+    """Provide the parts of http.client.HTTPConnection that are used."""
+
+    def __init__(self, data):
+        self.data = data
+        self.requests = []
+
+    def request(self, method, path, headers=None):
+        self.requests.append((method, path))
+
+    def getresponse(self):
+        return io.BytesIO(self.data)
+
+
+@pytest.mark.parametrize("chunksize", [1, 7, 1000, 10**6])
+@pytest.mark.parametrize("padding", [0, 3, 1500])
+def test_gzip_stream(chunksize, padding):
+
+    parts = [make_data(5000, seed=1), b"", make_data(3000, seed=2)]
+    data = multi_member(*parts) + b"\0" * padding
+
+    decomp = downloadutils._GzipStream()
+    out = [decomp.decompress(data[i:i + chunksize])
+           for i in range(0, len(data), chunksize)]
+    out.append(decomp.flush())
+
+    assert decomp.eof
+    assert b"".join(out) == b"".join(parts)
+
+
+def test_gzip_stream_incomplete():
+
+    data = multi_member(make_data(5000, seed=1), make_data(3000, seed=2))
+
+    decomp = downloadutils._GzipStream()
+    decomp.decompress(data[:-20])
+    assert not decomp.eof
+
+
+@pytest.mark.parametrize("chunksize", [10, 8192])
+def test_download_decompress(chunksize, tmp_path):
+
+    parts = [make_data(seed=1), make_data(seed=2)]
+    data = multi_member(*parts)
+    outfile = str(tmp_path / "evt2.fits.gz")
+
+    conn = FakeConnection(data)
+    purl = SimpleNamespace(path="/a/b/evt2.fits.gz")
+    (nbytes, _) = downloadutils._download_decompress(conn, purl, len(data),
+                                                     outfile,
+                                                     chunksize=chunksize,
+                                                     verbose=False)
+    assert nbytes == len(data)
+    assert conn.requests == [("GET", "/a/b/evt2.fits.gz")]
+    assert (tmp_path / "evt2.fits").read_bytes() == b"".join(parts)
+    assert not (tmp_path / "evt2.fits.gz").exists()
+    assert not (tmp_path / "evt2.fits.part").exists()
+
+    # The file is not downloaded again
+    conn = FakeConnection(data)
+    assert downloadutils._download_decompress(conn, purl, len(data),
+                                              outfile,
+                                              verbose=False) == (0, 0)
+    assert conn.requests == []
+
+
+def test_download_decompress_incomplete(tmp_path):
+
+    data = gzip.compress(make_data())
+    outfile = str(tmp_path / "evt2.fits.gz")
+
+    conn = FakeConnection(data[:-100])
+    purl = SimpleNamespace(path="/evt2.fits.gz")
+    downloadutils._download_decompress(conn, purl, len(data), outfile,
+                                       verbose=False)
+
+    assert not (tmp_path / "evt2.fits").exists()
+    assert (tmp_path / "evt2.fits.part").exists()
+
+
+def test_download_decompress_existing_gzip(tmp_path):
+    """A compressed file with the expected size is decompressed"""
+
+    expected = make_data()
+    data = gzip.compress(expected)
+    infile = tmp_path / "evt2.fits.gz"
+    infile.write_bytes(data)
+
+    conn = FakeConnection(b"")
+    purl = SimpleNamespace(path="/evt2.fits.gz")
+    assert downloadutils._download_decompress(conn, purl, len(data),
+                                              str(infile),
+                                              verbose=False) == (0, 0)
+    assert conn.requests == []
+    assert (tmp_path / "evt2.fits").read_bytes() == expected
+    assert not infile.exists()
+
+
+@pytest.mark.parametrize("keep", [False, True])
+def test_gunzip_file(keep, tmp_path):
+
+    parts = [make_data(seed=1), make_data(seed=2)]
+    infile = tmp_path / "img.fits.gz"
+    infile.write_bytes(multi_member(*parts))
+
+    outfile = downloadutils.gunzip_file(str(infile), keep=keep,
+                                        chunksize=1000)
+    assert outfile == str(tmp_path / "img.fits")
+    assert (tmp_path / "img.fits").read_bytes() == b"".join(parts)
+    assert infile.exists() == keep
+    assert not (tmp_path / "img.fits.part").exists()
+
+
+def test_gunzip_file_outfile(tmp_path):
+
+    infile = tmp_path / "img.dat"
+    infile.write_bytes(gzip.compress(b"abc"))
+    outfile = str(tmp_path / "out.dat")
+
+    assert downloadutils.gunzip_file(str(infile), outfile) == outfile
+    assert (tmp_path / "out.dat").read_bytes() == b"abc"
+
+
+def test_gunzip_file_invalid_name(tmp_path):
+
+    infile = tmp_path / "img.dat"
+    infile.write_bytes(gzip.compress(b"abc"))
+    with pytest.raises(ValueError):
+        downloadutils.gunzip_file(str(infile))
+
+
+def test_gunzip_file_not_gzip(tmp_path):
+
+    infile = tmp_path / "img.fits.gz"
+    infile.write_bytes(b"not a gzip file")
+    with pytest.raises(OSError):
+        downloadutils.gunzip_file(str(infile))
+
+    # The input is kept and the partial output is removed
+    assert infile.exists()
+    assert not (tmp_path / "img.fits").exists()
+    assert not (tmp_path / "img.fits.part").exists()
+
+
+@pytest.mark.parametrize("nproc", [None, 1, 3])
+def test_gunzip_files(nproc, tmp_path):
+
+    expected = [make_data(2000, seed=i) for i in range(5)]
+    infiles = []
+    for i, data in enumerate(expected):
+        infile = tmp_path / f"file{i}.gz"
+        infile.write_bytes(gzip.compress(data))
+        infiles.append(str(infile))
+
+    outfiles = downloadutils.gunzip_files(infiles, nproc=nproc)
+    assert outfiles == [infile[:-3] for infile in infiles]
+    for outfile, data in zip(outfiles, expected):
+        with open(outfile, "rb") as fh:
+            assert fh.read() == data
+
+    assert not any((tmp_path / f"file{i}.gz").exists() for i in range(5))
+
+
+def test_gunzip_files_empty():
+    assert downloadutils.gunzip_files([]) == []
+
+
+def test_gunzip_tree(tmp_path):
+
+    subdir = tmp_path / "primary"
+    subdir.mkdir()
+    (tmp_path / "a.fits.gz").write_bytes(gzip.compress(b"a"))
+    (subdir / "b.fits.gz").write_bytes(gzip.compress(b"b"))
+    (subdir / "c.fits").write_bytes(b"c")
+
+    # Already decompressed
+    (subdir / "c.fits.gz").write_bytes(gzip.compress(b"x"))
+
+    outfiles = downloadutils.gunzip_tree(str(tmp_path), nproc=2)
+    assert sorted(outfiles) == sorted([str(tmp_path / "a.fits"),
+                                       str(subdir / "b.fits")])
+    assert (tmp_path / "a.fits").read_bytes() == b"a"
+    assert (subdir / "b.fits").read_bytes() == b"b"
+    assert (subdir / "c.fits").read_bytes() == b"c"
+    assert (subdir / "c.fits.gz").exists()
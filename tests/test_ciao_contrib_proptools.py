@@ -0,0 +1,221 @@
+"""Check the batched colden calls in ciao_contrib.proptools"""
+
+import numpy as np
+
+import pytest
+
+from ciao_contrib import proptools
+
+
+HEADER = """
+ COLDEN:  Version 4.7
+ Hydrogen column densities from the NRAO data set
+"""
+
+
+def colden_line(ra, dec):
+    """The column density line for a position."""
+    return f" Hydrogen density (10^20 cm^-2):  {fake_nh(ra, dec):.2f}"
+
+
+def fake_nh(ra, dec):
+    return round(1 + ra / 100 + abs(dec) / 10, 2)
+
+
+class FakeColden:
+    """Replace _run_proc by something that looks like prop_colden.
+
+    The skip argument lists the positions (counting from 0 within a
+    call) for which no value is reported by a multi-position call.
+    """
+
+    def __init__(self, rval=0, skip=None, badval=None):
+        self.rval = rval
+        self.skip = [] if skip is None else skip
+        self.badval = badval
+        self.calls = []
+
+    def __call__(self, label, args):
+        assert label == 'colden'
+        assert args[:4] == ["prop_colden", "f", "j/deg", "data"]
+        assert args[4] in ["NRAO", "Bell", "bell"]
+
+        evals = args[5:]
+        assert len(evals) % 3 == 0
+        positions = [(float(evals[i + 1]), float(evals[i + 2]))
+                     for i in range(0, len(evals), 3)]
+        assert all(evals[i] == "eval" for i in range(0, len(evals), 3))
+        self.calls.append(positions)
+
+        multi = len(positions) > 1
+        lines = [HEADER]
+        for i, (ra, dec) in enumerate(positions):
+            if multi and i in self.skip:
+                continue
+
+            if self.badval is not None and (ra, dec) == self.badval:
+                lines.append(" Hydrogen density (10^20 cm^-2):  ***")
+            else:
+                lines.append(colden_line(ra, dec))
+
+            # Each value is followed by a blank line.
+            lines.append("")
+
+        sout = "\n".join(lines) + "\n"
+        if not multi:
+            return max(self.rval, 0), sout
+
+        return self.rval, sout
+
+
+@pytest.fixture
+def fake_colden(monkeypatch):
+    monkeypatch.setattr(proptools, "_colden_cache",
+                        type(proptools._colden_cache)())
+
+    def setup(**kwargs):
+        fake = FakeColden(**kwargs)
+        monkeypatch.setattr(proptools, "_run_proc", fake)
+        return fake
+
+    return setup
+
+
+RA = [2.1, 15.8, 356.2, 178.9]
+DEC = [43.5, -0.1, 83.4, -76]
+EXPECTED = [fake_nh(ra, dec) for (ra, dec) in zip(RA, DEC)]
+
+
+def test_parse_colden_values():
+
+    sout = "\n".join([HEADER, colden_line(10, 20), "",
+                      " Hydrogen density (10^20 cm^-2):  xx",
+                      " Hydrogen density", colden_line(30, -40),
+                      " Helium density  2.0"])
+    assert proptools._parse_colden_values(sout) == [fake_nh(10, 20), None,
+                                                    None, fake_nh(30, -40)]
+
+
+def test_parse_colden_values_empty():
+    assert proptools._parse_colden_values("") == []
+    assert proptools._parse_colden_values(HEADER) == []
+
+
+def test_colden_batch(fake_colden):
+
+    fake = fake_colden()
+    got = proptools.colden(RA, DEC)
+    assert got == pytest.approx(EXPECTED)
+    assert isinstance(got, list)
+    assert fake.calls == [list(zip(RA, DEC))]
+
+
+def test_colden_scalar(fake_colden):
+
+    fake = fake_colden()
+    got = proptools.colden(RA[1], DEC[1], dataset='bell')
+    assert got == pytest.approx(EXPECTED[1])
+    assert len(fake.calls) == 1
+
+
+def test_colden_numpy(fake_colden):
+
+    fake_colden()
+    got = proptools.colden(np.asarray(RA), DEC)
+    assert isinstance(got, np.ndarray)
+    assert got == pytest.approx(EXPECTED)
+
+
+def test_colden_batch_missing_value(fake_colden):
+    """If a value is missing each position is evaluated separately"""
+
+    fake = fake_colden(skip=[2])
+    got = proptools.colden(RA, DEC)
+    assert got == pytest.approx(EXPECTED)
+
+    assert len(fake.calls) == 1 + len(RA)
+    assert fake.calls[1:] == [[pos] for pos in zip(RA, DEC)]
+
+
+def test_colden_batch_fails(fake_colden):
+    """If the batch call fails each position is evaluated separately"""
+
+    fake = fake_colden(rval=-1)
+    got = proptools.colden(RA, DEC)
+    assert got == pytest.approx(EXPECTED)
+    assert len(fake.calls) == 1 + len(RA)
+
+
+def test_colden_batch_bad_value(fake_colden):
+    """A value that can not be parsed is returned as None"""
+
+    fake = fake_colden(badval=(RA[3], DEC[3]))
+    got = proptools.colden(RA, DEC)
+    assert got[:3] == pytest.approx(EXPECTED[:3])
+    assert got[3] is None
+    assert len(fake.calls) == 1
+
+
+def test_colden_repeated_positions(fake_colden):
+    """Each position is only evaluated once"""
+
+    fake = fake_colden()
+    ra = RA + RA[:2] + [RA[0] + 1e-7]
+    dec = DEC + DEC[:2] + [DEC[0]]
+    got = proptools.colden(ra, dec)
+    assert got == pytest.approx(EXPECTED + EXPECTED[:2] + EXPECTED[:1])
+    assert fake.calls == [list(zip(RA, DEC))]
+
+
+def test_colden_chunks(fake_colden, monkeypatch):
+
+    monkeypatch.setattr(proptools, "_COLDEN_CHUNKSIZE", 3)
+    fake = fake_colden()
+    ra = RA + [10.0, 20.0, 30.0]
+    dec = DEC + [0.0, 0.0, 0.0]
+    got = proptools.colden(ra, dec)
+    assert got == pytest.approx([fake_nh(a, b) for (a, b) in zip(ra, dec)])
+    assert [len(c) for c in fake.calls] == [3, 3, 1]
+
+
+def test_colden_cache(fake_colden):
+
+    fake = fake_colden()
+    proptools.colden(RA[:2], DEC[:2])
+    got = proptools.colden(RA, DEC)
+    assert got == pytest.approx(EXPECTED)
+    assert fake.calls == [list(zip(RA[:2], DEC[:2])),
+                          list(zip(RA[2:], DEC[2:]))]
+
+    # The dataset is part of the key
+    proptools.colden(RA[0], DEC[0], dataset='Bell')
+    assert fake.calls[-1] == [(RA[0], DEC[0])]
+
+    # The cache can be ignored
+    proptools.colden(RA, DEC, cache=False)
+    assert fake.calls[-1] == list(zip(RA, DEC))
+    assert len(fake.calls) == 4
+
+
+def test_colden_cache_size(fake_colden, monkeypatch):
+    """The least-recently used positions are removed"""
+
+    monkeypatch.setattr(proptools, "_COLDEN_CACHE_SIZE", 3)
+    fake = fake_colden()
+
+    proptools.colden(RA[:3], DEC[:3])
+    proptools.colden(RA[0], DEC[0])
+    proptools.colden(RA[3], DEC[3])
+    assert len(proptools._colden_cache) == 3
+
+    # The second position was the least-recently used
+    ncalls = len(fake.calls)
+    got = proptools.colden(RA, DEC)
+    assert got == pytest.approx(EXPECTED)
+    assert fake.calls[ncalls:] == [[(RA[1], DEC[1])]]
+    assert len(proptools._colden_cache) == 3
+
+
+def test_colden_invalid_dataset():
+    with pytest.raises(ValueError):
+        proptools.colden(RA, DEC, dataset='foo')
@@ -0,0 +1,137 @@
+"""Check the array handling and the interpolation grid in ciao_contrib.psf_contrib"""
+
+import numpy as np
+
+import pytest
+
+from ciao_contrib import psf_contrib
+
+
+def fake_size(pdata, energy, theta, phi, ecf):
+    """A stand-in for psf.psfSize that only accepts scalars."""
+
+    assert isinstance(energy, float)
+    pdata.append((energy, theta, phi, ecf))
+    return energy + 10 * theta + 100 * phi + 1000 * ecf
+
+
+def test_evaluate_scalar():
+
+    pdata = []
+    got = psf_contrib._evaluate(fake_size, pdata, 1, 2, 3, 0.5)
+    assert isinstance(got, float)
+    assert got == pytest.approx(821)
+    assert pdata == [(1, 2, 3, 0.5)]
+
+
+def test_evaluate_broadcast():
+
+    pdata = []
+    energy = np.asarray([1.0, 2.0, 4.0])
+    theta = np.asarray([[0.0], [5.0]])
+    got = psf_contrib._evaluate(fake_size, pdata, energy, theta, 90, [0.9])
+    assert got.shape == (2, 3)
+    assert len(pdata) == 6
+
+    expected = energy + 10 * theta + 100 * 90 + 1000 * 0.9
+    assert got == pytest.approx(expected)
+
+
+def make_grid(nphi=5):
+    energy = np.asarray([0.3, 1.0, 2.0, 4.5, 8.0])
+    theta = np.arange(0, 21, 2.5)
+    phi = np.linspace(0, 360, nphi)
+    ecf = np.asarray([0.5, 0.8, 0.9, 0.95])
+
+    rng = np.random.default_rng(8732)
+    size = rng.uniform(0.5, 20, size=(energy.size, theta.size, phi.size,
+                                      ecf.size))
+    return psf_contrib.PSFGrid(energy, theta, phi, ecf, size)
+
+
+def random_points(grid, shape):
+    rng = np.random.default_rng(2398)
+    return [rng.uniform(axis[0], axis[-1], size=shape)
+            for axis in grid.axes]
+
+
+def test_psfgrid_matches_regulargridinterpolator():
+
+    interpolate = pytest.importorskip("scipy.interpolate")
+
+    grid = make_grid()
+    pts = random_points(grid, 200)
+
+    # Include the grid points themselves
+    for pt, axis in zip(pts, grid.axes):
+        pt[:axis.size] = axis
+
+    rgi = interpolate.RegularGridInterpolator(grid.axes, grid.size)
+    expected = rgi(np.stack(pts, axis=-1))
+    got = grid.psfSize(*pts)
+    assert got.shape == (200,)
+    assert got == pytest.approx(expected)
+
+
+def test_psfgrid_broadcast():
+
+    interpolate = pytest.importorskip("scipy.interpolate")
+
+    grid = make_grid()
+    energy = np.asarray([0.5, 1.5, 7.0])
+    theta = np.asarray([[0.1], [3.3], [12.0], [19.9]])
+    got = grid.psfSize(energy, theta, 45.0, 0.9)
+    assert got.shape == (4, 3)
+
+    rgi = interpolate.RegularGridInterpolator(grid.axes, grid.size)
+    pts = np.broadcast_arrays(energy, theta, 45.0, 0.9)
+    expected = rgi(np.stack(pts, axis=-1))
+    assert got == pytest.approx(expected)
+
+    scalar = grid.psfSize(1.5, 3.3, 45.0, 0.9)
+    assert isinstance(scalar, float)
+    assert scalar == pytest.approx(got[1, 1])
+
+
+def test_psfgrid_clips():
+
+    grid = make_grid()
+    got = grid.psfSize([0.1, 10.0], [-1, 30], [0, 360], [0.2, 0.99])
+    expected = grid.size[[0, -1], [0, -1], [0, -1], [0, -1]]
+    assert got == pytest.approx(expected)
+
+
+def test_psfgrid_single_value_axis():
+
+    interpolate = pytest.importorskip("scipy.interpolate")
+
+    grid = make_grid(nphi=1)
+    pts = random_points(grid, 50)
+    got = grid.psfSize(*pts)
+
+    axes = [grid.axes[0], grid.axes[1], grid.axes[3]]
+    rgi = interpolate.RegularGridInterpolator(axes, grid.size[:, :, 0, :])
+    expected = rgi(np.stack([pts[0], pts[1], pts[3]], axis=-1))
+    assert got == pytest.approx(expected)
+
+
+def test_psfgrid_save_load(tmp_path):
+
+    grid = make_grid()
+    outfile = tmp_path / "grid.npz"
+    grid.save(outfile)
+
+    grid2 = psf_contrib.PSFGrid.load(outfile)
+    for axis, axis2 in zip(grid.axes, grid2.axes):
+        assert axis2 == pytest.approx(axis)
+
+    assert grid2.size == pytest.approx(grid.size)
+
+
+@pytest.mark.parametrize("energy,theta,size",
+                         [([1, 2], [0, 1], np.ones((2, 3, 1, 1))),
+                          ([2, 1], [0, 1], np.ones((2, 2, 1, 1))),
+                          ([], [0, 1], np.ones((0, 2, 1, 1)))])
+def test_psfgrid_invalid(energy, theta, size):
+    with pytest.raises(ValueError):
+        psf_contrib.PSFGrid(energy, theta, [0], [0.9], size)
@@ -0,0 +1,122 @@
+"""Check the bounding-cap filter in ciao_contrib.region.check_fov"""
+
+import numpy as np
+
+import pytest
+
+from ciao_contrib.region import check_fov
+
+
+def square(ra, dec, size=0.1, npad=3):
+    """The POS and EQPOS values for a square, closed, polygon.
+
+    The polygon is padded with zeros, as in a FOV file.
+    """
+    ras = [ra, ra + size, ra + size, ra, ra] + [0] * npad
+    decs = [dec, dec, dec + size, dec + size, dec] + [0] * npad
+    eqpos = np.asarray([ras, decs], dtype=float)
+
+    # Use a simple, but different, mapping for the sky coordinates
+    pos = 4000 + 100 * eqpos
+    pos[:, 5:] = 0
+    return pos, eqpos
+
+
+def merged_fov():
+    """Two polygons for the same chip, well separated, as in a merged
+    FOV file."""
+    pos1, eqpos1 = square(150.0, 2.0)
+    pos2, eqpos2 = square(151.5, 2.5)
+    return (np.asarray(["Polygon", "Polygon"]),
+            np.asarray([pos1, pos2]),
+            np.asarray([eqpos1, eqpos2]))
+
+
+def inside_square(ra, dec, ra0, dec0, size=0.1):
+    return (ra0 <= ra <= ra0 + size) and (dec0 <= dec <= dec0 + size)
+
+
+def test_polygon_vertices():
+
+    polys = check_fov._polygon_vertices(*merged_fov())
+    assert len(polys) == 2
+    for poly, (ra, dec) in zip(polys, [(150.0, 2.0), (151.5, 2.5)]):
+        assert poly.shape == (2, 4)
+        assert poly[0] == pytest.approx([ra, ra + 0.1, ra + 0.1, ra])
+        assert poly[1] == pytest.approx([dec, dec, dec + 0.1, dec + 0.1])
+
+
+@pytest.mark.parametrize("shapes", [["Polygon", "Circle"], ["Polygon"]])
+def test_polygon_vertices_invalid(shapes):
+
+    _, pos, eqpos = merged_fov()
+    if len(shapes) == 1:
+        # No closing point
+        pos = pos[:1, :, :3]
+        eqpos = eqpos[:1, :, :3]
+
+    with pytest.raises(IOError):
+        check_fov._polygon_vertices(np.asarray(shapes), pos, eqpos)
+
+
+def test_bounding_cap_same_ccd(monkeypatch):
+    """All the polygons are included, even with the same CCD_ID"""
+
+    monkeypatch.setattr(check_fov, "_read_fov_columns",
+                        lambda fov: merged_fov())
+    center, cosrad = check_fov._bounding_cap("merged_fov1.fits")
+
+    assert np.linalg.norm(center) == pytest.approx(1)
+    for poly in check_fov._polygon_vertices(*merged_fov()):
+        verts = check_fov._unit_vectors(*poly)
+        assert (verts @ center >= cosrad).all()
+
+
+def test_bounding_cap_unreadable(monkeypatch):
+
+    def fail(fov):
+        raise IOError("no such file")
+
+    monkeypatch.setattr(check_fov, "_read_fov_columns", fail)
+    assert check_fov._bounding_cap("missing.fits") is None
+
+
+@pytest.mark.parametrize("readable", [True, False])
+def test_inside_indices_same_ccd(readable, monkeypatch):
+    """Positions in either polygon are matched"""
+
+    if readable:
+        monkeypatch.setattr(check_fov, "_read_fov_columns",
+                            lambda fov: merged_fov())
+    else:
+        def fail(fov):
+            raise IOError("no such file")
+
+        monkeypatch.setattr(check_fov, "_read_fov_columns", fail)
+
+    calls = []
+
+    def inside(reg, ra, dec):
+        calls.append((reg, ra, dec))
+        return (inside_square(ra, dec, 150.0, 2.0) or
+                inside_square(ra, dec, 151.5, 2.5))
+
+    monkeypatch.setattr(check_fov, "regInsideRegion", inside)
+
+    fovs = check_fov.FOVFiles.__new__(check_fov.FOVFiles)
+    fovs.fovs = {"merged_fov1.fits": "merged-region"}
+    fovs._make_index()
+
+    ra = np.asarray([150.05, 151.55, 151.0, 20.0])
+    dec = np.asarray([2.05, 2.55, 2.3, -40.0])
+    pidx, fidx = fovs.inside_indices(ra, dec)
+    assert pidx.tolist() == [0, 1]
+    assert fidx.tolist() == [0, 0]
+
+    assert fovs.inside_many(ra, dec) == [["merged_fov1.fits"],
+                                         ["merged_fov1.fits"], [], []]
+
+    # The position far from the FOV is only checked when the cap
+    # is the whole sky.
+    checked = {(r, d) for (_, r, d) in calls}
+    assert ((20.0, -40.0) in checked) == (not readable)
@@ -0,0 +1,103 @@
+"""Check the band sums and the model evaluation in color_color"""
+
+import numpy as np
+
+import pytest
+
+from sherpa.astro.instrument import create_arf
+from sherpa.astro.io import write_arf
+from sherpa.astro.utils import calc_data_sum
+from sherpa.models.basic import PowLaw1D
+
+import color_color
+
+
+BANDS = [(0.5, 1.2), (1.2, 2.0), (2.0, 7.0), (0.5, 7.0), (0.3, 0.31),
+         (7.5, 20.0)]
+
+
+@pytest.fixture
+def arffile(tmp_path):
+    egrid = np.arange(0.3, 8.0, 0.01)
+    specresp = np.linspace(100, 400, egrid.size - 1)
+    arf = create_arf(egrid[:-1], egrid[1:], specresp)
+    outfile = str(tmp_path / "test.arf")
+    write_arf(outfile, arf, ascii=False)
+    return outfile
+
+
+def make_cc(arffile, **kwargs):
+    mdl = PowLaw1D()
+    return color_color.ColorColor(mdl, arffile, **kwargs), mdl
+
+
+@pytest.mark.parametrize("lo,hi", BANDS)
+def test_sum_matches_calc_data_sum(lo, hi, arffile):
+
+    (cc, _) = make_cc(arffile)
+    rng = np.random.default_rng(2376)
+    cc.pha.counts = rng.poisson(5, size=cc.pha.channel.size).astype(float)
+
+    expected = calc_data_sum(cc.pha, lo, hi)
+    assert cc.sum(lo, hi) == pytest.approx(expected)
+
+    # The channels are re-used, and the dataset filter is not changed
+    assert cc.sum(lo, hi) == pytest.approx(expected)
+    assert cc.pha.mask is True
+
+
+def test_sum_after_fakeit(arffile):
+
+    (cc, _) = make_cc(arffile)
+    np.random.seed(823)
+    cc.fakeit()
+    for (lo, hi) in BANDS:
+        assert cc.sum(lo, hi) == pytest.approx(calc_data_sum(cc.pha, lo, hi))
+
+
+def run(arffile, nproc, cache_models=False):
+
+    (cc, mdl) = make_cc(arffile, nproc=nproc, cache_models=cache_models)
+    gamma = color_color.ModelParameter(mdl.gamma, [1, 2],
+                                       fine_grid_resolution=3)
+    ampl = color_color.ModelParameter(mdl.ampl, [1, 2, 4],
+                                      fine_grid_resolution=3)
+
+    soft = color_color.EnergyBand(0.5, 1.2, 'S')
+    medium = color_color.EnergyBand(1.2, 2.0, 'M')
+    hard = color_color.EnergyBand(2.0, 7.0, 'H')
+    broad = color_color.EnergyBand(0.5, 7.0, 'B')
+
+    np.random.seed(9283)
+    return cc(gamma, ampl, soft, medium, hard, broad).matrix
+
+
+def test_eval_models_matches_fakeit(arffile):
+
+    (cc, mdl) = make_cc(arffile, nproc=2)
+    points = [(1.0, 1.0, 1.0), (2.0, 1.0, 3.0), (1.5, 1.0, 0.5)]
+    ymodels = cc.eval_models(points)
+    assert len(ymodels) == 3
+
+    for vals, ymodel in zip(points, ymodels):
+        color_color._set_par_values(mdl, vals)
+        expected = cc.pha.eval_model(cc.pha.get_full_response()(mdl))
+        assert ymodel == pytest.approx(expected)
+
+    # The parameters are left at the last set of values
+    assert cc._par_values() == points[-1]
+
+
+@pytest.mark.parametrize("nproc,cache_models",
+                         [(2, False), (3, True), (None, False)])
+def test_nproc_matches_serial(nproc, cache_models, arffile):
+    """The seeded results do not depend on the number of processes"""
+
+    expected = run(arffile, 1)
+    got = run(arffile, nproc, cache_models=cache_models)
+
+    assert got.keys() == expected.keys()
+    for key, vals in expected.items():
+        assert len(got[key]) == len(vals)
+        for gval, evals in zip(got[key], vals):
+            assert gval == pytest.approx(evals, nan_ok=True)
@@ -0,0 +1,284 @@
+"""Check the array versions of the coords.chandra converters.
+
+The pixlib and WCS transforms are replaced by simple versions, so
+these tests check the shape and type of the outputs rather than the
+actual coordinate values.
+"""
+
+import importlib
+import sys
+from types import SimpleNamespace
+
+import numpy as np
+
+import pytest
+
+
+CDELT = [-0.492 / 3600, 0.492 / 3600]
+CRPIX = np.asarray([4096.5, 4096.5])
+CRVAL = np.asarray([351.0, 58.9])
+
+
+class FakeTan:
+    """A linear version of the tangent-plane transform."""
+
+    def __init__(self, crval):
+        self.crval = np.asarray(crval)
+
+    def apply(self, xy):
+        xy = np.asarray(xy)
+        assert xy.ndim == 2 and xy.shape[1] == 2
+        return self.crval + (xy - CRPIX) * CDELT
+
+    def invert(self, rd):
+        rd = np.asarray(rd)
+        assert rd.ndim == 2 and rd.shape[1] == 2
+        return CRPIX + (rd - self.crval) / CDELT
+
+
+class FakePixlib:
+    """There is one 1024 by 1024 chip, ccd_id=7, centered on the
+    aim point."""
+
+    def fpc2msc(self, dxy):
+        assert len(dxy) == 2
+        dx = dxy[0] - CRPIX[0]
+        dy = dxy[1] - CRPIX[1]
+        theta = np.hypot(dx, dy) * 0.492 / 3600
+        phi = np.rad2deg(np.arctan2(dy, dx)) % 360
+        return (10065.5, theta, phi)
+
+    def fpc2chip(self, dxy):
+        assert len(dxy) == 2
+        chipx = dxy[0] - CRPIX[0] + 512.5
+        chipy = dxy[1] - CRPIX[1] + 512.5
+        if 0.5 <= chipx <= 1024.5 and 0.5 <= chipy <= 1024.5:
+            return (7, (chipx, chipy))
+
+        return (-1, (chipx, chipy))
+
+
+def fake_setup(keyword_list):
+    return (FakePixlib(), FakeTan(CRVAL), FakeTan(CRVAL), CDELT)
+
+
+def import_fresh(monkeypatch, name):
+    monkeypatch.delitem(sys.modules, name, raising=False)
+    module = importlib.import_module(name)
+    monkeypatch.setitem(sys.modules, name, module)
+    return module
+
+
+@pytest.fixture
+def chandra(monkeypatch):
+    """Import coords.chandra, using dummy modules for the CIAO
+    modules that are not needed."""
+
+    for name, attrs in [("pycrates", {"read_file": None}),
+                        ("pixlib", {"Pixlib": None}),
+                        ("caldb4", {})]:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            monkeypatch.setitem(sys.modules, name, SimpleNamespace(**attrs))
+
+    module = import_fresh(monkeypatch, "coords.chandra")
+    monkeypatch.setattr(module, "_setup", fake_setup)
+    return module
+
+
+KEYS = ["pixsize", "theta", "phi", "detx", "dety", "chip", "chip_id",
+        "chipx", "chipy"]
+
+
+def check_arrays(out, npts, names):
+    assert set(out.keys()) == set(KEYS + names)
+    assert out["pixsize"] == pytest.approx(0.492)
+
+    for name in ["theta", "phi", "detx", "dety", "chipx", "chipy"] + names:
+        assert isinstance(out[name], np.ndarray)
+        assert out[name].shape == (npts,)
+        assert out[name].dtype == np.float64
+
+    assert out["chip"].shape == (npts,)
+    assert out["chip_id"].shape == (npts,)
+    assert out["chip_id"].dtype == np.int32
+
+    # The chip fields are views of the structured array
+    for name in ["chip_id", "chipx", "chipy"]:
+        assert (out[name] == out["chip"][name]).all()
+        if npts > 0:
+            assert np.shares_memory(out[name], out["chip"])
+
+
+def test_chip_dtype(chandra):
+    assert chandra.CHIP_DTYPE.names == ("chip_id", "chipx", "chipy")
+    assert chandra.CHIP_DTYPE["chip_id"] == np.int32
+    assert chandra.CHIP_DTYPE["chipx"] == np.float64
+    assert chandra.CHIP_DTYPE["chipy"] == np.float64
+
+
+@pytest.mark.parametrize("x,y,npts",
+                         [(4096.5, 4096.5, 1),
+                          (np.float32(4000), 4100, 1),
+                          ([4096.5], [4096.5], 1),
+                          ([4096.5, 4200, 6000], [4096.5, 4000, 6000], 3),
+                          (np.arange(4000, 4010), np.arange(4010, 4000, -1),
+                           10),
+                          ([], [], 0)])
+def test_sky_to_chandra_array(x, y, npts, chandra):
+
+    out = chandra.sky_to_chandra_array({}, x, y)
+    check_arrays(out, npts, ["ra", "dec"])
+    assert out["chip"].dtype == chandra.CHIP_DTYPE
+
+
+@pytest.mark.parametrize("ra,dec,npts",
+                         [(351.0, 58.9, 1),
+                          ([351.0, 351.1], [58.9, 58.8], 2),
+                          (np.asarray([]), np.asarray([]), 0)])
+def test_cel_to_chandra_array(ra, dec, npts, chandra):
+
+    out = chandra.cel_to_chandra_array({}, ra, dec)
+    check_arrays(out, npts, ["x", "y"])
+    assert out["chip"].dtype == chandra.CHIP_DTYPE
+
+
+def test_off_chip(chandra):
+
+    out = chandra.sky_to_chandra_array({}, [4096.5, 6000], [4096.5, 6000])
+    assert out["chip_id"].tolist() == [7, -999]
+    assert out["chipx"].tolist() == [512.5, -999]
+    assert out["chipy"].tolist() == [512.5, -999]
+
+
+def test_round_trip(chandra):
+
+    x = np.asarray([4096.5, 4000, 4500])
+    y = np.asarray([4096.5, 4300, 3900])
+    sky = chandra.sky_to_chandra_array({}, x, y)
+    cel = chandra.cel_to_chandra_array({}, sky["ra"], sky["dec"])
+    assert cel["x"] == pytest.approx(x)
+    assert cel["y"] == pytest.approx(y)
+    for name in ["theta", "phi", "detx", "dety", "chipx", "chipy"]:
+        assert cel[name] == pytest.approx(sky[name])
+
+    assert (cel["chip_id"] == sky["chip_id"]).all()
+
+
+@pytest.mark.parametrize("x,y", [([1, 2], [3]), ([[1, 2]], [[3, 4]])])
+def test_array_invalid(x, y, chandra):
+
+    with pytest.raises(ValueError):
+        chandra.sky_to_chandra_array({}, x, y)
+
+    with pytest.raises(ValueError):
+        chandra.cel_to_chandra_array({}, x, y)
+
+
+@pytest.mark.parametrize("x,y", [(4096.5, 4096.5),
+                                 ([4096.5, 6000], [4096.5, 6000])])
+def test_list_versions(x, y, chandra):
+    """The original routines return lists"""
+
+    expected = chandra.sky_to_chandra_array({}, x, y)
+    out = chandra.sky_to_chandra({}, x, y)
+    assert set(out.keys()) == set(expected.keys()) - {"chip"}
+    assert out["pixsize"] == expected["pixsize"]
+    for name, vals in out.items():
+        if name == "pixsize":
+            continue
+
+        assert isinstance(vals, list)
+        assert vals == expected[name].tolist()
+
+    assert all(isinstance(v, int) for v in out["chip_id"])
+
+    cel = chandra.cel_to_chandra({}, out["ra"], out["dec"])
+    assert isinstance(cel["x"], list)
+    assert cel["x"] == pytest.approx(np.atleast_1d(x))
+
+
+@pytest.fixture
+def iocaldb(chandra, monkeypatch):
+    """The criss_cross converters, using the fake transforms."""
+
+    return import_fresh(monkeypatch, "ciao_contrib.criss_cross.iocaldb")
+
+
+def test_criss_cross_sky2chandra(iocaldb):
+    """The converter now returns arrays, for scalar and array input"""
+
+    conv = iocaldb.Sky2Chandra.__new__(iocaldb.Sky2Chandra)
+    conv.keywords = {}
+
+    out = conv(4096.5, 4096.5)
+    assert out["theta"].shape == (1,)
+    assert out["chip_id"][0] == 7
+    assert out["chipx"][0] == pytest.approx(512.5)
+
+    # As used by pnt_src_masking_region and counts_circle_band
+    assert float(out["theta"][0]) == pytest.approx(0)
+
+    # As used by pntsrc_confuse_wave, where the selection can be empty
+    x = np.asarray([[4096.5, 4200], [6000, 4000]])
+    y = np.asarray([[4096.5, 4000], [6000, 4100]])
+    for confusion in [np.asarray([[True, False], [True, True]]),
+                      np.zeros((2, 2), dtype=bool)]:
+        chipx = np.zeros(x.shape)
+        ccd_id = np.zeros(x.shape)
+        pos = conv(x.ravel()[confusion.ravel()], y.ravel()[confusion.ravel()])
+        chipx.ravel()[confusion.ravel()] = pos["chipx"]
+        ccd_id.ravel()[confusion.ravel()] = pos["chip_id"]
+        assert (chipx[~confusion] == 0).all()
+        assert (ccd_id[confusion] == pos["chip_id"]).all()
+
+
+def test_criss_cross_cel2chandra(iocaldb):
+    """As used by calc_physical_coords"""
+
+    conv = iocaldb.Cel2Chandra.__new__(iocaldb.Cel2Chandra)
+    conv.keywords = {}
+
+    ra = np.asarray([351.0, 351.01, 350.99])
+    dec = np.asarray([58.9, 58.91, 58.89])
+    src = conv(ra, dec)
+    pos = np.stack([src["x"], src["y"]], axis=-1)
+    assert pos.shape == (3, 2)
+    assert len(src["x"]) == 3
+    assert src["theta"].shape == (3,)
+    assert src["phi"].dtype == np.float64
+
+
+def column(values):
+    return SimpleNamespace(values=np.asarray(values))
+
+
+def test_criss_cross_osip(iocaldb):
+    """The OSIP lookup uses the first element of the converted values"""
+
+    conv = iocaldb.Sky2Chandra.__new__(iocaldb.Sky2Chandra)
+    conv.keywords = {}
+
+    cols = {"ccd_id": column([7, 7]),
+            "chipx_min": column([1, 513]),
+            "chipx_max": column([512, 1024]),
+            "chipy_min": column([1, 1]),
+            "chipy_max": column([1024, 1024]),
+            "npoints": column([2, 2]),
+            "energy": column([[1000, 2000], [1000, 2000]]),
+            "energ_lo": column([[800, 1800], [900, 1900]]),
+            "energ_hi": column([[1200, 2200], [1100, 2100]]),
+            "fracresp": column([[0.9, 0.8], [0.95, 0.85]])}
+
+    osip = iocaldb.OSIP.__new__(iocaldb.OSIP)
+    osip.skyconverter = conv
+    osip.osip = SimpleNamespace(get_column=cols.get,
+                                get_filename=lambda: "osip.fits")
+
+    lo, hi, frac = osip(4096.5, 4096.5, 1500)
+    assert lo == pytest.approx(1300)
+    assert hi == pytest.approx(1700)
+    assert frac == pytest.approx(0.85)
+
+    assert np.isnan(osip(6000, 6000, 1500)).all()
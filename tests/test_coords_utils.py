@@ -0,0 +1,131 @@
+"""Check the sky index in coords.utils"""
+
+import sys
+
+import numpy as np
+
+import pytest
+
+from coords import utils
+
+
+def random_positions(n, seed, spread=180.0):
+    rng = np.random.default_rng(seed)
+    ra = rng.uniform(0, 360, size=n)
+    dec = np.rad2deg(np.arcsin(rng.uniform(-1, 1, size=n))) * spread / 90
+    return ra, np.clip(dec, -90, 90)
+
+
+@pytest.fixture(params=[True, False], ids=["scipy", "numpy"])
+def use_scipy(request, monkeypatch):
+    """Run the test with and without scipy."""
+    if request.param:
+        pytest.importorskip("scipy.spatial")
+    else:
+        monkeypatch.setitem(sys.modules, "scipy.spatial", None)
+
+
+def brute_force(ra, dec, qra, qdec):
+    """The separation between every query and indexed position."""
+    return np.asarray([[utils.point_separation(r, d, x, y)
+                        for (r, d) in zip(ra, dec)]
+                       for (x, y) in zip(qra, qdec)])
+
+
+@pytest.mark.parametrize("k", [1, 3])
+def test_query_nearest(k, use_scipy):
+
+    ra, dec = random_positions(200, 9283)
+    qra, qdec = random_positions(30, 1276)
+
+    index = utils.SkyIndex(ra, dec)
+    idx, sep = index.query_nearest(qra, qdec, k=k)
+    assert idx.shape == (30, k)
+    assert sep.shape == (30, k)
+
+    seps = brute_force(ra, dec, qra, qdec)
+    expected = np.argsort(seps, axis=1)[:, :k]
+    assert (idx == expected).all()
+    assert sep == pytest.approx(np.take_along_axis(seps, expected, axis=1))
+
+
+def test_query_nearest_matches_radius(use_scipy):
+    """With a large radius the same matches are found"""
+
+    ra, dec = random_positions(100, 23, spread=2)
+    qra, qdec = random_positions(20, 87, spread=2)
+
+    index = utils.SkyIndex(ra, dec)
+    idx1, sep1 = index.query_nearest(qra, qdec, k=2)
+    idx2, sep2 = index.query_nearest(qra, qdec, k=2, radius=180)
+    assert (idx1 == idx2).all()
+    assert sep1 == pytest.approx(sep2)
+
+
+def test_query_nearest_k_too_large(use_scipy):
+
+    index = utils.SkyIndex([10, 10.1], [20, 20])
+    idx, sep = index.query_nearest([10.09, 30], [20, -20], k=3)
+    assert (idx[:, :2] == [[1, 0], [1, 0]]).all()
+    assert (idx[:, 2] == -1).all()
+    assert np.isinf(sep[:, 2]).all()
+    assert np.isfinite(sep[:, :2]).all()
+
+
+def test_query_nearest_radius():
+
+    index = utils.SkyIndex([10, 10.1], [20, 20])
+    idx, sep = index.query_nearest([10.09, 30], [20, -20], k=2,
+                                   radius=0.05)
+    assert (idx == [[1, -1], [-1, -1]]).all()
+    assert np.isinf(sep[0, 1])
+    assert np.isinf(sep[1]).all()
+
+
+def test_query_nearest_empty(use_scipy):
+
+    index = utils.SkyIndex([], [])
+    idx, sep = index.query_nearest([10, 20], [0, 0])
+    assert (idx == -1).all()
+    assert np.isinf(sep).all()
+
+    index = utils.SkyIndex([10], [20])
+    idx, sep = index.query_nearest([], [])
+    assert idx.shape == (0, 1)
+
+
+def test_query_nearest_invalid_k():
+
+    index = utils.SkyIndex([10], [20])
+    with pytest.raises(ValueError):
+        index.query_nearest([10], [20], k=0)
+
+
+def test_query_nearest_clustered(monkeypatch):
+    """Without scipy the radius grows until matches are found"""
+
+    monkeypatch.setitem(sys.modules, "scipy.spatial", None)
+
+    ra, dec = random_positions(50, 72, spread=0.01)
+    qra = np.asarray([0.001, 90.0, 200.0])
+    qdec = np.asarray([0.0, 45.0, -80.0])
+
+    index = utils.SkyIndex(ra, dec)
+    radii = []
+    query_radius = index.query_radius
+
+    def record(qra, qdec, radius):
+        radii.append(radius)
+        return query_radius(qra, qdec, radius)
+
+    monkeypatch.setattr(index, "query_radius", record)
+
+    idx, sep = index.query_nearest(qra, qdec, k=2)
+    seps = brute_force(ra, dec, qra, qdec)
+    expected = np.argsort(seps, axis=1)[:, :2]
+    assert (idx == expected).all()
+    assert sep == pytest.approx(np.take_along_axis(seps, expected, axis=1))
+
+    assert radii == sorted(radii)
+    assert radii[0] == pytest.approx(utils.NEAREST_START_RADIUS)
+    assert radii[-1] <= 180
@@ -0,0 +1,124 @@
+"""Check the coordinate conversion in crates_contrib.utils"""
+
+import numpy as np
+
+import pytest
+
+from crates_contrib import utils
+
+
+class FakeTransform:
+    """Provide the parts of the pytransform interface that are used,
+    counting the number of calls."""
+
+    def __init__(self, classname, scale, offset):
+        self.classname = classname
+        self.scale = np.asarray(scale)
+        self.offset = np.asarray(offset)
+        self.ncalls = 0
+
+    def get_className(self):
+        return self.classname
+
+    def copy(self):
+        return self
+
+    def apply(self, pts):
+        self.ncalls += 1
+        return np.asarray(pts) * self.scale + self.offset
+
+    def invert(self, pts):
+        self.ncalls += 1
+        return (np.asarray(pts) - self.offset) / self.scale
+
+
+class FakeCrate:
+
+    def __init__(self):
+        self.transforms = {
+            "sky": FakeTransform("LINEAR2DTransform", [0.5, 0.5],
+                                 [3000.5, 4000.5]),
+            "EQPOS": FakeTransform("WCSTransform", [-1e-4, 1e-4],
+                                   [150.0, 2.0])
+        }
+
+    def get_filename(self):
+        return "fake.img"
+
+    def get_axisnames(self):
+        return ["sky(x,y)", "EQPOS(RA,Dec)"]
+
+    def get_transform(self, name):
+        return self.transforms[name]
+
+
+@pytest.fixture
+def crate():
+    return FakeCrate()
+
+
+def test_convert_chain(crate):
+    """logical to world uses both transforms, one call each"""
+
+    tr = utils.SimpleCoordTransform(crate)
+    x = np.arange(12).reshape(3, 4)
+    y = x + 10
+    ra, dec = tr.convert("image", "eqpos", x, y)
+
+    assert ra.shape == (3, 4)
+    assert dec.shape == (3, 4)
+    assert ra == pytest.approx(150.0 - 1e-4 * (0.5 * x + 3000.5))
+    assert dec == pytest.approx(2.0 + 1e-4 * (0.5 * y + 4000.5))
+
+    assert crate.transforms["sky"].ncalls == 1
+    assert crate.transforms["EQPOS"].ncalls == 1
+
+
+def test_convert_round_trip(crate):
+    tr = utils.SimpleCoordTransform(crate)
+    x = np.linspace(1, 1024, 1000)
+    y = x[::-1]
+    ra, dec = tr.convert("logical", "world", x, y)
+    xl, yl = tr.convert("world", "logical", ra, dec)
+    assert xl == pytest.approx(x)
+    assert yl == pytest.approx(y)
+
+
+def test_convert_scalar_broadcast(crate):
+    tr = utils.SimpleCoordTransform(crate)
+    xs, ys = tr.convert("image", "sky", 2, [1, 2, 3])
+    assert xs == pytest.approx([3001.5, 3001.5, 3001.5])
+    assert ys == pytest.approx([4001, 4001.5, 4002])
+
+    xs, ys = tr.convert("image", "sky", 2, 4)
+    assert xs.shape == ()
+    assert xs == pytest.approx(3001.5)
+    assert ys == pytest.approx(4002.5)
+
+
+def test_convert_empty(crate):
+    tr = utils.SimpleCoordTransform(crate)
+    xs, ys = tr.convert("image", "sky", [], [])
+    assert xs.shape == (0,)
+    assert ys.shape == (0,)
+    assert crate.transforms["sky"].ncalls == 0
+
+
+def test_read_ds9_contours(crate, tmp_path):
+
+    infile = tmp_path / "ds9.con"
+    infile.write_text("1 2\n3 4\n5 6\n\n7 8\n\n9 10\n11 12\n")
+
+    xs, ys = utils.read_ds9_contours(str(infile))
+    assert len(xs) == 3
+    assert xs[0] == pytest.approx([1, 3, 5])
+    assert ys[2] == pytest.approx([10, 12])
+
+    # All the contours are converted with a single call
+    xc, yc = utils.read_ds9_contours(str(infile), coords=crate,
+                                     fromsys="sky", tosys="image")
+    assert crate.transforms["sky"].ncalls == 1
+    assert len(xc) == 3
+    assert [len(v) for v in yc] == [3, 1, 2]
+    assert xc[1] == pytest.approx([(7 - 3000.5) / 0.5])
+    assert yc[2] == pytest.approx([(10 - 4000.5) / 0.5, (12 - 4000.5) / 0.5])
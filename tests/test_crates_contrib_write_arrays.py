@@ -0,0 +1,49 @@
+"""Check crates_contrib.utils.write_arrays"""
+
+import numpy as np
+
+import pytest
+
+from crates_contrib import utils
+
+
+def test_write_arrays(tmp_path):
+    outfile = tmp_path / "out.dat"
+    utils.write_arrays(str(outfile), [[0, 1, 2], [1.5, 2, 1e-5]],
+                       fields=["a", "b"])
+    assert outfile.read_text() == "#a b\n0 1.5\n1 2\n2 1e-05\n"
+
+
+def test_write_arrays_options(tmp_path):
+    outfile = tmp_path / "out.dat"
+    utils.write_arrays(str(outfile), [[1, 2], [3, 4]], fields=["x", "y"],
+                       sep="%", comment="!", linebreak="\r\n",
+                       format="%.1f%%")
+    assert outfile.read_bytes() == b"!x%y\r\n1.0%%3.0%\r\n2.0%%4.0%\r\n"
+
+
+def test_write_arrays_strings(tmp_path):
+    """This uses the element-by-element conversion"""
+    outfile = tmp_path / "out.dat"
+    utils.write_arrays(str(outfile), [["a", "bb"], ["cc", "d"]],
+                       format="%s")
+    assert outfile.read_text() == "a cc\nbb d\n"
+
+
+def test_write_arrays_empty(tmp_path):
+    outfile = tmp_path / "out.dat"
+    utils.write_arrays(str(outfile), [[], []])
+    assert outfile.read_text() == "\n"
+
+
+@pytest.mark.parametrize("nproc", [1, 2])
+def test_write_arrays_chunks(nproc, tmp_path, monkeypatch):
+    monkeypatch.setattr(utils, "WRITE_CHUNK_SIZE", 10)
+
+    x = np.arange(23)
+    y = x * 0.5
+    outfile = tmp_path / "out.dat"
+    utils.write_arrays(str(outfile), [x, y], nproc=nproc)
+
+    expected = "".join(f"{a:g} {b:g}\n" for a, b in zip(x, y))
+    assert outfile.read_text() == expected
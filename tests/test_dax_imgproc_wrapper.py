@@ -0,0 +1,196 @@
+"""Check the cache used by the dax image tasks"""
+
+import json
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+from dax import imgproc_wrapper
+
+
+DS9_STATE = {"frame": "1",
+             "file": "/data/evt2.fits[sky=region(src.reg)]",
+             "crop image": "4096.5 4096.5 512 512",
+             "block": "1",
+             "bin filter": "energy=500:7000",
+             "fits header": "SIMPLE = T\nEND",
+             "bin factor": "1 1",
+             "bin function": "sum",
+             "bin buffersize": "1024",
+             "bin about": "4096.5 4096.5",
+             "bin cols": "x y"}
+
+
+def make_xpaget(state):
+    """Stub the ds9 XPA access."""
+
+    def xpaget(args):
+        if not isinstance(args, str):
+            args = " ".join(args)
+        return state[args]
+
+    return xpaget
+
+
+@pytest.fixture
+def session(tmp_path, monkeypatch):
+    """A session with the cache enabled."""
+
+    monkeypatch.setitem(sys.modules, "paramio",
+                        SimpleNamespace(pget=lambda tool, par: "yes"))
+    return imgproc_wrapper.DaxSession(make_xpaget(dict(DS9_STATE)),
+                                      str(tmp_path))
+
+
+def test_cache_disabled(tmp_path, monkeypatch):
+
+    monkeypatch.setitem(sys.modules, "paramio",
+                        SimpleNamespace(pget=lambda tool, par: "no"))
+    sess = imgproc_wrapper.DaxSession(make_xpaget(DS9_STATE), str(tmp_path))
+    assert not sess.enabled
+    assert sess.image_key() is None
+    assert not (tmp_path / "dax_cache").exists()
+
+
+def test_image_key(session):
+
+    key = session.image_key()
+    assert key is not None
+    assert session.image_key() == key
+
+
+@pytest.mark.parametrize("name,value",
+                         [("frame", "2"), ("crop image", "4096.5 4096.5 256 256"),
+                          ("block", "2"), ("bin filter", ""),
+                          ("bin factor", "2 2"), ("bin function", "average"),
+                          ("bin about", "4000 4000"), ("bin cols", "chipx chipy"),
+                          ("fits header", "SIMPLE = T\nOBJECT = 'x'\nEND")])
+def test_image_key_changes(name, value, session):
+
+    key = session.image_key()
+
+    state = dict(DS9_STATE)
+    state[name] = value
+    session.xpaget = make_xpaget(state)
+    assert session.image_key() != key
+
+
+TOOL = "dmimgblob infile={} outfile={} threshold=3 srconly=yes"
+
+
+def test_output_key_substitutes_image_keys():
+
+    tool1 = TOOL.format("/tmp/ds9_abc.fits", "/tmp/out_abc.fits")
+    tool2 = TOOL.format("/tmp/ds9_xyz.fits", "/tmp/out_xyz.fits")
+
+    key1 = imgproc_wrapper.DaxSession.output_key(tool1, "/tmp/out_abc.fits",
+                                                 {"/tmp/ds9_abc.fits": "img1"})
+    key2 = imgproc_wrapper.DaxSession.output_key(tool2, "/tmp/out_xyz.fits",
+                                                 {"/tmp/ds9_xyz.fits": "img1"})
+    assert key1 is not None
+    assert key1 == key2
+
+    # A different image
+    key3 = imgproc_wrapper.DaxSession.output_key(tool2, "/tmp/out_xyz.fits",
+                                                 {"/tmp/ds9_xyz.fits": "img2"})
+    assert key3 != key1
+
+    # Different settings
+    tool4 = tool2.replace("threshold=3", "threshold=4")
+    key4 = imgproc_wrapper.DaxSession.output_key(tool4, "/tmp/out_xyz.fits",
+                                                 {"/tmp/ds9_xyz.fits": "img1"})
+    assert key4 != key1
+
+
+def test_output_key_no_image_key():
+
+    tool = TOOL.format("/tmp/ds9_abc.fits", "/tmp/out_abc.fits")
+    assert imgproc_wrapper.DaxSession.output_key(tool, "/tmp/out_abc.fits",
+                                                 {"/tmp/ds9_abc.fits": None}) is None
+
+
+def test_output_key_derived_from_outfile():
+    """Temporary files named after outfile have unknown contents"""
+
+    tool = ("arestore infile=/tmp/ds9_abc.fits outfile=/tmp/out_abc.fits "
+            "psffile=/tmp/out_abc.fits_psf.fits")
+    assert imgproc_wrapper.DaxSession.output_key(tool, "/tmp/out_abc.fits",
+                                                 {"/tmp/ds9_abc.fits": "img1"}) is None
+
+
+def test_store_image_evicts_oldest(session, tmp_path):
+
+    def make_image(i):
+        infile = tmp_path / f"in{i}.fits"
+        infile.write_bytes(f"image {i}".encode())
+        return str(infile)
+
+    for i in range(6):
+        session.store_image(f"k{i}", make_image(i))
+        cached = session._image_name(f"k{i}")
+        os.utime(cached, (1000 + i, 1000 + i))
+
+    names = sorted(os.listdir(session.cachedir))
+    assert names == [f"img_k{i}.fits" for i in range(2, 6)]
+
+    # Using an image makes it the most recent, so it is kept
+    outfile = tmp_path / "out.fits"
+    assert session.copy_image("k2", str(outfile))
+    assert outfile.read_bytes() == b"image 2"
+    session.store_image("k6", make_image(6))
+
+    names = sorted(os.listdir(session.cachedir))
+    assert names == [f"img_k{i}.fits" for i in [2, 4, 5, 6]]
+
+    assert not session.copy_image("k0", str(outfile))
+    assert not session.copy_image(None, str(outfile))
+
+
+def test_store_image_no_key(session, tmp_path):
+
+    infile = tmp_path / "in.fits"
+    infile.write_bytes(b"image")
+    session.store_image(None, str(infile))
+    assert os.listdir(session.cachedir) == []
+
+
+def test_store_output(session, tmp_path):
+
+    session.max_outputs = 3
+    outfiles = []
+    for i in range(5):
+        outfile = tmp_path / f"out{i}.fits"
+        outfile.write_bytes(f"output {i}".encode())
+        outfiles.append(outfile)
+        session.store_output(f"k{i}", str(outfile), f"screen {i}")
+
+    with open(session.outputs, encoding="utf-8") as fh:
+        outputs = json.load(fh)
+
+    assert list(outputs) == ["k2", "k3", "k4"]
+    assert outputs["k3"] == [str(outfiles[3]), "screen 3"]
+
+    newfile = tmp_path / "new.fits"
+    assert session.copy_output("k3", str(newfile)) == "screen 3"
+    assert newfile.read_bytes() == b"output 3"
+    assert session.copy_output("k0", str(newfile)) is None
+    assert session.copy_output(None, str(newfile)) is None
+
+    # Entries whose files have been removed are dropped
+    outfiles[2].unlink()
+    assert session.copy_output("k2", str(newfile)) is None
+
+    session.store_output("k3", str(outfiles[3]), None)
+    with open(session.outputs, encoding="utf-8") as fh:
+        outputs = json.load(fh)
+
+    assert list(outputs) == ["k4", "k3"]
+    assert outputs["k3"] == [str(outfiles[3]), ""]
+
+
+def test_store_output_missing_file(session, tmp_path):
+
+    session.store_output("k0", str(tmp_path / "missing.fits"), "screen")
+    assert not os.path.exists(session.outputs)
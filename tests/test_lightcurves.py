@@ -0,0 +1,99 @@
+"""Check the event-binning code in lightcurves"""
+
+import numpy as np
+
+import pytest
+
+import lightcurves
+
+
+def overlap(lo, hi, gtistart, gtistop):
+    """The time in the GTIs between lo and hi, one GTI at a time."""
+    return sum(max(0.0, min(hi, t1) - max(lo, t0))
+               for t0, t1 in zip(gtistart, gtistop))
+
+
+GTISTART = np.asarray([100.0, 250.0, 400.0])
+GTISTOP = np.asarray([200.0, 300.0, 650.0])
+
+
+def test_gti_time_before():
+
+    t = np.asarray([0.0, 100.0, 150.0, 200.0, 220.0, 260.0, 400.0, 1000.0])
+    got = lightcurves._gti_time_before(t, GTISTART, GTISTOP)
+    expected = [overlap(-np.inf, x, GTISTART, GTISTOP) for x in t]
+    assert got == pytest.approx(expected)
+
+
+@pytest.mark.parametrize("gti", [False, True])
+def test_bin_event_times(gti):
+
+    rng = np.random.default_rng(9823)
+    tstart = 90.0
+    tstop = 700.0
+    times = rng.uniform(tstart, tstop, size=500)
+    dtcor = 0.9
+
+    curves = lightcurves.bin_event_times(times, [7.5, 50, 1000], tstart,
+                                         tstop, dtcor=dtcor,
+                                         gti=(GTISTART, GTISTOP) if gti else None,
+                                         labels={"OBJECT": "x"})
+    assert len(curves) == 3
+
+    gtistart = GTISTART if gti else [tstart]
+    gtistop = GTISTOP if gti else [tstop]
+    for binsize, curve in zip([7.5, 50, 1000], curves):
+        assert curve["labels"] == {"OBJECT": "x", "TIMEDEL": binsize}
+        assert curve["time_min"][0] == tstart
+        assert curve["time_max"][-1] >= tstop
+        assert curve["time_max"] - curve["time_min"] == pytest.approx(binsize)
+
+        counts = [np.sum((times >= lo) & (times < hi))
+                  for lo, hi in zip(curve["time_min"], curve["time_max"])]
+        assert curve["counts"] == pytest.approx(counts)
+        assert curve["counts"].sum() == times.size
+
+        exposure = [dtcor * overlap(lo, hi, gtistart, gtistop)
+                    for lo, hi in zip(curve["time_min"], curve["time_max"])]
+        assert curve["exposure"] == pytest.approx(exposure)
+
+
+def test_bin_event_times_invalid_binsize():
+    with pytest.raises(ValueError):
+        lightcurves.bin_event_times([1, 2], [0], 0, 10)
+
+
+@pytest.mark.parametrize("evtfile,expected",
+                         [("evt.fits", None),
+                          ("evt.fits[energy=500:7000]", None),
+                          ("evt.fits[cols time,energy]", None),
+                          ("evt.fits[exptime=1:2]", None),
+                          ("evt.fits[time=120:500]", [[(120, 500)]]),
+                          ("evt.fits[ccd_id=7,TIME=:150,260:]",
+                           [[(None, 150), (260, None)]]),
+                          ("evt.fits[time=1:2][time=3:4,energy=1:2]",
+                           [[(1, 2)], [(3, 4)]])])
+def test_time_filter_ranges(evtfile, expected):
+    assert lightcurves._time_filter_ranges(evtfile) == expected
+
+
+def test_time_filter_ranges_unsupported():
+    with pytest.raises(ValueError):
+        lightcurves._time_filter_ranges("evt.fits[time=120]")
+
+
+def test_intersect_gti():
+
+    (start, stop) = lightcurves._intersect_gti(GTISTART, GTISTOP,
+                                               [(280, 450), (None, 150),
+                                                (430, 500), (600, None)])
+    assert start == pytest.approx([100, 280, 400, 600])
+    assert stop == pytest.approx([150, 300, 500, 650])
+
+
+def test_intersect_gti_no_overlap():
+
+    (start, stop) = lightcurves._intersect_gti(GTISTART, GTISTOP,
+                                               [(700, 800)])
+    assert start.size == 0
+    assert stop.size == 0
@@ -751,3 +751,70 @@ def test_verbosity_set_str(verbose5, caplog):
     check(2, f'Validating dmimg2jpg.infile val={infile} as ...')
     check(3, '... something else')
     check(4, f"Setting dmimg2jpg.infile to {infile} (<class 'str'>)")
+
+
+@pytest.mark.parametrize("nproc", [1, 2])
+def test_update_header_keys(nproc, tmp_path):
+    """Check we can add, change, and delete keywords in several files."""
+
+    import pycrates
+
+    infiles = []
+    for idx in range(3):
+        cr = pycrates.TABLECrate()
+        cr.name = "TEST"
+        col = pycrates.CrateData()
+        col.name = "x"
+        col.values = [1, 2, 3]
+        cr.add_column(col)
+        pycrates.set_key(cr, "OBJECT", "ORIG")
+        pycrates.set_key(cr, "ASPTYPE", "KALMAN")
+
+        infile = str(tmp_path / f"test{idx}.fits")
+        cr.write(infile)
+        infiles.append(infile)
+
+    rt.update_header_keys(infiles,
+                          {"OBJECT": "NEW",
+                           "EXPOSURE": (1234.5, "s", "Exposure time"),
+                           "ASPTYPE": None},
+                          nproc=nproc)
+
+    for infile in infiles:
+        cr = pycrates.read_file(infile)
+        assert cr.get_key_value("OBJECT") == "NEW"
+        assert cr.get_key_value("EXPOSURE") == pytest.approx(1234.5)
+        assert cr.get_key("EXPOSURE").unit == "s"
+        assert cr.get_key("EXPOSURE").desc == "Exposure time"
+        assert cr.get_key("ASPTYPE") is None
+
+
+def test_submit(tmp_path):
+    """Check we can run several copies of a tool at the same time."""
+
+    import pycrates
+
+    infiles = []
+    for idx in range(4):
+        cr = pycrates.TABLECrate()
+        cr.name = "TEST"
+        col = pycrates.CrateData()
+        col.name = "x"
+        col.values = [idx, idx + 1, idx + 2]
+        cr.add_column(col)
+
+        infile = str(tmp_path / f"test{idx}.fits")
+        cr.write(infile)
+        infiles.append(infile)
+
+    tool = rt.make_tool("dmstat")
+    futs = [tool.submit(f"{infile}[cols x]", centroid=False)
+            for infile in infiles]
+
+    for idx, fut in enumerate(futs):
+        assert fut.result() is not None
+        assert float(fut.tool.out_mean) == pytest.approx(idx + 1)
+
+    # The original tool is not changed.
+    assert tool.infile is None
+    assert tool.out_mean is None